@@ -0,0 +1,118 @@
+"""
+llm_agent import 時間基準測試
+
+每個情境在獨立的 Python 程序中執行（避免模組快取影響），量測 import 耗時與常駐記憶體，
+並檢查輕量情境沒有載入 LlamaIndex。任何情境超過預算時以非零狀態結束，可放入 CI 追蹤。
+
+用法：
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --budget config=400 --json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+
+# 情境名稱 -> (import 陳述式, 預算毫秒數, 是否禁止載入 LlamaIndex)
+CASES = {
+    "package": ("import llm_agent", 50.0, True),
+    "config": ("from llm_agent import AgentConfig, AgentRequest, AgentResponse", 500.0, True),
+    "state": ("from llm_agent import AgentState", 500.0, True),
+    "pool": ("from llm_agent import AgentSessionPool", 500.0, True),
+    "agent": ("from llm_agent import BaseAgent", 5000.0, False),
+}
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed_ms = (time.perf_counter() - start) * 1000
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_ms": elapsed_ms,
+    "rss_mb": rss_kb / 1024 if sys.platform != "darwin" else rss_kb / 1024 / 1024,
+    "llama_index": any(name.startswith("llama_index") for name in sys.modules),
+}}))
+"""
+
+
+def run_case(statement: str) -> Dict[str, float]:
+    """
+    在新的 Python 程序中執行 import 陳述式
+
+    Args:
+        statement: import 陳述式
+
+    Returns:
+        包含 import_ms、rss_mb 與 llama_index（是否載入）的字典
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(statement=statement)],
+        cwd=PACKAGE_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def parse_budgets(values: Optional[List[str]]) -> Dict[str, float]:
+    """解析 --budget name=ms 參數"""
+    budgets: Dict[str, float] = {}
+    for value in values or []:
+        name, _, ms = value.partition("=")
+        if name not in CASES or not ms:
+            raise SystemExit(
+                f"無效的預算設定: {value}（格式為 name=ms，name 為 {', '.join(CASES)}）"
+            )
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="llm_agent import 時間基準測試")
+    parser.add_argument("--repeat", type=int, default=5, help="每個情境的執行次數（取中位數）")
+    parser.add_argument("--budget", action="append", help="覆寫情境預算，例如 config=300")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+
+    results = {}
+    failed = False
+    for name, (statement, default_budget, forbid_llama) in CASES.items():
+        runs = [run_case(statement) for _ in range(args.repeat)]
+        budget = budgets.get(name, default_budget)
+        import_ms = statistics.median(run["import_ms"] for run in runs)
+        llama_loaded = any(run["llama_index"] for run in runs)
+        ok = import_ms <= budget and not (forbid_llama and llama_loaded)
+        failed = failed or not ok
+        results[name] = {
+            "statement": statement,
+            "import_ms": round(import_ms, 1),
+            "budget_ms": budget,
+            "rss_mb": round(statistics.median(run["rss_mb"] for run in runs), 1),
+            "llama_index": llama_loaded,
+            "ok": ok,
+        }
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for name, result in results.items():
+            status = "OK  " if result["ok"] else "FAIL"
+            print(
+                f"{status} {name:<8} {result['import_ms']:>8.1f} ms"
+                f" (預算 {result['budget_ms']:.0f} ms)  RSS {result['rss_mb']:>6.1f} MB"
+                f"  llama_index={result['llama_index']}"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+BaseAgent 負載基準測試（使用本地模擬 provider，不需要模型伺服器）
+
+以固定並行數送出 completion 請求，量測吞吐量、端到端延遲與第一個 token 時間（串流模式）。
+延遲分布與錯誤率由參數設定；也可以先以 --record 錄製真實 provider 的回應，之後以 --replay
+離線重播，讓 CI 以真實的回應與時間執行。設定 --max-p95-ms 時，p95 延遲超過上限以非零狀態結束。
+
+用法：
+    python benchmarks/load_test.py --requests 500 --concurrency 32 --stream
+    python benchmarks/load_test.py --record cassettes/load.jsonl --upstream ollama
+    python benchmarks/load_test.py --replay cassettes/load.jsonl --max-p95-ms 3000 --json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+from llm_agent import AgentConfig, BaseAgent, FakeConfig, LLMConfig, LLMProvider  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """以最近秩法計算分位數（沒有樣本時為 None）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(q * len(ordered)) - 1)
+    return ordered[index]
+
+
+def build_fake_config(args: argparse.Namespace) -> FakeConfig:
+    """依參數建立模擬 provider 配置"""
+    if args.record:
+        upstream = LLMConfig.from_env(provider=args.upstream)
+        return FakeConfig(mode="record", cassette_path=args.record, upstream=upstream)
+    return FakeConfig(
+        mode="replay" if args.replay else "generate",
+        cassette_path=args.replay,
+        response_tokens=args.tokens,
+        ttft_ms=args.ttft_ms,
+        ttft_jitter=args.ttft_jitter,
+        tokens_per_second=args.tokens_per_second or None,
+        token_jitter=args.token_jitter,
+        error_rate=args.error_rate,
+        midstream_error_rate=args.midstream_error_rate,
+        seed=args.seed,
+    )
+
+
+async def run_load(agent: BaseAgent, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    以固定並行數送出請求
+
+    Args:
+        agent: BaseAgent 實例
+        args: 命令列參數
+
+    Returns:
+        結果統計
+    """
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def one(index: int) -> None:
+        # 同一組 prompt 才能在重播時對應到錄製的回應
+        prompt = f"Load test request {index % args.unique_prompts}"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if args.stream:
+                    first = None
+                    async for _ in agent.astream_complete(prompt):
+                        if first is None:
+                            first = time.perf_counter()
+                    if first is not None:
+                        ttfts.append((first - start) * 1000)
+                else:
+                    await agent.acomplete(prompt)
+            except Exception as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    def summary(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            f"p{int(q * 100)}_ms": round(value, 1) if value is not None else None
+            for q in (0.5, 0.95, 0.99)
+            for value in [percentile(values, q)]
+        }
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "latency": summary(latencies),
+        "ttft": summary(ttfts) if args.stream else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="BaseAgent 負載基準測試（本地模擬 provider）")
+    parser.add_argument("--requests", type=int, default=200, help="請求總數")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時進行的請求數")
+    parser.add_argument("--unique-prompts", type=int, default=50, help="不同 prompt 的數量")
+    parser.add_argument("--stream", action="store_true", help="使用串流 API 並量測 TTFT")
+    parser.add_argument("--tokens", type=int, default=64, help="模擬回應的 token 數")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="TTFT 中位數（毫秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.3, help="TTFT 對數常態 sigma")
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=50.0, help="生成速度中位數（0 表示不延遲）"
+    )
+    parser.add_argument("--token-jitter", type=float, default=0.2, help="token 間隔對數常態 sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="第一個 token 前失敗的機率")
+    parser.add_argument(
+        "--midstream-error-rate", type=float, default=0.0, help="產生部分 token 後失敗的機率"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--record", metavar="PATH", help="呼叫 upstream 並錄製到 cassette")
+    parser.add_argument("--upstream", default="ollama", help="錄製時使用的 provider（讀取環境變數）")
+    parser.add_argument("--replay", metavar="PATH", help="從 cassette 重播回應")
+    parser.add_argument("--max-p95-ms", type=float, help="p95 延遲上限（超過時以非零狀態結束）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    parser.add_argument("--verbose", action="store_true", help="輸出每次呼叫失敗的錯誤日誌")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        raise SystemExit("--record 與 --replay 不能同時使用")
+    if not args.verbose:
+        # 注入的錯誤是預期的，只在結果中統計
+        logging.getLogger("llm_agent").setLevel(logging.CRITICAL)
+
+    llm_config = LLMConfig(provider=LLMProvider.FAKE, fake=build_fake_config(args))
+    agent = BaseAgent(
+        config=AgentConfig(llm=llm_config, use_agent_mode=False, coalesce_requests=False)
+    )
+    result = asyncio.run(run_load(agent, args))
+
+    p95 = result["latency"]["p95_ms"]
+    failed = args.max_p95_ms is not None and (p95 is None or p95 > args.max_p95_ms)
+    result["ok"] = not failed
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        latency = result["latency"]
+        print(
+            f"{'FAIL' if failed else 'OK  '} {result['succeeded']}/{result['requests']} 成功"
+            f"  {result['throughput_rps']} req/s  耗時 {result['elapsed_s']} s"
+        )
+        print(
+            f"     延遲 p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms"
+            f"  p99 {latency['p99_ms']} ms"
+        )
+        if result["ttft"]:
+            ttft = result["ttft"]
+            print(f"     TTFT p50 {ttft['p50_ms']} ms  p95 {ttft['p95_ms']} ms")
+        if result["errors"]:
+            print(f"     錯誤 {result['errors']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,35 +2,116 @@
 LLM Agent 套件
 
 提供可重用的 LLM Agent 基礎架構，基於 LlamaIndex 框架。
+
+公開 API 在第一次存取時才載入對應的模組：只使用 AgentConfig、AgentRequest、AgentState 等
+配置與資料模型時不會載入 LlamaIndex 的 agent、LLM 整合與 provider 套件。
 """
 
-from .agent import BaseAgent
-from .config import AgentConfig
-from .llm_config import (
-    LLMConfig,
-    LLMProvider,
-    OllamaConfig,
-    OpenAIConfig,
-    AnthropicConfig,
-)
-from .schemas import AgentRequest, AgentResponse, ChatMessage
-from .state.agent_state import AgentState
-from .state.memory import ChatMemory
-
-__all__ = [
-    "BaseAgent",
-    "AgentConfig",
-    "LLMConfig",
-    "LLMProvider",
-    "OllamaConfig",
-    "OpenAIConfig",
-    "AnthropicConfig",
-    "AgentRequest",
-    "AgentResponse",
-    "ChatMessage",
-    "AgentState",
-    "ChatMemory",
-]
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from .agent import BaseAgent
+    from .concurrency import ConcurrencyLimitExceeded
+    from .config import AgentConfig
+    from .fake_llm import Cassette, CassetteMissError, FakeLLM, FakeProviderError
+    from .llm_config import (
+        AnthropicConfig,
+        CircuitBreakerConfig,
+        ConcurrencyLimitConfig,
+        CustomProviderConfig,
+        FakeConfig,
+        HedgingConfig,
+        LLMConfig,
+        LLMProvider,
+        OllamaConfig,
+        OpenAIConfig,
+        RateLimitConfig,
+    )
+    from .providers import register_provider
+    from .ratelimit import RateLimitExceeded
+    from .resilience import CircuitOpenError
+    from .schemas import AgentRequest, AgentResponse, BatchCompletionResult, ChatMessage
+    from .session_pool import AgentSessionPool
+    from .state.agent_state import AgentState
+    from .state.memory import ChatMemory
+    from .state.memory_store import BaseMemoryStore, SQLiteMemoryStore
+    from .state.token_memory import TokenCountedMemory
+    from .telemetry import (
+        CallTelemetry,
+        MetricsSink,
+        PrometheusMetricsSink,
+        get_metrics_sink,
+        render_coalescing_metrics,
+        set_metrics_sink,
+    )
+    from .structured_stream import (
+        StructuredItem,
+        StructuredStreamParser,
+        aiter_structured,
+        iter_structured,
+    )
+
+# 公開名稱 -> 定義所在的子模組
+_LAZY_IMPORTS: Dict[str, str] = {
+    "BaseAgent": ".agent",
+    "AgentConfig": ".config",
+    "LLMConfig": ".llm_config",
+    "LLMProvider": ".llm_config",
+    "OllamaConfig": ".llm_config",
+    "OpenAIConfig": ".llm_config",
+    "AnthropicConfig": ".llm_config",
+    "CustomProviderConfig": ".llm_config",
+    "FakeConfig": ".llm_config",
+    "HedgingConfig": ".llm_config",
+    "CircuitBreakerConfig": ".llm_config",
+    "CircuitOpenError": ".resilience",
+    "ConcurrencyLimitConfig": ".llm_config",
+    "ConcurrencyLimitExceeded": ".concurrency",
+    "RateLimitConfig": ".llm_config",
+    "RateLimitExceeded": ".ratelimit",
+    "register_provider": ".providers",
+    "AgentRequest": ".schemas",
+    "AgentResponse": ".schemas",
+    "ChatMessage": ".schemas",
+    "BatchCompletionResult": ".schemas",
+    "AgentSessionPool": ".session_pool",
+    "AgentState": ".state.agent_state",
+    "ChatMemory": ".state.memory",
+    "BaseMemoryStore": ".state.memory_store",
+    "SQLiteMemoryStore": ".state.memory_store",
+    "TokenCountedMemory": ".state.token_memory",
+    "StructuredItem": ".structured_stream",
+    "StructuredStreamParser": ".structured_stream",
+    "iter_structured": ".structured_stream",
+    "aiter_structured": ".structured_stream",
+    "CallTelemetry": ".telemetry",
+    "MetricsSink": ".telemetry",
+    "PrometheusMetricsSink": ".telemetry",
+    "get_metrics_sink": ".telemetry",
+    "render_coalescing_metrics": ".telemetry",
+    "set_metrics_sink": ".telemetry",
+    "FakeLLM": ".fake_llm",
+    "FakeProviderError": ".fake_llm",
+    "Cassette": ".fake_llm",
+    "CassetteMissError": ".fake_llm",
+}
+
+__all__ = list(_LAZY_IMPORTS)
 
 __version__ = "0.1.0"
 
+
+def __getattr__(name: str) -> Any:
+    """第一次存取公開名稱時載入對應的子模組，並快取到套件命名空間"""
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    """列出模組屬性與尚未載入的公開名稱"""
+    return sorted({*globals(), *__all__})
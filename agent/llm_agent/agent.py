@@ -1,22 +1,129 @@
 """Agent 核心實作模組"""
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 
-from llama_index.core.agent import ReActAgent
 from llama_index.core.llms import ChatMessage, LLM
-from llama_index.llms.ollama import Ollama
 
+from .cache import BaseResponseCache, create_response_cache, make_cache_key
+from .compaction import MemoryCompactor
+from .concurrency import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitExceeded,
+    get_concurrency_limiter,
+    is_overload_error,
+)
 from .config import AgentConfig
-from .llm_config import LLMProvider
+from .llm_config import LLMConfig, LLMProvider
+from .ollama_context import OllamaContextSession
+from .prompt_cache import PromptLayout, extract_cache_usage
 from .prompts import PromptManager
-from .schemas import AgentRequest, AgentResponse
+from .hedging import PRIMARY, SECONDARY, HedgingPolicy, get_hedging_policy
+from .providers import config_hash, get_llm
+from .ratelimit import (
+    RateLimiter,
+    RateLimitExceeded,
+    estimate_tokens,
+    get_rate_limiter,
+    get_user_rate_limiter,
+)
+from .resilience import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from .schemas import AgentRequest, AgentResponse, BatchCompletionResult
+from .singleflight import get_singleflight
+from .telemetry import (
+    CallTelemetry,
+    get_metrics_sink,
+    install_llm_event_handler,
+    reset_current_call,
+    set_current_call,
+)
 from .state.agent_state import AgentState
+from .state.memory_store import get_memory_store
+from .state.token_memory import get_token_counter
+from .tool_retrieval import ToolRetriever
 from .tools import ToolRegistry
 from .utils import format_error_message, validate_message
 
+if TYPE_CHECKING:
+    from llama_index.core.agent import ReActAgent
+
 logger = logging.getLogger(__name__)
 
+# 額度不足（速率限制或並行佇列已滿）時改用下一個 provider
+_SHED_ERRORS = (ConcurrencyLimitExceeded, RateLimitExceeded)
+
+
+class _ProviderRoute:
+    """Provider 呼叫鏈中的單一 provider"""
+
+    __slots__ = (
+        "index",
+        "name",
+        "model",
+        "llm",
+        "breaker",
+        "limiter",
+        "rate_limiter",
+        "completion_tokens",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        name: str,
+        model: str,
+        llm: LLM,
+        breaker: Optional[CircuitBreaker],
+        limiter: Optional[AdaptiveConcurrencyLimiter],
+        rate_limiter: Optional[RateLimiter] = None,
+        completion_tokens: int = 0,
+    ):
+        self.index = index
+        self.name = name
+        self.model = model
+        self.llm = llm
+        self.breaker = breaker
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.completion_tokens = completion_tokens
+
+    def settle_tokens(self, text: str) -> None:
+        """以實際回應長度校正預估的回應 token 額度"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.adjust(estimate_tokens(text) - self.completion_tokens)
+
+    def finish(
+        self, latency: float, error: Optional[BaseException] = None, cancelled: bool = False
+    ) -> None:
+        """記錄呼叫結果到斷路器並歸還並行額度"""
+        if self.breaker is not None:
+            if cancelled:
+                self.breaker.release()
+            elif error is None:
+                self.breaker.record_success(latency)
+            else:
+                self.breaker.record_failure(latency)
+        if self.limiter is not None:
+            self.limiter.release(
+                latency=None if cancelled or error is not None else latency,
+                overloaded=error is not None and is_overload_error(error),
+            )
+
 
 class BaseAgent:
     """Base Agent 基礎類別，提供 LlamaIndex 整合的基礎框架"""
@@ -26,6 +133,9 @@ class BaseAgent:
         config: Optional[AgentConfig] = None,
         tools: Optional[List] = None,
         state: Optional[AgentState] = None,
+        llm: Optional[LLM] = None,
+        tool_registry: Optional[ToolRegistry] = None,
+        response_cache: Optional[BaseResponseCache] = None,
     ):
         """
         初始化 BaseAgent
@@ -34,105 +144,220 @@ class BaseAgent:
             config: Agent 配置（如果為 None，則從環境變數載入）
             tools: Agent 工具列表（可選）
             state: Agent State 實例（可選，會自動建立）
+            llm: 共用的 LLM 實例（可選，預設依配置建立）
+            tool_registry: 共用的工具註冊表（可選，預設建立新的註冊表）
+            response_cache: 回應快取（可選，預設依 config.response_cache_* 建立）
         """
         self.config = config or AgentConfig()
-        self.tool_registry = ToolRegistry()
-        self.state = state or AgentState(memory_token_limit=self.config.memory_token_limit)
+        self.tool_registry = tool_registry
+        if self.tool_registry is None:
+            self.tool_registry = ToolRegistry(
+                max_workers=self.config.tool_max_workers,
+                default_timeout=self.config.tool_timeout,
+            )
+        self.state = state or AgentState(
+            memory_token_limit=self.config.memory_token_limit,
+            max_tool_results=self.config.max_tool_results,
+            max_tool_results_per_tool=self.config.max_tool_results_per_tool,
+            memory_store=(
+                get_memory_store(self.config.memory_store_path)
+                if self.config.memory_store_path
+                else None
+            ),
+            memory_tokenizer=get_token_counter(self.config.memory_tokenizer),
+        )
+
+        # 工具檢索：每則訊息只將 BM25 挑選的 top-k 工具送入 ReActAgent
+        self.tool_retriever: Optional[ToolRetriever] = None
+        if self.config.tool_retrieval_top_k is not None:
+            self.tool_registry.enable_retrieval()
+            self.tool_retriever = ToolRetriever(
+                self.tool_registry, self.config.tool_retrieval_top_k, self.state
+            )
 
         # 初始化 LLM
-        self.llm = self._create_llm()
+        self.llm = llm if llm is not None else self._create_llm()
+
+        # Ollama context 重用（completion 路徑，同一 session 的後續輪次只送出新訊息）
+        self.ollama_context: Optional[OllamaContextSession] = None
+        ollama_config = self.config.llm.ollama
+        if (
+            self.config.llm.provider == LLMProvider.OLLAMA
+            and ollama_config is not None
+            and ollama_config.session_context
+            and not self.config.use_chat_api
+        ):
+            self.ollama_context = OllamaContextSession(ollama_config)
+
+        # Hedged request（延遲樣本在程序內共用同一個主要 provider 配置的 Agent 間累積）
+        self.hedging_policy: Optional[HedgingPolicy] = None
+        self._hedge_llm: Optional[LLM] = None
+        hedging_config = self.config.llm.hedging
+        if hedging_config is not None:
+            self.hedging_policy = get_hedging_policy(config_hash(self.config.llm), hedging_config)
+            self._hedge_llm = get_llm(hedging_config.secondary)
+
+        # 主要 provider 與備援 provider（依序嘗試，斷路器開啟的 provider 直接略過）
+        self.providers = self._create_provider_chain()
+        # Hedge 的次要 provider 與一般呼叫相同地經過自己的斷路器、並行限制與速率限制
+        self._hedge_route: Optional[_ProviderRoute] = None
+        if hedging_config is not None:
+            self._hedge_route = self._create_route(-1, hedging_config.secondary, self._hedge_llm)
+        # 對話記憶壓縮（在背景以摘要模型濃縮最舊的對話）；摘要呼叫與一般呼叫相同地經過
+        # 斷路器、並行限制、速率限制與遙測
+        self.compactor: Optional[MemoryCompactor] = None
+        self._summary_routes = self.providers
+        compaction_config = self.config.memory_compaction
+        if compaction_config is not None:
+            if compaction_config.summarizer is not None:
+                self._summary_routes = [
+                    self._create_route(index, llm_config, get_llm(llm_config))
+                    for index, llm_config in enumerate(
+                        [compaction_config.summarizer, *compaction_config.summarizer.fallbacks]
+                    )
+                ]
+            self.compactor = MemoryCompactor(
+                self._summarize, compaction_config, self.config.memory_token_limit
+            )
+        # LLM 實例 -> provider 名稱（依 provider 標記 prompt 快取斷點）
+        self._llm_providers: Dict[int, str] = {
+            id(route.llm): route.name for route in self.providers
+        }
+        if self._hedge_llm is not None:
+            self._llm_providers.setdefault(
+                id(self._hedge_llm), hedging_config.secondary.get_provider_name()
+            )
+
+        # 相同請求合併（程序內所有 Agent 共用）
+        self.singleflight = get_singleflight() if self.config.coalesce_requests else None
+
+        # 效能遙測：Agent 模式以 LlamaIndex 事件量測每個 ReAct 步驟的 LLM 呼叫
+        if self.config.telemetry_enabled and self.config.use_agent_mode:
+            install_llm_event_handler()
+
+        # 初始化回應快取
+        self.response_cache = response_cache
+        if self.response_cache is None and self.config.response_cache_enabled:
+            self.response_cache = create_response_cache(
+                max_entries=self.config.response_cache_max_entries,
+                ttl=self.config.response_cache_ttl,
+                path=self.config.response_cache_path,
+            )
+
+        # ReActAgent 在第一次使用時建立，工具變更後於下一次對話時重建
+        self._agent: Optional["ReActAgent"] = None
+        self._agent_version = -1
 
         # 註冊工具
         if tools:
-            for tool in tools:
-                if hasattr(tool, "metadata"):
-                    self.tool_registry.register(tool.metadata.name, tool)
-                else:
-                    logger.warning(f"工具 {tool} 不是有效的 FunctionTool，已跳過")
+            self.register_tools(tools)
+
+    @property
+    def agent(self) -> Optional["ReActAgent"]:
+        """
+        ReActAgent 實例（未使用 Agent 模式時為 None）
+
+        工具註冊表變更後（版本不同）會在下一次存取時重建；使用工具檢索時由 tool_retriever
+        在每個步驟挑選工具，不需要重建。
+        """
+        if not self.config.use_agent_mode:
+            return None
+        stale = self.tool_retriever is None and self._agent_version != self.tool_registry.version
+        if self._agent is None or stale:
+            self._agent_version = self.tool_registry.version
+            self._agent = self._create_agent()
+        return self._agent
 
-        # 初始化 Agent（如果使用 Agent 模式）
-        self.agent: Optional[ReActAgent] = None
-        if self.config.use_agent_mode:
-            self.agent = self._create_agent()
+    @agent.setter
+    def agent(self, agent: Optional["ReActAgent"]) -> None:
+        self._agent = agent
+        self._agent_version = self.tool_registry.version
 
     def _create_llm(self) -> LLM:
         """
-        根據 LLMConfig 建立對應的 LLM 實例
+        根據 LLMConfig 取得對應的 LLM 實例
+
+        實例由 provider registry 建立，並依配置雜湊在程序內共用，
+        讓使用相同配置的 Agent 共用同一個 HTTP 連線池。
 
         Returns:
             LLM 實例（根據 provider 不同而不同）
         """
-        llm_config = self.config.llm
-        provider = llm_config.provider
-
-        if provider == LLMProvider.OLLAMA:
-            if not llm_config.ollama:
-                raise ValueError("Ollama 配置不存在")
-            ollama_cfg = llm_config.ollama
-            return Ollama(
-                model=ollama_cfg.model,
-                base_url=ollama_cfg.base_url,
-                request_timeout=llm_config.timeout,
-                temperature=ollama_cfg.temperature,
-                top_p=ollama_cfg.top_p,
-                top_k=ollama_cfg.top_k,
-                num_ctx=ollama_cfg.num_ctx,
-                repeat_penalty=ollama_cfg.repeat_penalty,
-            )
-        elif provider == LLMProvider.OPENAI:
-            try:
-                from llama_index.llms.openai import OpenAI
-            except ImportError:
-                raise ImportError(
-                    "使用 OpenAI provider 需要安裝 llama-index-llms-openai: "
-                    "pip install llama-index-llms-openai"
-                )
-            if not llm_config.openai:
-                raise ValueError("OpenAI 配置不存在")
-            openai_cfg = llm_config.openai
-            return OpenAI(
-                api_key=openai_cfg.api_key,
-                model=openai_cfg.model,
-                base_url=openai_cfg.base_url,
-                temperature=openai_cfg.temperature,
-                max_tokens=openai_cfg.max_tokens,
-                top_p=openai_cfg.top_p,
-                frequency_penalty=openai_cfg.frequency_penalty,
-                presence_penalty=openai_cfg.presence_penalty,
-                timeout=llm_config.timeout,
-            )
-        elif provider == LLMProvider.ANTHROPIC:
-            try:
-                from llama_index.llms.anthropic import Anthropic
-            except ImportError:
-                raise ImportError(
-                    "使用 Anthropic provider 需要安裝 llama-index-llms-anthropic: "
-                    "pip install llama-index-llms-anthropic"
-                )
-            if not llm_config.anthropic:
-                raise ValueError("Anthropic 配置不存在")
-            anthropic_cfg = llm_config.anthropic
-            return Anthropic(
-                api_key=anthropic_cfg.api_key,
-                model=anthropic_cfg.model,
-                temperature=anthropic_cfg.temperature,
-                max_tokens=anthropic_cfg.max_tokens,
-                top_p=anthropic_cfg.top_p,
-                timeout=llm_config.timeout,
-            )
-        else:
-            raise ValueError(f"不支援的 LLM provider: {provider}")
+        return get_llm(self.config.llm)
+
+    def _create_provider_chain(self) -> List[_ProviderRoute]:
+        """
+        建立 provider 呼叫鏈：主要 provider 在前，其後為 LLMConfig.fallbacks
+
+        斷路器、並行限制器與速率限制器依 provider 配置在程序內共用，讓同一個 provider 的狀態對所有 Agent 生效。
 
-    def _create_agent(self) -> ReActAgent:
+        Returns:
+            _ProviderRoute 列表
+        """
+        return [
+            self._create_route(index, llm_config, self.llm if index == 0 else get_llm(llm_config))
+            for index, llm_config in enumerate([self.config.llm, *self.config.llm.fallbacks])
+        ]
+
+    @staticmethod
+    def _create_route(index: int, llm_config: LLMConfig, llm: LLM) -> _ProviderRoute:
         """
-        建立 ReActAgent 實例
+        建立單一 provider 的呼叫路徑
+
+        Args:
+            index: 在呼叫鏈中的位置（hedge 的次要 provider 為 -1）
+            llm_config: provider 的 LLM 配置
+            llm: LLM 實例
+
+        Returns:
+            _ProviderRoute 實例
+        """
+        name = llm_config.get_provider_name()
+        # 以不含容錯設定的配置作為鍵，讓同一個 provider 不論出現在哪個呼叫鏈都共用狀態
+        key = config_hash(llm_config.model_copy(update={"fallbacks": [], "hedging": None}))
+        breaker = None
+        if llm_config.circuit_breaker.enabled:
+            breaker = get_circuit_breaker(key, name, llm_config.circuit_breaker)
+        limiter = None
+        if llm_config.concurrency.enabled:
+            limiter = get_concurrency_limiter(key, name, llm_config.concurrency)
+        rate_limiter = None
+        completion_tokens = 0
+        if llm_config.rate_limit is not None:
+            rate_limiter = get_rate_limiter(key, name, llm_config.rate_limit)
+            completion_tokens = llm_config.rate_limit.completion_tokens
+        return _ProviderRoute(
+            index,
+            name,
+            llm_config.get_model_name(),
+            llm,
+            breaker,
+            limiter,
+            rate_limiter,
+            completion_tokens,
+        )
+
+    def _create_agent(self) -> "ReActAgent":
+        """
+        建立 ReActAgent 實例（ReAct 模組在第一次使用 Agent 模式時才載入）
 
         Returns:
             ReActAgent 實例
         """
-        tools = self.tool_registry.get_all_tools()
+        from llama_index.core.agent import ReActAgent
+
         memory = self.state.memory.get_memory_buffer()
+        if self.tool_retriever is not None:
+            # 每個推理步驟由 tool_retriever 依使用者訊息挑選工具
+            return ReActAgent.from_tools(
+                tool_retriever=self.tool_retriever,
+                llm=self.llm,
+                memory=memory,
+                verbose=self.config.agent_verbose,
+            )
 
+        # 工具呼叫經過 ToolRegistry 執行層（逾時、執行緒 / 程序池），結果記錄到 State
+        tools = self.tool_registry.get_agent_tools(self.state)
         return ReActAgent.from_tools(
             tools=tools,
             llm=self.llm,
@@ -142,18 +367,27 @@ class BaseAgent:
 
     def register_tool(self, tool) -> None:
         """
-        註冊工具到 Agent
+        註冊工具到 Agent（ReActAgent 會在下一次對話時重建）
 
         Args:
             tool: FunctionTool 實例
         """
-        if hasattr(tool, "metadata"):
-            self.tool_registry.register(tool.metadata.name, tool)
-            # 如果使用 Agent 模式，需要重新建立 Agent
-            if self.config.use_agent_mode:
-                self.agent = self._create_agent()
-        else:
-            logger.warning(f"工具 {tool} 不是有效的 FunctionTool，已跳過")
+        self.register_tools([tool])
+
+    def register_tools(self, tools: List[Any]) -> None:
+        """
+        批次註冊工具到 Agent，所有工具註冊完成後 ReActAgent 只會在下一次對話時重建一次
+
+        Args:
+            tools: FunctionTool 列表
+        """
+        valid = []
+        for tool in tools:
+            if hasattr(tool, "metadata"):
+                valid.append(tool)
+            else:
+                logger.warning(f"工具 {tool} 不是有效的 FunctionTool，已跳過")
+        self.tool_registry.register_many(valid)
 
     def chat(self, request: AgentRequest) -> AgentResponse:
         """
@@ -165,6 +399,7 @@ class BaseAgent:
         Returns:
             Agent 回應
         """
+        telemetry = self._start_telemetry("chat")
         try:
             # 驗證訊息
             if not validate_message(request.message):
@@ -174,19 +409,38 @@ class BaseAgent:
             if request.session_id:
                 self.state.session_id = request.session_id
 
+            # 使用者速率限制（額度不足時等待，超過期限則拋出 RateLimitExceeded）
+            user_limiter, user_tokens = self._user_rate_limit(request)
+            if user_limiter is not None:
+                wait_start = time.perf_counter()
+                user_limiter.acquire_sync(user_tokens)
+                telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+            # 套用背景完成的記憶壓縮
+            call_meta: Dict[str, Any] = {}
+            self._apply_compaction(call_meta)
+
             # 新增使用者訊息到記憶
             self.state.add_message("user", request.message)
 
             # 取得回應
             if self.config.use_agent_mode and self.agent:
-                # 使用 ReActAgent
-                response_text = self.agent.chat(request.message).response
+                # 使用 ReActAgent（每個推理步驟的 LLM 呼叫記錄到 telemetry）
+                token = set_current_call(telemetry)
+                try:
+                    response_text = self.agent.chat(request.message).response
+                finally:
+                    reset_current_call(token)
+                self._record_tool_retrieval(call_meta)
             else:
                 # 直接使用 LLM
-                response_text = self._chat_with_llm(request)
+                response_text = self._chat_with_llm(request, call_meta, telemetry)
 
             # 新增助手回應到記憶
             self.state.add_message("assistant", response_text)
+            self._settle_user_tokens(user_limiter, response_text)
+            self._schedule_compaction()
+            self._finish_telemetry(telemetry, response_text, call_meta)
 
             # 建立回應
             return AgentResponse(
@@ -197,10 +451,12 @@ class BaseAgent:
                     "provider": self.config.llm.provider.value,
                     "use_agent_mode": self.config.use_agent_mode,
                     "context": request.context,
+                    **call_meta,
                 },
             )
 
         except Exception as e:
+            self._finish_telemetry(telemetry, "", error=e)
             error_msg = format_error_message(e, "chat")
             logger.error(error_msg, exc_info=True)
             raise
@@ -215,6 +471,7 @@ class BaseAgent:
         Returns:
             Agent 回應
         """
+        telemetry = self._start_telemetry("achat")
         try:
             # 驗證訊息
             if not validate_message(request.message):
@@ -224,20 +481,39 @@ class BaseAgent:
             if request.session_id:
                 self.state.session_id = request.session_id
 
+            # 使用者速率限制（額度不足時等待，超過期限則拋出 RateLimitExceeded）
+            user_limiter, user_tokens = self._user_rate_limit(request)
+            if user_limiter is not None:
+                wait_start = time.perf_counter()
+                await user_limiter.acquire(user_tokens)
+                telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+            # 套用背景完成的記憶壓縮
+            call_meta: Dict[str, Any] = {}
+            self._apply_compaction(call_meta)
+
             # 新增使用者訊息到記憶
             self.state.add_message("user", request.message)
 
             # 取得回應
             if self.config.use_agent_mode and self.agent:
-                # 使用 ReActAgent（非同步）
-                response_obj = await self.agent.achat(request.message)
+                # 使用 ReActAgent（非同步，每個推理步驟的 LLM 呼叫記錄到 telemetry）
+                token = set_current_call(telemetry)
+                try:
+                    response_obj = await self.agent.achat(request.message)
+                finally:
+                    reset_current_call(token)
                 response_text = response_obj.response
+                self._record_tool_retrieval(call_meta)
             else:
                 # 直接使用 LLM（非同步）
-                response_text = await self._achat_with_llm(request)
+                response_text = await self._achat_with_llm(request, call_meta, telemetry)
 
             # 新增助手回應到記憶
             self.state.add_message("assistant", response_text)
+            self._settle_user_tokens(user_limiter, response_text)
+            self._schedule_compaction()
+            self._finish_telemetry(telemetry, response_text, call_meta)
 
             # 建立回應
             return AgentResponse(
@@ -248,98 +524,1328 @@ class BaseAgent:
                     "provider": self.config.llm.provider.value,
                     "use_agent_mode": self.config.use_agent_mode,
                     "context": request.context,
+                    **call_meta,
                 },
             )
 
         except Exception as e:
+            self._finish_telemetry(telemetry, "", error=e)
             error_msg = format_error_message(e, "achat")
             logger.error(error_msg, exc_info=True)
             raise
 
-    def _chat_with_llm(self, request: AgentRequest) -> str:
+    def stream_chat(self, request: AgentRequest) -> Iterator[str]:
         """
-        直接使用 LLM 進行對話（同步版本）
+        與 Agent 進行串流對話（同步版本），逐段產生回應 token
+
+        串流結束（或呼叫端提前關閉 generator）時，已產生的內容會寫入記憶。
+
+        Args:
+            request: Agent 請求
+
+        Yields:
+            回應文字片段
+        """
+        if not validate_message(request.message):
+            raise ValueError("訊息格式無效")
+
+        if request.session_id:
+            self.state.session_id = request.session_id
+
+        telemetry = self._start_telemetry("stream_chat")
+        user_limiter, user_tokens = self._user_rate_limit(request)
+        if user_limiter is not None:
+            wait_start = time.perf_counter()
+            user_limiter.acquire_sync(user_tokens)
+            telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+        self._apply_compaction({})
+        self.state.add_message("user", request.message)
+
+        chunks: List[str] = []
+        error: Optional[BaseException] = None
+        try:
+            if self.config.use_agent_mode and self.agent:
+                # ReActAgent 串流：推理步驟完成後才會開始產生最終回答
+                stream = self.agent.stream_chat(request.message).response_gen
+            elif self.config.use_chat_api:
+                layout = self._build_prompt_layout(telemetry)
+                stream = self._invoke_stream(
+                    lambda llm: (
+                        chunk.delta
+                        for chunk in llm.stream_chat(self._chat_messages_for(layout, llm))
+                    ),
+                    layout.messages,
+                    telemetry,
+                )
+            else:
+                prompt = self._build_chat_prompt(request, telemetry)
+                stream = self._invoke_stream(
+                    lambda llm: (chunk.delta for chunk in llm.stream_complete(prompt)),
+                    prompt,
+                    telemetry,
+                )
+
+            for delta in stream:
+                if not delta:
+                    continue
+                telemetry.first_token()
+                chunks.append(delta)
+                yield delta
+        except Exception as e:
+            error = e
+            error_msg = format_error_message(e, "stream_chat")
+            logger.error(error_msg, exc_info=True)
+            raise
+        finally:
+            if chunks:
+                self.state.add_message("assistant", "".join(chunks))
+            self._settle_user_tokens(user_limiter, "".join(chunks))
+            self._schedule_compaction()
+            self._finish_telemetry(telemetry, "".join(chunks), error=error)
+
+    async def astream_chat(self, request: AgentRequest) -> AsyncIterator[str]:
+        """
+        與 Agent 進行串流對話（非同步版本），逐段產生回應 token
+
+        串流結束（或呼叫端提前關閉 generator）時，已產生的內容會寫入記憶。
+
+        Args:
+            request: Agent 請求
+
+        Yields:
+            回應文字片段
+        """
+        if not validate_message(request.message):
+            raise ValueError("訊息格式無效")
+
+        if request.session_id:
+            self.state.session_id = request.session_id
+
+        telemetry = self._start_telemetry("astream_chat")
+        user_limiter, user_tokens = self._user_rate_limit(request)
+        if user_limiter is not None:
+            wait_start = time.perf_counter()
+            await user_limiter.acquire(user_tokens)
+            telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+        self._apply_compaction({})
+        self.state.add_message("user", request.message)
+
+        chunks: List[str] = []
+        error: Optional[BaseException] = None
+        try:
+            if self.config.use_agent_mode and self.agent:
+                response_obj = await self.agent.astream_chat(request.message)
+                async for delta in response_obj.async_response_gen():
+                    if not delta:
+                        continue
+                    telemetry.first_token()
+                    chunks.append(delta)
+                    yield delta
+            else:
+                use_chat_api = self.config.use_chat_api
+                if use_chat_api:
+                    layout = self._build_prompt_layout(telemetry)
+                    payload = layout.messages
+                else:
+                    payload = self._build_chat_prompt(request, telemetry)
+
+                async def deltas(llm: LLM) -> AsyncIterator[str]:
+                    if use_chat_api:
+                        stream = await llm.astream_chat(self._chat_messages_for(layout, llm))
+                    else:
+                        stream = await llm.astream_complete(payload)
+                    async for chunk in stream:
+                        if chunk.delta:
+                            yield chunk.delta
+
+                async for delta in self._deduplicated_stream(payload, deltas, telemetry):
+                    telemetry.first_token()
+                    chunks.append(delta)
+                    yield delta
+        except Exception as e:
+            error = e
+            error_msg = format_error_message(e, "astream_chat")
+            logger.error(error_msg, exc_info=True)
+            raise
+        finally:
+            if chunks:
+                self.state.add_message("assistant", "".join(chunks))
+            self._settle_user_tokens(user_limiter, "".join(chunks))
+            self._schedule_compaction()
+            self._finish_telemetry(telemetry, "".join(chunks), error=error)
+
+    def _start_telemetry(self, operation: str) -> CallTelemetry:
+        """開始量測一次呼叫（provider 與模型預設為主要 provider，呼叫後更新為實際回應者）"""
+        return CallTelemetry(
+            operation, self.config.llm.get_provider_name(), self.config.llm.get_model_name()
+        )
+
+    def _finish_telemetry(
+        self,
+        telemetry: CallTelemetry,
+        text: str,
+        call_meta: Optional[Dict[str, Any]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        結束量測：送往指標輸出，並將結果與 token 總數寫入回應 metadata
+
+        Args:
+            telemetry: 本次呼叫的 CallTelemetry
+            text: 回應文字
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata
+            error: 呼叫失敗時的例外
+        """
+        if not self.config.telemetry_enabled:
+            return
+        result = telemetry.finish(text, error)
+        try:
+            get_metrics_sink().record(result)
+        except Exception as e:
+            logger.warning(f"指標輸出失敗: {e}")
+        if call_meta is not None:
+            call_meta["telemetry"] = result
+            call_meta["tokens_used"] = result["prompt_tokens"] + result["completion_tokens"]
+
+    def _apply_compaction(self, call_meta: Dict[str, Any]) -> None:
+        """套用已在背景完成的記憶壓縮，並將壓縮統計寫入回應 metadata"""
+        if self.compactor is not None:
+            stats = self.compactor.apply(self.state.memory)
+            if stats is not None:
+                call_meta["compaction"] = stats
+
+    def _summarize(self, prompt: str) -> str:
+        """
+        以摘要模型完成記憶壓縮的 prompt（在壓縮的背景執行緒中呼叫）
+
+        Args:
+            prompt: 摘要 prompt
+
+        Returns:
+            摘要文字
+        """
+        telemetry = self._start_telemetry("summarize")
+        try:
+            text = self._invoke(
+                lambda llm: llm.complete(prompt).text,
+                payload=prompt,
+                telemetry=telemetry,
+                routes=self._summary_routes,
+            )
+        except Exception as e:
+            self._finish_telemetry(telemetry, "", error=e)
+            raise
+        self._finish_telemetry(telemetry, text)
+        return text
+
+    def _schedule_compaction(self) -> None:
+        """對話結束後檢查記憶水位，必要時在背景開始摘要"""
+        if self.compactor is not None:
+            self.compactor.schedule(self.state.memory)
+
+    def _record_tool_retrieval(self, call_meta: Dict[str, Any]) -> None:
+        """將最近一次工具檢索的延遲與省下的工具描述 token 數寫入回應 metadata"""
+        if self.tool_retriever is not None:
+            call_meta["tool_retrieval"] = self.tool_retriever.last_stats()
+
+    def _user_rate_limit(self, request: AgentRequest) -> Tuple[Optional[RateLimiter], int]:
+        """
+        取得請求所屬使用者（user_id，未提供時為 session_id）的速率限制器與估計的 token 數
 
         Args:
             request: Agent 請求
 
         Returns:
-            LLM 回應文字
+            (RateLimiter 或 None, 估計的 prompt + 回應 token 數)
         """
-        # 建立 prompt
-        chat_history = self.state.get_chat_history()
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history[:-1]])
+        config = self.config.user_rate_limit
+        user_key = request.user_id or request.session_id or self.state.session_id
+        if config is None or not user_key:
+            return None, 0
+        tokens = (
+            estimate_tokens(self.state.memory.get_history_text(exclude_last=False))
+            + estimate_tokens(request.message)
+            + config.completion_tokens
+        )
+        return get_user_rate_limiter(user_key, config), tokens
 
+    def _settle_user_tokens(self, limiter: Optional[RateLimiter], text: str) -> None:
+        """以實際回應長度校正使用者的 token 額度"""
+        if limiter is not None:
+            limiter.adjust(estimate_tokens(text) - self.config.user_rate_limit.completion_tokens)
+
+    def _build_chat_prompt(
+        self, request: AgentRequest, telemetry: Optional[CallTelemetry] = None
+    ) -> str:
+        """
+        根據對話歷史建立對話 prompt（最後一則訊息為本次使用者訊息，不納入歷史）
+
+        Args:
+            request: Agent 請求
+            telemetry: 可選的 CallTelemetry，記錄 prompt 組裝時間
+
+        Returns:
+            對話提示詞
+        """
+        start = time.perf_counter()
         prompt = PromptManager.get_chat_prompt(
             user_message=request.message,
-            chat_history=history_text,
+            chat_history=self.state.memory.get_history_text(exclude_last=True),
         )
+        if telemetry is not None:
+            telemetry.add_prompt_build(time.perf_counter() - start)
+        return prompt
+
+    def _build_prompt_layout(self, telemetry: Optional[CallTelemetry] = None) -> PromptLayout:
+        """
+        建立送往 LLM chat 介面的訊息列表：固定的系統提示詞加上對話歷史
+
+        系統提示詞與既有歷史在各輪之間保持不變（穩定前綴），僅在尾端附加新訊息（變動尾端），
+        讓 provider 端與 Ollama 的 prefix cache 可以命中。
+
+        Args:
+            telemetry: 可選的 CallTelemetry，記錄 prompt 組裝時間
+
+        Returns:
+            PromptLayout（最後一則訊息為本次使用者訊息）
+        """
+        start = time.perf_counter()
+        layout = PromptLayout(PromptManager.get_system_prompt(), self.state.get_chat_messages())
+        if telemetry is not None:
+            telemetry.add_prompt_build(time.perf_counter() - start)
+        return layout
+
+    def _chat_messages_for(self, layout: PromptLayout, llm: LLM) -> List[ChatMessage]:
+        """取得送往指定 LLM 實例的訊息列表（Anthropic 會標記快取斷點）"""
+        provider = self._llm_providers.get(id(llm), self.config.llm.get_provider_name())
+        return layout.for_provider(provider, self.config.prompt_cache_min_tokens)
+
+    @staticmethod
+    def _record_usage(
+        call_meta: Optional[Dict[str, Any]], telemetry: Optional[CallTelemetry], raw: Any
+    ) -> None:
+        """將 provider 回報的 token 用量記錄到 telemetry，命中快取的 token 數寫入呼叫 metadata"""
+        if telemetry is not None:
+            telemetry.record_usage(raw)
+        if call_meta is None:
+            return
+        usage = extract_cache_usage(raw)
+        if usage is not None:
+            call_meta["prompt_cache"] = usage
+
+    def _request_key(self, payload: Any, **kwargs) -> Optional[str]:
+        """
+        計算請求鍵（供回應快取與相同請求合併使用）；兩者皆未啟用時返回 None
+
+        Args:
+            payload: prompt 字串或 ChatMessage 列表
+            **kwargs: 呼叫 LLM 時的額外參數
+
+        Returns:
+            請求鍵或 None
+        """
+        if self.response_cache is None and self.singleflight is None:
+            return None
+
+        params = self.config.llm.get_provider_config().model_dump(exclude={"api_key"})
+        params.update(kwargs)
+        if not isinstance(payload, str):
+            payload = [(msg.role.value, msg.content) for msg in payload]
+        return make_cache_key(
+            self.config.llm.get_provider_name(),
+            self.config.llm.get_model_name(),
+            params,
+            payload,
+        )
+
+    def _use_response_cache(self, **kwargs) -> bool:
+        """判斷本次呼叫是否使用回應快取（temperature 大於 0 時預設略過）"""
+        if self.response_cache is None:
+            return False
+        temperature = kwargs.get(
+            "temperature", getattr(self.config.llm.get_provider_config(), "temperature", 0.0)
+        )
+        return not temperature or self.config.response_cache_allow_sampling
+
+    @staticmethod
+    def _answered_by_primary(meta: Dict[str, Any]) -> bool:
+        """
+        判斷回應是否來自主要 provider（請求鍵以主要 provider 與模型計算，其他 provider 的回應不快取）
+
+        Args:
+            meta: 本次 provider 呼叫寫入的 metadata
+
+        Returns:
+            是否由主要 provider 回應
+        """
+        if "fallback" in meta:
+            return False
+        return meta.get("hedge", {}).get("winner") != SECONDARY
+
+    def _record_cache_meta(self, call_meta: Optional[Dict[str, Any]], hit: Optional[bool]) -> None:
+        """將快取命中資訊寫入呼叫 metadata（hit 為 None 表示略過快取）"""
+        if call_meta is None or self.response_cache is None:
+            return
+        call_meta["cache"] = {"hit": hit, "bypassed": hit is None, **self.response_cache.stats()}
+
+    def _deduplicated_call(
+        self,
+        payload: Any,
+        call: Callable[[LLM], str],
+        call_meta: Optional[Dict[str, Any]] = None,
+        telemetry: Optional[CallTelemetry] = None,
+        **kwargs,
+    ) -> str:
+        """
+        透過回應快取與相同請求合併執行 LLM 呼叫（同步版本）
+
+        Args:
+            payload: prompt 字串或 ChatMessage 列表（用於計算請求鍵）
+            call: 以指定 LLM 實例執行呼叫並返回文字的函數
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+            **kwargs: 呼叫 LLM 時的額外參數
+
+        Returns:
+            LLM 回應文字
+        """
+        key = self._request_key(payload, **kwargs)
+        if key is None:
+            return self._invoke(call, call_meta, payload, telemetry)
+
+        use_cache = self._use_response_cache(**kwargs)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self._record_cache_meta(call_meta, True)
+                return cached
+
+        def fetch() -> Tuple[str, Dict[str, Any], Optional[CallTelemetry]]:
+            meta = call_meta if call_meta is not None else {}
+            before = set(meta)
+            text = self._invoke(call, meta, payload, telemetry)
+            added = {k: v for k, v in meta.items() if k not in before}
+            if use_cache and self._answered_by_primary(added):
+                self.response_cache.set(key, text)
+            return text, added, telemetry
+
+        if self.singleflight is not None:
+            (text, leader_meta, leader_telemetry), shared = self.singleflight.do_sync(key, fetch)
+            if shared:
+                self._adopt_leader(call_meta, telemetry, leader_meta, leader_telemetry)
+            if call_meta is not None:
+                call_meta["coalesced"] = shared
+        else:
+            text, _, _ = fetch()
+        self._record_cache_meta(call_meta, False if use_cache else None)
+        return text
+
+    async def _adeduplicated_call(
+        self,
+        payload: Any,
+        call: Callable[[LLM], Awaitable[str]],
+        call_meta: Optional[Dict[str, Any]] = None,
+        telemetry: Optional[CallTelemetry] = None,
+        **kwargs,
+    ) -> str:
+        """
+        透過回應快取與相同請求合併執行 LLM 呼叫（非同步版本）
+
+        Args:
+            payload: prompt 字串或 ChatMessage 列表（用於計算請求鍵）
+            call: 以指定 LLM 實例執行呼叫並返回文字的 coroutine 函數
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+            **kwargs: 呼叫 LLM 時的額外參數
+
+        Returns:
+            LLM 回應文字
+        """
+        key = self._request_key(payload, **kwargs)
+        if key is None:
+            return await self._ainvoke(call, call_meta, payload, telemetry)
+
+        use_cache = self._use_response_cache(**kwargs)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self._record_cache_meta(call_meta, True)
+                return cached
+
+        async def fetch() -> Tuple[str, Dict[str, Any], Optional[CallTelemetry]]:
+            meta = call_meta if call_meta is not None else {}
+            before = set(meta)
+            text = await self._ainvoke(call, meta, payload, telemetry)
+            added = {k: v for k, v in meta.items() if k not in before}
+            if use_cache and self._answered_by_primary(added):
+                self.response_cache.set(key, text)
+            return text, added, telemetry
+
+        if self.singleflight is not None:
+            (text, leader_meta, leader_telemetry), shared = await self.singleflight.do(key, fetch)
+            if shared:
+                self._adopt_leader(call_meta, telemetry, leader_meta, leader_telemetry)
+            if call_meta is not None:
+                call_meta["coalesced"] = shared
+        else:
+            text, _, _ = await fetch()
+        self._record_cache_meta(call_meta, False if use_cache else None)
+        return text
+
+    def _deduplicated_stream(
+        self,
+        payload: Any,
+        factory: Callable[[LLM], AsyncIterator[str]],
+        telemetry: Optional[CallTelemetry] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        以相同請求合併包裝串流呼叫；相同的並行串流共用同一個上游串流
+
+        Args:
+            payload: prompt 字串或 ChatMessage 列表（用於計算請求鍵）
+            factory: 以指定 LLM 實例建立上游串流的函數
+            telemetry: 可選的 CallTelemetry（合併時只有建立上游串流的呼叫記錄排隊時間，
+                其他訂閱者在串流結束後採用其 provider 與 token 用量）
+            **kwargs: 呼叫 LLM 時的額外參數
+
+        Returns:
+            文字片段的非同步迭代器
+        """
+        if self.singleflight is None:
+            return self._ainvoke_stream(factory, payload, telemetry)
+        return self.singleflight.stream(
+            self._request_key(payload, **kwargs),
+            lambda: self._ainvoke_stream(factory, payload, telemetry),
+            meta=telemetry,
+            on_shared=lambda leader: self._adopt_leader(None, telemetry, {}, leader),
+        )
+
+    @staticmethod
+    def _adopt_leader(
+        call_meta: Optional[Dict[str, Any]],
+        telemetry: Optional[CallTelemetry],
+        leader_meta: Dict[str, Any],
+        leader_telemetry: Optional[CallTelemetry],
+    ) -> None:
+        """合併請求的其他呼叫採用 leader 的呼叫 metadata（備援、hedge、prompt 快取）與用量"""
+        if call_meta is not None:
+            call_meta.update(leader_meta)
+        if telemetry is not None and leader_telemetry is not None:
+            telemetry.adopt(leader_telemetry)
+
+    def _available_providers(
+        self, routes: Optional[List[_ProviderRoute]] = None
+    ) -> Iterator[_ProviderRoute]:
+        """
+        依序產生斷路器放行的 provider（放行後必須呼叫 route.finish 或 breaker.release）
+
+        Args:
+            routes: 要嘗試的呼叫鏈（預設為 Agent 的 provider 呼叫鏈）
+        """
+        for route in self.providers if routes is None else routes:
+            if route.breaker is not None and not route.breaker.allow_request():
+                logger.debug(f"Provider {route.name} 斷路器開啟，略過")
+                continue
+            yield route
+
+    @staticmethod
+    def _provider_error(last_error: Optional[BaseException]) -> BaseException:
+        """所有 provider 都無法使用時要拋出的例外"""
+        if last_error is not None:
+            return last_error
+        return CircuitOpenError("所有 LLM provider 的斷路器皆為開啟狀態")
+
+    @staticmethod
+    def _record_provider_meta(call_meta: Optional[Dict[str, Any]], route: _ProviderRoute) -> None:
+        """記錄實際回應的 provider 到 call_meta"""
+        if call_meta is not None and route.index > 0:
+            call_meta["fallback"] = {"provider": route.name, "index": route.index}
+
+    @staticmethod
+    def _estimate_payload_tokens(payload: Any) -> int:
+        """估計 prompt 字串或 ChatMessage 列表的 token 數"""
+        if payload is None:
+            return 0
+        if isinstance(payload, str):
+            return estimate_tokens(payload)
+        return sum(estimate_tokens(message.content) for message in payload)
+
+    @staticmethod
+    def _record_telemetry_route(
+        telemetry: Optional[CallTelemetry], route: _ProviderRoute
+    ) -> None:
+        """記錄實際回應的 provider 與模型到 telemetry"""
+        if telemetry is not None:
+            telemetry.set_provider(route.name, route.model)
+
+    async def _acall_secondary(
+        self, call: Callable[[LLM], Awaitable[str]], prompt_tokens: int
+    ) -> str:
+        """
+        以 hedge 的次要 provider 執行非串流呼叫，結果記錄到次要 provider 自己的斷路器與並行限制器
+
+        斷路器開啟或額度不足時拋出例外（hedge 失敗，繼續等待主要 provider）。
+        """
+        route = self._hedge_route
+        if route.breaker is not None and not route.breaker.allow_request():
+            raise CircuitOpenError(f"Provider {route.name} 斷路器開啟")
+        await self._aacquire_slot(route, prompt_tokens)
+        start = time.perf_counter()
+        try:
+            text = await call(route.llm)
+        except Exception as e:
+            route.finish(time.perf_counter() - start, error=e)
+            raise
+        except BaseException:
+            # hedge 落敗而被取消
+            route.finish(time.perf_counter() - start, cancelled=True)
+            raise
+        route.finish(time.perf_counter() - start)
+        route.settle_tokens(text)
+        return text
+
+    async def _astream_secondary(
+        self, factory: Callable[[LLM], AsyncIterator[str]], prompt_tokens: int
+    ) -> AsyncIterator[str]:
+        """以 hedge 的次要 provider 建立串流，以第一個 token 的時間記錄到次要 provider"""
+        route = self._hedge_route
+        if route.breaker is not None and not route.breaker.allow_request():
+            raise CircuitOpenError(f"Provider {route.name} 斷路器開啟")
+        await self._aacquire_slot(route, prompt_tokens)
+        start = time.perf_counter()
+        first_latency: Optional[float] = None
+        chunks: List[str] = []
+        try:
+            async for delta in factory(route.llm):
+                if first_latency is None:
+                    first_latency = time.perf_counter() - start
+                chunks.append(delta)
+                yield delta
+        except Exception as e:
+            route.finish(time.perf_counter() - start, error=e)
+            raise
+        except BaseException:
+            if first_latency is None:
+                route.finish(time.perf_counter() - start, cancelled=True)
+            else:
+                route.finish(first_latency)
+                route.settle_tokens("".join(chunks))
+            raise
+        route.finish(first_latency or time.perf_counter() - start)
+        route.settle_tokens("".join(chunks))
+
+    @staticmethod
+    def _release_hedged_primary(route: _ProviderRoute, latency: float) -> None:
+        """次要 provider 勝出：主要 provider 的呼叫已取消，歸還額度但不記錄成功或延遲"""
+        route.finish(latency, cancelled=True)
+        route.settle_tokens("")
+
+    @staticmethod
+    def _on_shed(route: _ProviderRoute, error: BaseException) -> None:
+        """額度被拒絕時歸還斷路器放行的額度"""
+        if route.breaker is not None:
+            route.breaker.release()
+        logger.warning(f"Provider {route.name} 額度不足: {error}")
+
+    def _acquire_slot(
+        self,
+        route: _ProviderRoute,
+        prompt_tokens: int = 0,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> None:
+        """取得 provider 的速率額度與並行額度（同步版本），等待時間記錄到 telemetry"""
+        tokens = prompt_tokens + route.completion_tokens
+        start = time.perf_counter()
+        try:
+            if route.rate_limiter is not None:
+                route.rate_limiter.acquire_sync(tokens)
+            if route.limiter is not None:
+                try:
+                    route.limiter.acquire_sync()
+                except ConcurrencyLimitExceeded:
+                    if route.rate_limiter is not None:
+                        route.rate_limiter.refund(tokens)
+                    raise
+        except _SHED_ERRORS as e:
+            self._on_shed(route, e)
+            raise
+        finally:
+            if telemetry is not None:
+                telemetry.add_queue_wait(time.perf_counter() - start)
+
+    async def _aacquire_slot(
+        self,
+        route: _ProviderRoute,
+        prompt_tokens: int = 0,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> None:
+        """取得 provider 的速率額度與並行額度（非同步版本），等待時間記錄到 telemetry"""
+        tokens = prompt_tokens + route.completion_tokens
+        start = time.perf_counter()
+        try:
+            if route.rate_limiter is not None:
+                await route.rate_limiter.acquire(tokens)
+            if route.limiter is not None:
+                try:
+                    await route.limiter.acquire()
+                except BaseException:
+                    if route.rate_limiter is not None:
+                        route.rate_limiter.refund(tokens)
+                    raise
+        except _SHED_ERRORS as e:
+            self._on_shed(route, e)
+            raise
+        except BaseException:
+            if route.breaker is not None:
+                route.breaker.release()
+            raise
+        finally:
+            if telemetry is not None:
+                telemetry.add_queue_wait(time.perf_counter() - start)
+
+    def _invoke(
+        self,
+        call: Callable[[LLM], str],
+        call_meta: Optional[Dict[str, Any]] = None,
+        payload: Any = None,
+        telemetry: Optional[CallTelemetry] = None,
+        routes: Optional[List[_ProviderRoute]] = None,
+    ) -> str:
+        """
+        執行同步 LLM 呼叫；失敗、斷路器開啟或並行額度不足時依序改用備援 provider
+
+        同步路徑不使用 hedging。
+
+        Args:
+            call: 以指定 LLM 實例執行呼叫的函數
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata
+            payload: prompt 字串或 ChatMessage 列表（用於估計 token 額度）
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+            routes: 要嘗試的呼叫鏈（預設為 Agent 的 provider 呼叫鏈）
+
+        Returns:
+            LLM 回應文字
+
+        Raises:
+            CircuitOpenError: 所有 provider 的斷路器皆為開啟狀態
+        """
+        prompt_tokens = self._estimate_payload_tokens(payload)
+        if telemetry is not None:
+            telemetry.estimate_prompt(prompt_tokens)
+        last_error: Optional[BaseException] = None
+        for route in self._available_providers(routes):
+            try:
+                self._acquire_slot(route, prompt_tokens, telemetry)
+            except _SHED_ERRORS as e:
+                last_error = e
+                continue
+            start = time.perf_counter()
+            try:
+                text = call(route.llm)
+            except Exception as e:
+                route.finish(time.perf_counter() - start, error=e)
+                logger.warning(f"Provider {route.name} 呼叫失敗: {e}")
+                last_error = e
+                continue
+            except BaseException:
+                route.finish(time.perf_counter() - start, cancelled=True)
+                raise
+            route.finish(time.perf_counter() - start)
+            route.settle_tokens(text)
+            self._record_provider_meta(call_meta, route)
+            self._record_telemetry_route(telemetry, route)
+            return text
+        raise self._provider_error(last_error)
+
+    async def _ainvoke(
+        self,
+        call: Callable[[LLM], Awaitable[str]],
+        call_meta: Optional[Dict[str, Any]] = None,
+        payload: Any = None,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> str:
+        """
+        執行非同步 LLM 呼叫；失敗、斷路器開啟或並行額度不足時依序改用備援 provider
+
+        啟用 hedging 時，主要 provider 過慢會同時呼叫次要 provider。
+
+        Args:
+            call: 以指定 LLM 實例執行呼叫的 coroutine 函數
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata
+            payload: prompt 字串或 ChatMessage 列表（用於估計 token 額度）
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+
+        Returns:
+            LLM 回應文字
+
+        Raises:
+            CircuitOpenError: 所有 provider 的斷路器皆為開啟狀態
+        """
+        prompt_tokens = self._estimate_payload_tokens(payload)
+        if telemetry is not None:
+            telemetry.estimate_prompt(prompt_tokens)
+        last_error: Optional[BaseException] = None
+        for route in self._available_providers():
+            try:
+                await self._aacquire_slot(route, prompt_tokens, telemetry)
+            except _SHED_ERRORS as e:
+                last_error = e
+                continue
+            start = time.perf_counter()
+            winner = PRIMARY
+            try:
+                if route.index == 0 and self.hedging_policy is not None:
+                    text, winner, hedged = await self.hedging_policy.run(
+                        lambda: call(route.llm),
+                        lambda: self._acall_secondary(call, prompt_tokens),
+                    )
+                    if call_meta is not None:
+                        call_meta["hedge"] = {"hedged": hedged, "winner": winner}
+                else:
+                    text = await call(route.llm)
+            except Exception as e:
+                route.finish(time.perf_counter() - start, error=e)
+                logger.warning(f"Provider {route.name} 呼叫失敗: {e}")
+                last_error = e
+                continue
+            except BaseException:
+                route.finish(time.perf_counter() - start, cancelled=True)
+                raise
+            if winner == SECONDARY:
+                self._release_hedged_primary(route, time.perf_counter() - start)
+                self._record_telemetry_route(telemetry, self._hedge_route)
+                return text
+            route.finish(time.perf_counter() - start)
+            route.settle_tokens(text)
+            self._record_provider_meta(call_meta, route)
+            self._record_telemetry_route(telemetry, route)
+            return text
+        raise self._provider_error(last_error)
+
+    def _invoke_stream(
+        self,
+        factory: Callable[[LLM], Iterator[str]],
+        payload: Any = None,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> Iterator[str]:
+        """
+        建立同步串流 LLM 呼叫；尚未產生任何片段前失敗時改用備援 provider
+
+        並行額度會保留到串流結束，斷路器與並行限制器以第一個片段的時間作為延遲。
+
+        Args:
+            factory: 以指定 LLM 實例建立串流的函數
+            payload: prompt 字串或 ChatMessage 列表（用於估計 token 額度）
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+
+        Yields:
+            文字片段
+        """
+        prompt_tokens = self._estimate_payload_tokens(payload)
+        if telemetry is not None:
+            telemetry.estimate_prompt(prompt_tokens)
+        last_error: Optional[BaseException] = None
+        for route in self._available_providers():
+            try:
+                self._acquire_slot(route, prompt_tokens, telemetry)
+            except _SHED_ERRORS as e:
+                last_error = e
+                continue
+            start = time.perf_counter()
+            first_latency: Optional[float] = None
+            chunks: List[str] = []
+            try:
+                for delta in factory(route.llm):
+                    if first_latency is None:
+                        first_latency = time.perf_counter() - start
+                        self._record_telemetry_route(telemetry, route)
+                    chunks.append(delta)
+                    yield delta
+            except Exception as e:
+                route.finish(time.perf_counter() - start, error=e)
+                # 已送出部分內容時無法切換 provider
+                if first_latency is not None:
+                    raise
+                logger.warning(f"Provider {route.name} 串流失敗: {e}")
+                last_error = e
+                continue
+            except BaseException:
+                # 呼叫端提前關閉串流：已收到內容時視為成功
+                if first_latency is None:
+                    route.finish(time.perf_counter() - start, cancelled=True)
+                else:
+                    route.finish(first_latency)
+                    route.settle_tokens("".join(chunks))
+                raise
+            route.finish(first_latency or time.perf_counter() - start)
+            route.settle_tokens("".join(chunks))
+            return
+        raise self._provider_error(last_error)
+
+    async def _ainvoke_stream(
+        self,
+        factory: Callable[[LLM], AsyncIterator[str]],
+        payload: Any = None,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> AsyncIterator[str]:
+        """
+        建立非同步串流 LLM 呼叫；尚未產生任何片段前失敗時改用備援 provider
+
+        啟用 hedging 時，主要 provider 以第一個 token 的時間決定是否呼叫次要 provider。
+        並行額度會保留到串流結束，斷路器與並行限制器以第一個 token 的時間作為延遲。
+
+        Args:
+            factory: 以指定 LLM 實例建立串流的函數
+            payload: prompt 字串或 ChatMessage 列表（用於估計 token 額度）
+            telemetry: 可選的 CallTelemetry，記錄排隊時間與實際回應的 provider
+
+        Yields:
+            文字片段
+        """
+        prompt_tokens = self._estimate_payload_tokens(payload)
+        if telemetry is not None:
+            telemetry.estimate_prompt(prompt_tokens)
+        last_error: Optional[BaseException] = None
+        for route in self._available_providers():
+            try:
+                await self._aacquire_slot(route, prompt_tokens, telemetry)
+            except _SHED_ERRORS as e:
+                last_error = e
+                continue
+            outcome: Dict[str, Any] = {"winner": PRIMARY}
+            if route.index == 0 and self.hedging_policy is not None:
+                stream = self.hedging_policy.stream(
+                    lambda: factory(route.llm),
+                    lambda: self._astream_secondary(factory, prompt_tokens),
+                    outcome,
+                )
+            else:
+                stream = factory(route.llm)
+            start = time.perf_counter()
+            first_latency: Optional[float] = None
+            chunks: List[str] = []
+
+            def finish(
+                latency: float, error: Optional[BaseException] = None, cancelled: bool = False
+            ) -> None:
+                # 次要 provider 勝出時結果已記錄在次要 provider，主要 provider 只歸還額度
+                if outcome["winner"] == SECONDARY:
+                    self._release_hedged_primary(route, time.perf_counter() - start)
+                    return
+                route.finish(latency, error=error, cancelled=cancelled)
+                if error is None and not cancelled:
+                    route.settle_tokens("".join(chunks))
+
+            try:
+                async for delta in stream:
+                    if first_latency is None:
+                        first_latency = time.perf_counter() - start
+                        winning = self._hedge_route if outcome["winner"] == SECONDARY else route
+                        self._record_telemetry_route(telemetry, winning)
+                    chunks.append(delta)
+                    yield delta
+            except Exception as e:
+                finish(time.perf_counter() - start, error=e)
+                if first_latency is not None:
+                    raise
+                logger.warning(f"Provider {route.name} 串流失敗: {e}")
+                last_error = e
+                continue
+            except BaseException:
+                if first_latency is None:
+                    finish(time.perf_counter() - start, cancelled=True)
+                else:
+                    finish(first_latency)
+                raise
+            finally:
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()
+            finish(first_latency or time.perf_counter() - start)
+            return
+        raise self._provider_error(last_error)
+
+    def _chat_with_llm(
+        self,
+        request: AgentRequest,
+        call_meta: Optional[Dict[str, Any]] = None,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> str:
+        """
+        直接使用 LLM 進行對話（同步版本）
+
+        Args:
+            request: Agent 請求
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata（例如快取命中）
+            telemetry: 可選的 CallTelemetry，記錄各階段耗時與 token 用量
+
+        Returns:
+            LLM 回應文字
+        """
+        if self.config.use_chat_api:
+            layout = self._build_prompt_layout(telemetry)
+
+            def call(llm: LLM) -> str:
+                response = llm.chat(self._chat_messages_for(layout, llm))
+                self._record_usage(call_meta, telemetry, response.raw)
+                return response.message.content or ""
+
+            return self._deduplicated_call(layout.messages, call, call_meta, telemetry)
+
+        prompt = self._build_chat_prompt(request, telemetry)
+
+        def complete(llm: LLM) -> str:
+            response = llm.complete(prompt)
+            self._record_usage(call_meta, telemetry, response.raw)
+            return response.text
+
+        if self.ollama_context is not None:
+            # context 與 session 綁定，不使用回應快取與相同請求合併；備援 provider 使用完整 prompt
+            def call_with_context(llm: LLM) -> str:
+                if llm is not self.llm or not hasattr(llm, "client"):
+                    return complete(llm)
+                text, stats = self.ollama_context.generate(llm, self.state.memory, request.message)
+                if telemetry is not None:
+                    telemetry.record_usage(stats)
+                if call_meta is not None:
+                    call_meta["ollama_context"] = stats
+                return text
+
+            return self._invoke(call_with_context, call_meta, prompt, telemetry)
 
         # 呼叫 LLM
-        response = self.llm.complete(prompt)
-        return response.text
+        return self._deduplicated_call(prompt, complete, call_meta, telemetry)
 
-    async def _achat_with_llm(self, request: AgentRequest) -> str:
+    async def _achat_with_llm(
+        self,
+        request: AgentRequest,
+        call_meta: Optional[Dict[str, Any]] = None,
+        telemetry: Optional[CallTelemetry] = None,
+    ) -> str:
         """
         直接使用 LLM 進行對話（非同步版本）
 
         Args:
             request: Agent 請求
+            call_meta: 可選的字典，用於收集本次呼叫的 metadata（例如快取命中）
+            telemetry: 可選的 CallTelemetry，記錄各階段耗時與 token 用量
 
         Returns:
             LLM 回應文字
         """
-        # 建立 prompt
-        chat_history = self.state.get_chat_history()
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history[:-1]])
+        if self.config.use_chat_api:
+            layout = self._build_prompt_layout(telemetry)
 
-        prompt = PromptManager.get_chat_prompt(
-            user_message=request.message,
-            chat_history=history_text,
-        )
+            async def call(llm: LLM) -> str:
+                response = await llm.achat(self._chat_messages_for(layout, llm))
+                self._record_usage(call_meta, telemetry, response.raw)
+                return response.message.content or ""
+
+            return await self._adeduplicated_call(layout.messages, call, call_meta, telemetry)
+
+        prompt = self._build_chat_prompt(request, telemetry)
+
+        async def call(llm: LLM) -> str:
+            response = await llm.acomplete(prompt)
+            self._record_usage(call_meta, telemetry, response.raw)
+            return response.text
+
+        if self.ollama_context is not None:
+            # context 與 session 綁定，不使用回應快取與相同請求合併；備援 provider 使用完整 prompt
+            async def call_with_context(llm: LLM) -> str:
+                if llm is not self.llm or not hasattr(llm, "async_client"):
+                    return await call(llm)
+                text, stats = await self.ollama_context.agenerate(
+                    llm, self.state.memory, request.message
+                )
+                if telemetry is not None:
+                    telemetry.record_usage(stats)
+                if call_meta is not None:
+                    call_meta["ollama_context"] = stats
+                return text
+
+            return await self._ainvoke(call_with_context, call_meta, prompt, telemetry)
 
         # 呼叫 LLM（非同步）
-        response = await self.llm.acomplete(prompt)
-        return response.text
+        return await self._adeduplicated_call(prompt, call, call_meta, telemetry)
 
-    def complete(self, prompt: str, **kwargs) -> str:
+    def complete(self, prompt: str, user_id: Optional[str] = None, **kwargs) -> str:
         """
         完成文字（同步版本）
 
         Args:
             prompt: 提示詞
+            user_id: 可選的使用者 ID（設定 user_rate_limit 時套用該使用者的速率限制）
             **kwargs: 額外的參數
 
         Returns:
             完成的文字
         """
-        try:
-            response = self.llm.complete(prompt, **kwargs)
+        telemetry = self._start_telemetry("complete")
+
+        def call(llm: LLM) -> str:
+            response = llm.complete(prompt, **kwargs)
+            self._record_usage(None, telemetry, response.raw)
             return response.text
+
+        try:
+            user_limiter = None
+            if user_id:
+                user_limiter, user_tokens = self._user_rate_limit(
+                    AgentRequest(message=prompt, user_id=user_id)
+                )
+            if user_limiter is not None:
+                wait_start = time.perf_counter()
+                user_limiter.acquire_sync(user_tokens)
+                telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+            text = self._deduplicated_call(prompt, call, telemetry=telemetry, **kwargs)
+            self._settle_user_tokens(user_limiter, text)
+            self._finish_telemetry(telemetry, text)
+            return text
         except Exception as e:
+            self._finish_telemetry(telemetry, "", error=e)
             error_msg = format_error_message(e, "complete")
             logger.error(error_msg, exc_info=True)
             raise
 
-    async def acomplete(self, prompt: str, **kwargs) -> str:
+    async def acomplete(self, prompt: str, user_id: Optional[str] = None, **kwargs) -> str:
         """
         完成文字（非同步版本）
 
         Args:
             prompt: 提示詞
+            user_id: 可選的使用者 ID（設定 user_rate_limit 時套用該使用者的速率限制）
             **kwargs: 額外的參數
 
         Returns:
             完成的文字
         """
-        try:
-            response = await self.llm.acomplete(prompt, **kwargs)
+        telemetry = self._start_telemetry("acomplete")
+
+        async def call(llm: LLM) -> str:
+            response = await llm.acomplete(prompt, **kwargs)
+            self._record_usage(None, telemetry, response.raw)
             return response.text
+
+        try:
+            user_limiter = None
+            if user_id:
+                user_limiter, user_tokens = self._user_rate_limit(
+                    AgentRequest(message=prompt, user_id=user_id)
+                )
+            if user_limiter is not None:
+                wait_start = time.perf_counter()
+                await user_limiter.acquire(user_tokens)
+                telemetry.add_queue_wait(time.perf_counter() - wait_start)
+
+            text = await self._adeduplicated_call(prompt, call, telemetry=telemetry, **kwargs)
+            self._settle_user_tokens(user_limiter, text)
+            self._finish_telemetry(telemetry, text)
+            return text
         except Exception as e:
+            self._finish_telemetry(telemetry, "", error=e)
             error_msg = format_error_message(e, "achat")
             logger.error(error_msg, exc_info=True)
             raise
 
+    async def aiter_batch_complete(
+        self,
+        prompts: Sequence[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[BatchCompletionResult]:
+        """
+        並行完成多個提示詞，依完成順序逐一產生結果
+
+        由固定數量的 worker 從佇列取出提示詞執行，同時進行的 LLM 呼叫不超過 max_concurrency。
+
+        Args:
+            prompts: 提示詞列表
+            max_concurrency: 最大並行數
+            return_exceptions: 為 True 時失敗的項目以 success=False 回傳；
+                為 False 時第一個錯誤會取消其餘項目並拋出
+            **kwargs: 傳給 acomplete 的額外參數
+
+        Yields:
+            BatchCompletionResult（依完成順序，可用 index 對應輸入位置）
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency 必須大於 0")
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for item in enumerate(prompts):
+            pending.put_nowait(item)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index, prompt = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    text = await self.acomplete(prompt, **kwargs)
+                    result: Any = BatchCompletionResult(
+                        index=index,
+                        prompt=prompt,
+                        response=text,
+                        latency_ms=(time.perf_counter() - start) * 1000,
+                    )
+                except Exception as e:
+                    if not return_exceptions:
+                        result = e
+                    else:
+                        result = BatchCompletionResult(
+                            index=index,
+                            prompt=prompt,
+                            success=False,
+                            error=format_error_message(e),
+                            latency_ms=(time.perf_counter() - start) * 1000,
+                        )
+                await results.put(result)
+
+        total = pending.qsize()
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(max_concurrency, total))]
+        try:
+            for _ in range(total):
+                result = await results.get()
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def abatch_complete(
+        self,
+        prompts: Sequence[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[BatchCompletionResult]:
+        """
+        並行完成多個提示詞（非同步版本），結果順序與輸入相同
+
+        Args:
+            prompts: 提示詞列表
+            max_concurrency: 最大並行數
+            return_exceptions: 為 True 時失敗的項目以 success=False 回傳，否則拋出第一個錯誤
+            **kwargs: 傳給 acomplete 的額外參數
+
+        Returns:
+            BatchCompletionResult 列表（與 prompts 順序相同）
+        """
+        results: List[Optional[BatchCompletionResult]] = [None] * len(prompts)
+        async for result in self.aiter_batch_complete(
+            prompts, max_concurrency=max_concurrency, return_exceptions=return_exceptions, **kwargs
+        ):
+            results[result.index] = result
+        # aiter_batch_complete 為每個提示詞恰好產生一個結果（或拋出例外）
+        assert all(result is not None for result in results)
+        return cast(List[BatchCompletionResult], results)
+
+    def batch_complete(
+        self,
+        prompts: Sequence[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[BatchCompletionResult]:
+        """
+        並行完成多個提示詞（同步版本，不可在執行中的 event loop 內呼叫）
+
+        Args:
+            prompts: 提示詞列表
+            max_concurrency: 最大並行數
+            return_exceptions: 為 True 時失敗的項目以 success=False 回傳，否則拋出第一個錯誤
+            **kwargs: 傳給 acomplete 的額外參數
+
+        Returns:
+            BatchCompletionResult 列表（與 prompts 順序相同）
+        """
+        return asyncio.run(
+            self.abatch_complete(
+                prompts,
+                max_concurrency=max_concurrency,
+                return_exceptions=return_exceptions,
+                **kwargs,
+            )
+        )
+
+    def stream_complete(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        串流完成文字（同步版本）
+
+        Args:
+            prompt: 提示詞
+            **kwargs: 額外的參數
+
+        Yields:
+            完成文字片段
+        """
+        telemetry = self._start_telemetry("stream_complete")
+        chunks: List[str] = []
+        error: Optional[BaseException] = None
+        try:
+            stream = self._invoke_stream(
+                lambda llm: (chunk.delta for chunk in llm.stream_complete(prompt, **kwargs)),
+                prompt,
+                telemetry,
+            )
+            for delta in stream:
+                if delta:
+                    telemetry.first_token()
+                    chunks.append(delta)
+                    yield delta
+        except Exception as e:
+            error = e
+            error_msg = format_error_message(e, "stream_complete")
+            logger.error(error_msg, exc_info=True)
+            raise
+        finally:
+            self._finish_telemetry(telemetry, "".join(chunks), error=error)
+
+    async def astream_complete(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        串流完成文字（非同步版本）
+
+        Args:
+            prompt: 提示詞
+            **kwargs: 額外的參數
+
+        Yields:
+            完成文字片段
+        """
+
+        async def deltas(llm: LLM) -> AsyncIterator[str]:
+            stream = await llm.astream_complete(prompt, **kwargs)
+            async for chunk in stream:
+                if chunk.delta:
+                    yield chunk.delta
+
+        telemetry = self._start_telemetry("astream_complete")
+        chunks: List[str] = []
+        error: Optional[BaseException] = None
+        tokens = self._deduplicated_stream(prompt, deltas, telemetry, **kwargs)
+        try:
+            async for delta in tokens:
+                telemetry.first_token()
+                chunks.append(delta)
+                yield delta
+        except Exception as e:
+            error = e
+            error_msg = format_error_message(e, "astream_complete")
+            logger.error(error_msg, exc_info=True)
+            raise
+        finally:
+            self._finish_telemetry(telemetry, "".join(chunks), error=error)
+
     def reset_state(self, keep_session: bool = False) -> None:
         """
         重置 Agent State
@@ -348,9 +1854,12 @@ class BaseAgent:
             keep_session: 是否保留 session_id
         """
         self.state.reset(keep_session=keep_session)
-        # 如果使用 Agent 模式，需要重新建立 Agent（因為 memory 已重置）
-        if self.config.use_agent_mode:
-            self.agent = self._create_agent()
+        # memory 已重置，ReActAgent 在下一次對話時重建
+        self._agent = None
+        if self.compactor is not None:
+            self.compactor.cancel()
+        if self.ollama_context is not None:
+            self.ollama_context.invalidate()
 
     def get_state(self) -> Dict[str, Any]:
         """
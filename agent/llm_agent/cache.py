@@ -0,0 +1,288 @@
+"""LLM 回應快取模組"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+def _normalize_text(text: str) -> str:
+    """正規化文字：統一換行符號並移除頭尾空白"""
+    return text.replace("\r\n", "\n").strip()
+
+
+def make_cache_key(provider: str, model: str, params: Dict[str, Any], payload: Any) -> str:
+    """
+    產生回應快取的鍵
+
+    Args:
+        provider: LLM provider 名稱
+        model: 模型名稱
+        params: 取樣參數（temperature、top_p 等）
+        payload: prompt 字串，或 (role, content) 組成的訊息列表
+
+    Returns:
+        SHA-256 十六進位字串
+    """
+    if isinstance(payload, str):
+        normalized: Any = _normalize_text(payload)
+    else:
+        normalized = [[role, _normalize_text(content or "")] for role, content in payload]
+
+    raw = json.dumps(
+        {"provider": provider, "model": model, "params": params, "payload": normalized},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BaseResponseCache(ABC):
+    """回應快取的抽象介面，可自訂實作後傳入 BaseAgent"""
+
+    def __init__(self):
+        """初始化命中統計"""
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        """讀取快取（不更新統計）"""
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """
+        寫入快取
+
+        Args:
+            key: 快取鍵
+            value: LLM 回應文字
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清除所有快取"""
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        讀取快取並更新命中統計
+
+        Args:
+            key: 快取鍵
+
+        Returns:
+            快取的回應文字，未命中或已過期時返回 None
+        """
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            包含 hits、misses、hit_rate 的字典
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class InMemoryResponseCache(BaseResponseCache):
+    """記憶體內的 LRU + TTL 回應快取"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        """
+        初始化記憶體快取
+
+        Args:
+            max_entries: 最大項目數，超過時淘汰最久未使用的項目
+            ttl: 項目存活時間（秒，None 表示不過期）
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        """讀取快取（不更新統計）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """寫入快取"""
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """取得快取項目數量"""
+        return len(self._entries)
+
+
+class SQLiteResponseCache(BaseResponseCache):
+    """以 SQLite 檔案儲存的回應快取，重新啟動後仍然有效"""
+
+    def __init__(self, path: str, ttl: Optional[float] = 3600.0, max_entries: Optional[int] = None):
+        """
+        初始化 SQLite 快取
+
+        Args:
+            path: SQLite 資料庫檔案路徑
+            ttl: 項目存活時間（秒，None 表示不過期）
+            max_entries: 最大項目數（None 表示無限制），超過時刪除最舊的項目
+        """
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created_at)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[str]:
+        """讀取快取（不更新統計）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """寫入快取"""
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, expires_at),
+            )
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    "SELECT key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """關閉資料庫連線"""
+        with self._lock:
+            self._conn.close()
+
+
+class TieredResponseCache(BaseResponseCache):
+    """兩層回應快取：記憶體 LRU 在前、SQLite 磁碟層在後，磁碟命中時回填記憶體"""
+
+    def __init__(self, memory: InMemoryResponseCache, disk: SQLiteResponseCache):
+        """
+        初始化兩層快取
+
+        Args:
+            memory: 記憶體快取
+            disk: 磁碟快取
+        """
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> Optional[str]:
+        """讀取快取（不更新統計）"""
+        value = self.memory._get(key)
+        if value is not None:
+            return value
+        value = self.disk._get(key)
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """寫入快取"""
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        self.memory.clear()
+        self.disk.clear()
+
+
+def create_response_cache(
+    max_entries: int = 1024,
+    ttl: Optional[float] = 3600.0,
+    path: Optional[str] = None,
+) -> BaseResponseCache:
+    """
+    依設定建立回應快取
+
+    Args:
+        max_entries: 記憶體層最大項目數
+        ttl: 項目存活時間（秒）
+        path: SQLite 檔案路徑（None 表示只使用記憶體快取）
+
+    Returns:
+        回應快取實例
+    """
+    memory = InMemoryResponseCache(max_entries=max_entries, ttl=ttl)
+    if not path:
+        return memory
+    return TieredResponseCache(memory, SQLiteResponseCache(path, ttl=ttl))
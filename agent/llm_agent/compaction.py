@@ -0,0 +1,183 @@
+"""對話記憶背景壓縮（滾動摘要）模組"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from .config import MemoryCompactionConfig
+from .prompts import PromptManager
+from .ratelimit import estimate_tokens
+from .state.memory import ChatMemory
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "先前對話摘要："
+
+
+def _message_tokens(messages: List[ChatMessage]) -> int:
+    """估計訊息列表的 token 數"""
+    return sum(estimate_tokens(message.content or "") for message in messages)
+
+
+class MemoryCompactor:
+    """
+    對話記憶壓縮器
+
+    每輪對話結束後檢查歷史 token 數，超過水位時在背景執行緒以摘要模型濃縮最舊的一段訊息
+    （保留最新的 keep_recent_messages 則），不阻塞目前的對話；摘要完成後於下一輪對話開始時
+    以一則摘要訊息取代該段訊息。已有的摘要訊息會一起被濃縮，形成滾動摘要。
+    """
+
+    def __init__(
+        self,
+        complete: Callable[[str], str],
+        config: MemoryCompactionConfig,
+        memory_token_limit: Optional[int] = None,
+    ):
+        """
+        初始化 MemoryCompactor
+
+        Args:
+            complete: 以摘要模型完成 prompt 並回傳文字的函數（由 Agent 提供，經過斷路器、
+                並行限制與速率限制）
+            config: MemoryCompactionConfig 實例
+            memory_token_limit: 記憶的 token 限制（用於推算預設水位）
+        """
+        self.complete = complete
+        self.config = config
+        if config.trigger_tokens is not None:
+            self.trigger_tokens = config.trigger_tokens
+        elif memory_token_limit is not None:
+            self.trigger_tokens = int(memory_token_limit * 0.8)
+        else:
+            self.trigger_tokens = 3000
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._span: List[ChatMessage] = []
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Any] = {
+            "compactions": 0,
+            "failures": 0,
+            "discarded": 0,
+            "tokens_before": 0,
+            "tokens_after": 0,
+            "duration_ms": 0.0,
+        }
+
+    def schedule(self, memory: ChatMemory) -> bool:
+        """
+        歷史超過水位時在背景開始摘要最舊的一段訊息
+
+        Args:
+            memory: 要壓縮的 ChatMemory
+
+        Returns:
+            是否已開始新的摘要
+        """
+        with self._lock:
+            if self._pending is not None:
+                return False
+            if memory.token_count() < self.trigger_tokens:
+                return False
+            messages = memory.get_all_messages()
+            span = messages[: max(0, len(messages) - self.config.keep_recent_messages)]
+            if len(span) < self.config.min_messages:
+                return False
+            self._span = span
+            self._pending = _get_executor().submit(self._summarize, span)
+            return True
+
+    def _summarize(self, span: List[ChatMessage]) -> Dict[str, Any]:
+        """產生摘要（在背景執行緒中執行）"""
+        start = time.perf_counter()
+        conversation = "\n".join(f"{message.role.value}: {message.content}" for message in span)
+        prompt = PromptManager.get_summary_prompt(conversation, self.config.max_summary_tokens)
+        summary = self.complete(prompt).strip()
+        return {"summary": summary, "duration_ms": (time.perf_counter() - start) * 1000}
+
+    def apply(self, memory: ChatMemory) -> Optional[Dict[str, Any]]:
+        """
+        若背景摘要已完成，以摘要訊息取代對應的訊息（應在對話開始前呼叫，不會等待）
+
+        Args:
+            memory: 要壓縮的 ChatMemory
+
+        Returns:
+            本次壓縮的統計（messages、tokens_before、tokens_after、compaction_ratio、
+            duration_ms），沒有可套用的摘要時為 None
+        """
+        with self._lock:
+            future = self._pending
+            if future is None or not future.done():
+                return None
+            self._pending = None
+            span, self._span = self._span, []
+            try:
+                outcome = future.result()
+            except Exception as e:
+                self._counters["failures"] += 1
+                logger.warning(f"對話記憶壓縮失敗：{e}")
+                return None
+
+            summary_message = ChatMessage(
+                role=MessageRole.SYSTEM, content=f"{SUMMARY_PREFIX}\n{outcome['summary']}"
+            )
+            if not outcome["summary"] or not memory.replace_prefix(span, summary_message):
+                # 摘要為空，或摘要期間記憶已被重置
+                self._counters["discarded"] += 1
+                return None
+
+            tokens_before = _message_tokens(span)
+            tokens_after = _message_tokens([summary_message])
+            self._counters["compactions"] += 1
+            self._counters["tokens_before"] += tokens_before
+            self._counters["tokens_after"] += tokens_after
+            self._counters["duration_ms"] += outcome["duration_ms"]
+            return {
+                "messages": len(span),
+                "tokens_before": tokens_before,
+                "tokens_after": tokens_after,
+                "compaction_ratio": tokens_after / tokens_before if tokens_before else 1.0,
+                "duration_ms": outcome["duration_ms"],
+            }
+
+    def cancel(self) -> None:
+        """放棄進行中的摘要（例如記憶被重置時）"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.cancel()
+            self._pending = None
+            self._span = []
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得累計統計
+
+        Returns:
+            包含 compactions、failures、discarded、tokens_before、tokens_after、
+            compaction_ratio、duration_ms 與 pending 的字典
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters["pending"] = self._pending is not None
+        before = counters["tokens_before"]
+        counters["compaction_ratio"] = counters["tokens_after"] / before if before else 1.0
+        return counters
+
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """取得（必要時建立）程序共用的摘要執行緒池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="memory-compaction"
+            )
+        return _executor
@@ -0,0 +1,326 @@
+"""LLM provider 自適應並行限制（AIMD）模組"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+class ConcurrencyLimitExceeded(RuntimeError):
+    """等待佇列已滿或等待逾時，請求被拒絕（load shedding）時拋出"""
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    判斷錯誤是否代表 provider 過載（逾時、HTTP 429 / 503）
+
+    Args:
+        error: 呼叫 provider 時發生的例外
+
+    Returns:
+        是否為過載錯誤
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    # httpx / openai / anthropic 的逾時例外名稱皆包含 Timeout
+    if "Timeout" in type(error).__name__:
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status in (429, 503)
+
+
+class _Waiter:
+    """等待並行額度的請求"""
+
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.granted = False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    以 AIMD 調整上限的並行限制器
+
+    延遲正常且並行已接近上限時，每完成一輪（約 limit 個請求）上限加 1；遇到逾時、429 / 503
+    或延遲超過基準延遲 latency_tolerance 倍時，上限乘以 backoff_ratio。超過上限的請求進入 FIFO
+    佇列等待，佇列已滿或等待逾時則直接拒絕。同時支援 asyncio 與執行緒呼叫端。
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_window: int = 100,
+        decrease_cooldown: float = 1.0,
+        max_queue: Optional[int] = 256,
+        queue_timeout: Optional[float] = None,
+    ):
+        """
+        初始化 AdaptiveConcurrencyLimiter
+
+        Args:
+            name: 限制器名稱（用於統計）
+            initial_limit: 初始並行上限
+            min_limit: 並行上限下限
+            max_limit: 並行上限上限
+            backoff_ratio: 過載時上限的乘數（0-1）
+            latency_tolerance: 近期延遲超過基準延遲（視窗中位數）幾倍時視為延遲膨脹
+            latency_window: 計算基準延遲的樣本數
+            decrease_cooldown: 兩次調降上限之間的最短間隔（秒），避免同一波失敗重複調降
+            max_queue: 等待佇列上限（None 表示不限制，0 表示不排隊直接拒絕）
+            queue_timeout: 最長等待時間（秒，None 表示不限制）
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.decrease_cooldown = decrease_cooldown
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._limit = float(min(max_limit, max(min_limit, initial_limit)))
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._recent_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"acquired": 0, "queued": 0, "rejected": 0, "increases": 0, "decreases": 0}
+
+    @classmethod
+    def from_config(cls, name: str, config: Any) -> "AdaptiveConcurrencyLimiter":
+        """
+        從 ConcurrencyLimitConfig 建立限制器
+
+        Args:
+            name: 限制器名稱
+            config: ConcurrencyLimitConfig 實例
+
+        Returns:
+            AdaptiveConcurrencyLimiter 實例
+        """
+        return cls(
+            name=name,
+            initial_limit=config.initial_limit,
+            min_limit=config.min_limit,
+            max_limit=config.max_limit,
+            backoff_ratio=config.backoff_ratio,
+            latency_tolerance=config.latency_tolerance,
+            latency_window=config.latency_window,
+            decrease_cooldown=config.decrease_cooldown,
+            max_queue=config.max_queue,
+            queue_timeout=config.queue_timeout,
+        )
+
+    @property
+    def limit(self) -> int:
+        """目前的並行上限"""
+        return int(self._limit)
+
+    def _try_acquire_locked(self, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """
+        嘗試立即取得額度，否則加入等待佇列（呼叫端需持有 self._lock）
+
+        Returns:
+            None 表示已取得額度，否則為等待中的 _Waiter
+        """
+        if self._in_flight < int(self._limit) and not self._waiters:
+            self._in_flight += 1
+            self._counters["acquired"] += 1
+            return None
+        if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise ConcurrencyLimitExceeded(
+                f"Provider {self.name} 並行已達上限 {int(self._limit)}，等待佇列已滿"
+            )
+        waiter = _Waiter(wake)
+        self._waiters.append(waiter)
+        self._counters["queued"] += 1
+        return waiter
+
+    def _grant_locked(self) -> None:
+        """依目前上限喚醒等待中的請求（呼叫端需持有 self._lock）"""
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            self._counters["acquired"] += 1
+            waiter.wake()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """
+        放棄等待（逾時或取消）
+
+        Returns:
+            額度是否已在同時被分配（此時呼叫端仍持有額度）
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _timeout_error(self) -> ConcurrencyLimitExceeded:
+        """等待逾時的錯誤"""
+        with self._lock:
+            self._counters["rejected"] += 1
+        return ConcurrencyLimitExceeded(
+            f"Provider {self.name} 等待並行額度超過 {self.queue_timeout} 秒"
+        )
+
+    async def acquire(self) -> None:
+        """
+        取得並行額度（非同步版本），完成後必須呼叫 release
+
+        Raises:
+            ConcurrencyLimitExceeded: 等待佇列已滿或等待逾時
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            waiter = self._try_acquire_locked(wake)
+        if waiter is None:
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise self._timeout_error()
+        except BaseException:
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def acquire_sync(self) -> None:
+        """
+        取得並行額度（同步版本），完成後必須呼叫 release
+
+        Raises:
+            ConcurrencyLimitExceeded: 等待佇列已滿或等待逾時
+        """
+        event = threading.Event()
+        with self._lock:
+            waiter = self._try_acquire_locked(event.set)
+        if waiter is None:
+            return
+        if not event.wait(self.queue_timeout) and not self._abandon(waiter):
+            raise self._timeout_error()
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        歸還並行額度並依結果調整上限
+
+        Args:
+            latency: 成功呼叫的延遲（秒，None 表示不調整，例如呼叫被取消或一般錯誤）
+            overloaded: 是否為過載錯誤（逾時、429 / 503）
+        """
+        with self._lock:
+            saturated = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+
+            if overloaded:
+                self._decrease_locked()
+            elif latency is not None:
+                # 以近期延遲的指數移動平均與視窗中位數比較，避免單一長回應造成誤判
+                baseline = self._median_latency_locked() or latency
+                self._latencies.append(latency)
+                self._recent_latency = (
+                    latency
+                    if self._recent_latency is None
+                    else self._recent_latency * 0.8 + latency * 0.2
+                )
+                if self._recent_latency > baseline * self.latency_tolerance:
+                    self._decrease_locked()
+                elif saturated and self._limit < self.max_limit:
+                    # 加法增加：每完成約 limit 個請求上限加 1
+                    previous = int(self._limit)
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                    if int(self._limit) > previous:
+                        self._counters["increases"] += 1
+
+            self._grant_locked()
+
+    def _median_latency_locked(self) -> Optional[float]:
+        """視窗內延遲的中位數（呼叫端需持有 self._lock）"""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[len(ordered) // 2]
+
+    def _decrease_locked(self) -> None:
+        """乘法減少上限（呼叫端需持有 self._lock）"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        self._counters["decreases"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得限制器統計
+
+        Returns:
+            包含目前上限、進行中請求數、佇列深度與拒絕次數的字典
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "median_latency": self._median_latency_locked(),
+                "recent_latency": self._recent_latency,
+                **self._counters,
+            }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limiter(key: str, name: str, config: Any) -> AdaptiveConcurrencyLimiter:
+    """
+    取得（必要時建立）程序共用的並行限制器，讓相同 provider 配置的所有 Agent 共用同一個上限
+
+    Args:
+        key: 限制器鍵（通常為 LLMConfig 的雜湊）
+        name: 限制器名稱
+        config: ConcurrencyLimitConfig 實例
+
+    Returns:
+        AdaptiveConcurrencyLimiter 實例
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter.from_config(name, config)
+            _limiters[key] = limiter
+        return limiter
+
+
+def concurrency_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    取得所有並行限制器的統計
+
+    Returns:
+        限制器鍵 -> 統計字典
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key: limiter.stats() for key, limiter in limiters.items()}
@@ -5,7 +5,56 @@ from typing import Any, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
-from .llm_config import LLMConfig, LLMProvider, OllamaConfig
+from .llm_config import LLMConfig, LLMProvider, OllamaConfig, RateLimitConfig
+
+
+class MemoryCompactionConfig(BaseModel):
+    """對話記憶壓縮配置：歷史超過水位時，在背景以摘要取代最舊的一段對話"""
+
+    trigger_tokens: Optional[int] = Field(
+        default=None,
+        description="觸發壓縮的歷史 token 數（None 表示 memory_token_limit 的 80%，未設定限制時為 3000）",
+        gt=0,
+    )
+    keep_recent_messages: int = Field(
+        default=6,
+        description="壓縮時保留不摘要的最新訊息數",
+        ge=0,
+    )
+    min_messages: int = Field(
+        default=4,
+        description="至少累積幾則可摘要的訊息才進行壓縮",
+        gt=0,
+    )
+    max_summary_tokens: int = Field(
+        default=512,
+        description="摘要長度上限（token）",
+        gt=0,
+    )
+    summarizer: Optional[LLMConfig] = Field(
+        default=None,
+        description="產生摘要的 LLM 配置（建議使用較便宜的模型，None 表示使用 Agent 的 LLM）",
+    )
+
+    @classmethod
+    def from_env(cls, prefix: str = "MEMORY_COMPACTION") -> Optional["MemoryCompactionConfig"]:
+        """
+        從 {prefix}_ENABLED、{prefix}_TRIGGER_TOKENS、{prefix}_KEEP_RECENT 環境變數建立配置
+
+        Args:
+            prefix: 環境變數前綴
+
+        Returns:
+            MemoryCompactionConfig 實例（未啟用時為 None）
+        """
+        if os.getenv(f"{prefix}_ENABLED", "false").lower() != "true":
+            return None
+        trigger = os.getenv(f"{prefix}_TRIGGER_TOKENS")
+        keep_recent = os.getenv(f"{prefix}_KEEP_RECENT")
+        return cls(
+            trigger_tokens=int(trigger) if trigger else None,
+            keep_recent_messages=int(keep_recent) if keep_recent else 6,
+        )
 
 
 class AgentConfig(BaseModel):
@@ -27,11 +76,111 @@ class AgentConfig(BaseModel):
         description="是否使用 ReActAgent 模式（False 表示直接使用 LLM）",
     )
 
+    use_chat_api: bool = Field(
+        default=False,
+        description="是否以 ChatMessage 列表呼叫 LLM chat 介面（False 表示將歷史轉為單一 completion prompt）",
+    )
+
     # Memory 配置
     memory_token_limit: Optional[int] = Field(
         default=None,
         description="Memory token 限制（None 表示無限制）",
     )
+    memory_tokenizer: str = Field(
+        default="exact",
+        description="對話記憶的 token 計數方式（exact：tiktoken 精確計數，approximate：依字元數快速估計）",
+    )
+    memory_compaction: Optional[MemoryCompactionConfig] = Field(
+        default=None,
+        description="對話記憶壓縮配置（None 表示不壓縮，超過 memory_token_limit 的訊息直接捨棄）",
+    )
+    prompt_cache_min_tokens: Optional[int] = Field(
+        default=1024,
+        description="穩定前綴達到此 token 數時標記 Anthropic prompt 快取斷點（None 表示不標記）",
+    )
+    memory_store_path: Optional[str] = Field(
+        default=None,
+        description="對話記憶 SQLite 檔案路徑（設定後對話會持久化，重新啟動或換 worker 仍可接續）",
+    )
+
+    # 回應快取配置
+    response_cache_enabled: bool = Field(
+        default=False,
+        description="是否啟用 LLM 回應快取",
+    )
+    response_cache_ttl: Optional[float] = Field(
+        default=3600.0,
+        description="回應快取項目存活時間（秒，None 表示不過期）",
+    )
+    response_cache_max_entries: int = Field(
+        default=1024,
+        description="記憶體回應快取的最大項目數",
+        gt=0,
+    )
+    response_cache_path: Optional[str] = Field(
+        default=None,
+        description="SQLite 磁碟快取檔案路徑（None 表示只使用記憶體快取）",
+    )
+    response_cache_allow_sampling: bool = Field(
+        default=False,
+        description="temperature 大於 0 時是否仍使用快取（預設略過快取）",
+    )
+
+    coalesce_requests: bool = Field(
+        default=True,
+        description="是否合併並行中的相同 LLM 請求（共用同一個 provider 呼叫）",
+    )
+    telemetry_enabled: bool = Field(
+        default=True,
+        description="是否記錄每次呼叫的效能遙測（寫入回應 metadata 並送往指標輸出）",
+    )
+
+    # 工具執行配置
+    tool_max_workers: int = Field(
+        default=8,
+        description="同步工具執行緒池大小",
+        gt=0,
+    )
+    tool_timeout: Optional[float] = Field(
+        default=None,
+        description="工具預設逾時（秒，None 表示不限制；可在註冊工具時個別設定）",
+    )
+    tool_retrieval_top_k: Optional[int] = Field(
+        default=None,
+        description="Agent 模式下每則訊息以 BM25 挑選的工具數（None 表示送出所有工具）",
+        gt=0,
+    )
+    max_tool_results: Optional[int] = Field(
+        default=1000,
+        description="每個 session 保留的工具結果數上限（None 表示不限制）",
+        gt=0,
+    )
+    max_tool_results_per_tool: Optional[int] = Field(
+        default=None,
+        description="每個工具保留的結果數上限（None 表示只受 max_tool_results 限制）",
+        gt=0,
+    )
+
+    # 使用者速率限制
+    user_rate_limit: Optional[RateLimitConfig] = Field(
+        default=None,
+        description="每個 user_id（未提供時為 session_id）的請求數 / token 數速率限制（None 表示不限制）",
+    )
+
+    # Session pool 配置
+    max_sessions: int = Field(
+        default=1000,
+        description="AgentSessionPool 最多保留的 session 數量",
+        gt=0,
+    )
+    session_idle_ttl: Optional[float] = Field(
+        default=1800.0,
+        description="Session 閒置多久（秒）後可被回收（None 表示不依閒置時間回收）",
+    )
+    session_memory_budget: Optional[int] = Field(
+        default=None,
+        description="所有 session 記憶 token 總數上限（None 表示無限制）",
+    )
 
     # 向後兼容：保留舊的配置欄位（已棄用）
     ollama_base_url: Optional[str] = Field(
@@ -83,11 +232,93 @@ class AgentConfig(BaseModel):
         env_vars = {
             "agent_verbose": os.getenv("AGENT_VERBOSE", "false").lower() == "true" or kwargs.get("agent_verbose", False),
             "use_agent_mode": os.getenv("USE_AGENT_MODE", "false").lower() == "true" or kwargs.get("use_agent_mode", False),
+            "use_chat_api": (
+                os.getenv("USE_CHAT_API", "false").lower() == "true"
+                or kwargs.get("use_chat_api", False)
+            ),
             "memory_token_limit": (
                 int(os.getenv("MEMORY_TOKEN_LIMIT"))
                 if os.getenv("MEMORY_TOKEN_LIMIT")
                 else kwargs.get("memory_token_limit")
             ),
+            "memory_tokenizer": os.getenv(
+                "MEMORY_TOKENIZER", kwargs.get("memory_tokenizer", "exact")
+            ),
+            "memory_compaction": MemoryCompactionConfig.from_env()
+            or kwargs.get("memory_compaction"),
+            "memory_store_path": os.getenv("MEMORY_STORE_PATH", kwargs.get("memory_store_path")),
+            "prompt_cache_min_tokens": (
+                int(os.getenv("PROMPT_CACHE_MIN_TOKENS"))
+                if os.getenv("PROMPT_CACHE_MIN_TOKENS")
+                else kwargs.get("prompt_cache_min_tokens", 1024)
+            ),
+            "response_cache_enabled": (
+                os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+                or kwargs.get("response_cache_enabled", False)
+            ),
+            "response_cache_ttl": (
+                float(os.getenv("RESPONSE_CACHE_TTL"))
+                if os.getenv("RESPONSE_CACHE_TTL")
+                else kwargs.get("response_cache_ttl", 3600.0)
+            ),
+            "response_cache_max_entries": (
+                int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES"))
+                if os.getenv("RESPONSE_CACHE_MAX_ENTRIES")
+                else kwargs.get("response_cache_max_entries", 1024)
+            ),
+            "response_cache_path": os.getenv(
+                "RESPONSE_CACHE_PATH", kwargs.get("response_cache_path")
+            ),
+            "response_cache_allow_sampling": (
+                os.getenv("RESPONSE_CACHE_ALLOW_SAMPLING", "false").lower() == "true"
+                or kwargs.get("response_cache_allow_sampling", False)
+            ),
+            "coalesce_requests": os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+            and kwargs.get("coalesce_requests", True),
+            "telemetry_enabled": os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+            and kwargs.get("telemetry_enabled", True),
+            "tool_max_workers": (
+                int(os.getenv("TOOL_MAX_WORKERS"))
+                if os.getenv("TOOL_MAX_WORKERS")
+                else kwargs.get("tool_max_workers", 8)
+            ),
+            "tool_timeout": (
+                float(os.getenv("TOOL_TIMEOUT"))
+                if os.getenv("TOOL_TIMEOUT")
+                else kwargs.get("tool_timeout")
+            ),
+            "tool_retrieval_top_k": (
+                int(os.getenv("TOOL_RETRIEVAL_TOP_K"))
+                if os.getenv("TOOL_RETRIEVAL_TOP_K")
+                else kwargs.get("tool_retrieval_top_k")
+            ),
+            "max_tool_results": (
+                int(os.getenv("MAX_TOOL_RESULTS"))
+                if os.getenv("MAX_TOOL_RESULTS")
+                else kwargs.get("max_tool_results", 1000)
+            ),
+            "max_tool_results_per_tool": (
+                int(os.getenv("MAX_TOOL_RESULTS_PER_TOOL"))
+                if os.getenv("MAX_TOOL_RESULTS_PER_TOOL")
+                else kwargs.get("max_tool_results_per_tool")
+            ),
+            "user_rate_limit": RateLimitConfig.from_env("USER_RATE_LIMIT")
+            or kwargs.get("user_rate_limit"),
+            "max_sessions": (
+                int(os.getenv("AGENT_MAX_SESSIONS"))
+                if os.getenv("AGENT_MAX_SESSIONS")
+                else kwargs.get("max_sessions", 1000)
+            ),
+            "session_idle_ttl": (
+                float(os.getenv("AGENT_SESSION_IDLE_TTL"))
+                if os.getenv("AGENT_SESSION_IDLE_TTL")
+                else kwargs.get("session_idle_ttl", 1800.0)
+            ),
+            "session_memory_budget": (
+                int(os.getenv("AGENT_SESSION_MEMORY_BUDGET"))
+                if os.getenv("AGENT_SESSION_MEMORY_BUDGET")
+                else kwargs.get("session_memory_budget")
+            ),
             # 向後兼容的舊配置
             "ollama_base_url": os.getenv("OLLAMA_BASE_URL", kwargs.get("ollama_base_url")),
             "ollama_model": os.getenv("OLLAMA_MODEL", kwargs.get("ollama_model")),
@@ -0,0 +1,549 @@
+"""本地模擬 LLM 模組：可設定的延遲分布、錯誤注入，以及錄製 / 重播真實 provider 的回應"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.llm import LLM
+
+from .llm_config import FakeConfig
+from .ratelimit import estimate_tokens
+from .telemetry import extract_token_usage
+
+# 模擬回應使用的詞彙（每個詞視為一個 token）
+_WORDS = (
+    "agent", "answer", "batch", "cache", "context", "data", "model", "query", "result",
+    "request", "response", "stream", "system", "task", "token", "tool", "value", "with",
+    "the", "a", "of", "to", "and", "for", "is", "in", "on", "this", "that", "returns",
+)
+_TOKEN_PATTERN = re.compile(r"\s*\S+")
+
+
+class FakeProviderError(Exception):
+    """模擬的 provider HTTP 錯誤"""
+
+    def __init__(self, message: str, status_code: int):
+        """
+        初始化 FakeProviderError
+
+        Args:
+            message: 錯誤訊息
+            status_code: 模擬的 HTTP 狀態碼
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CassetteMissError(LookupError):
+    """replay 模式找不到錄製的請求"""
+
+
+def _make_error(error_type: str) -> Exception:
+    """依類型建立注入的錯誤（timeout 與 overload 會被視為 provider 過載）"""
+    if error_type == "timeout":
+        return TimeoutError("Fake provider 模擬逾時")
+    if error_type == "overload":
+        return FakeProviderError("Fake provider 模擬過載", 429)
+    if error_type == "server":
+        return FakeProviderError("Fake provider 模擬伺服器錯誤", 500)
+    return ConnectionError("Fake provider 模擬連線失敗")
+
+
+def _split_tokens(text: str) -> List[str]:
+    """將文字切成保留空白的片段（串接後與原文相同）"""
+    return _TOKEN_PATTERN.findall(text) or [text]
+
+
+def cassette_key(kind: str, payload: Any) -> str:
+    """
+    計算請求在 cassette 中的鍵
+
+    Args:
+        kind: "complete" 或 "chat"
+        payload: prompt 文字，或 chat 訊息的 [{"role", "content"}] 列表
+
+    Returns:
+        SHA-256 十六進位字串
+    """
+    raw = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    JSON Lines 格式的錄製檔
+
+    每行一筆交換：key、kind、payload、chunks（回應片段）、ttft_ms、gaps_ms（片段間隔）
+    與 usage。同一請求錄製多次時依錄製順序輪流重播。
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化 Cassette 並載入既有的錄製內容
+
+        Args:
+            path: 檔案路徑（不存在時於第一次錄製時建立）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def next(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        取得請求的下一筆錄製回應
+
+        Args:
+            key: cassette_key 計算的鍵
+
+        Returns:
+            錄製的交換，找不到時為 None
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            return entries[index % len(entries)]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        寫入一筆交換
+
+        Args:
+            entry: 錄製的交換（必須包含 key）
+        """
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._entries.setdefault(entry["key"], []).append(entry)
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str) -> Cassette:
+    """
+    取得 cassette；同一路徑共用同一個實例（重播順序與寫入在程序內一致）
+
+    Args:
+        path: 檔案路徑
+
+    Returns:
+        Cassette 實例
+    """
+    key = os.path.abspath(path)
+    with _cassettes_lock:
+        cassette = _cassettes.get(key)
+        if cassette is None:
+            cassette = _cassettes[key] = Cassette(path)
+        return cassette
+
+
+class _Plan:
+    """一次模擬回應的內容、每個片段前的延遲與注入的錯誤"""
+
+    __slots__ = ("chunks", "delays", "raw", "error", "error_at")
+
+    def __init__(self, chunks: List[str], delays: List[float], raw: Dict[str, Any]):
+        self.chunks = chunks
+        self.delays = delays
+        self.raw = raw
+        self.error: Optional[Exception] = None
+        # 在第幾個片段之前拋出錯誤（0 表示第一個 token 之前）
+        self.error_at: Optional[int] = None
+
+
+class _Recorder:
+    """錄製 upstream 回應的片段與時間"""
+
+    def __init__(self, cassette: Cassette, kind: str, payload: Any):
+        self.cassette = cassette
+        self.kind = kind
+        self.payload = payload
+        self.chunks: List[str] = []
+        self.times: List[float] = []
+        self.start = time.perf_counter()
+
+    def chunk(self, delta: Optional[str]) -> None:
+        """記錄一個片段"""
+        if delta:
+            self.chunks.append(delta)
+            self.times.append(time.perf_counter())
+
+    def finish(self, raw: Any) -> None:
+        """回應完成時寫入 cassette"""
+        if not self.times:
+            self.times.append(time.perf_counter())
+        usage = extract_token_usage(raw)
+        text = "".join(self.chunks)
+        prompt = self.payload if self.kind == "complete" else json.dumps(self.payload)
+        prompt_tokens, completion_tokens = usage or (estimate_tokens(prompt), estimate_tokens(text))
+        self.cassette.append(
+            {
+                "key": cassette_key(self.kind, self.payload),
+                "kind": self.kind,
+                "payload": self.payload,
+                "chunks": self.chunks,
+                "ttft_ms": (self.times[0] - self.start) * 1000,
+                "gaps_ms": [
+                    (later - earlier) * 1000
+                    for earlier, later in zip(self.times, self.times[1:])
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                },
+            }
+        )
+
+
+class FakeLLM(LLM):
+    """
+    本地模擬 LLM（provider 為 fake）
+
+    - generate：依 prompt 產生確定性的文字，TTFT 與 token 間隔取自對數常態分布
+    - record：呼叫 upstream LLM 並將回應與時間寫入 cassette
+    - replay：從 cassette 重播回應；找不到時依 replay_strict 拋出 CassetteMissError 或改為模擬
+
+    generate 與 replay 模式可注入錯誤；非同步方法以 asyncio.sleep 模擬延遲，不會阻塞事件迴圈。
+    回應的 raw 欄位帶有 OpenAI 格式的 usage，遙測可取得 token 數。
+    """
+
+    _config: FakeConfig = PrivateAttr()
+    _upstream: Optional[LLM] = PrivateAttr(default=None)
+    _cassette: Optional[Cassette] = PrivateAttr(default=None)
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, config: FakeConfig, upstream: Optional[LLM] = None, **kwargs: Any):
+        """
+        初始化 FakeLLM
+
+        Args:
+            config: 模擬 provider 配置
+            upstream: record 模式實際呼叫的 LLM 實例
+            **kwargs: LLM 的其他參數（例如 callback_manager）
+        """
+        super().__init__(**kwargs)
+        if config.mode == "record" and upstream is None:
+            raise ValueError("Fake provider 的 record 模式需要 upstream LLM")
+        self._config = config
+        self._upstream = upstream
+        self._cassette = get_cassette(config.cassette_path) if config.cassette_path else None
+        self._rng = random.Random(config.seed)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "fake_llm"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            model_name=self._config.model,
+            num_output=self._config.response_tokens,
+            is_chat_model=True,
+        )
+
+    # ---- 模擬 ----
+
+    def _lognormal(self, median: float, sigma: float) -> float:
+        """以中位數與 sigma 取樣對數常態分布（sigma 為 0 時返回中位數）"""
+        if sigma <= 0:
+            return median
+        with self._rng_lock:
+            return median * math.exp(self._rng.gauss(0.0, sigma))
+
+    def _sample_delays(self, count: int) -> List[float]:
+        """取樣第一個 token 時間與之後每個 token 的間隔（秒）"""
+        config = self._config
+        delays = [self._lognormal(config.ttft_ms / 1000, config.ttft_jitter)]
+        gap = 1.0 / config.tokens_per_second if config.tokens_per_second else 0.0
+        delays.extend(self._lognormal(gap, config.token_jitter) for _ in range(count - 1))
+        return delays
+
+    def _synthesize(self, key: str) -> List[str]:
+        """依請求鍵產生確定性的回應片段"""
+        config = self._config
+        if config.response is not None:
+            return _split_tokens(config.response)
+        text_rng = random.Random(f"{key}:{config.seed or 0}")
+        words = [text_rng.choice(_WORDS) for _ in range(config.response_tokens)]
+        words[0] = words[0].capitalize()
+        return _split_tokens(" ".join(words) + ".")
+
+    def _plan(self, kind: str, payload: Any, prompt: str) -> _Plan:
+        """決定回應內容、延遲與注入的錯誤"""
+        config = self._config
+        key = cassette_key(kind, payload)
+        entry = self._cassette.next(key) if config.mode == "replay" and self._cassette else None
+        if entry is None and config.mode == "replay" and config.replay_strict:
+            raise CassetteMissError(f"Cassette {config.cassette_path} 沒有錄製此請求（{key[:12]}）")
+
+        if entry is not None:
+            chunks = entry["chunks"] or [""]
+            if config.replay_timing:
+                delays = [entry["ttft_ms"] / 1000] + [gap / 1000 for gap in entry["gaps_ms"]]
+            else:
+                delays = self._sample_delays(len(chunks))
+            usage = dict(entry["usage"])
+        else:
+            chunks = self._synthesize(key)
+            delays = self._sample_delays(len(chunks))
+            usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": len(chunks)}
+        plan = _Plan(chunks, delays, {"model": config.model, "usage": usage})
+
+        with self._rng_lock:
+            if config.error_rate and self._rng.random() < config.error_rate:
+                plan.error_at = 0
+            elif config.midstream_error_rate and self._rng.random() < config.midstream_error_rate:
+                plan.error_at = self._rng.randint(1, max(1, len(chunks) - 1))
+        if plan.error_at is not None:
+            plan.error = _make_error(config.error_type)
+        return plan
+
+    def _play(self, plan: _Plan) -> Iterator[str]:
+        """依延遲逐一產生片段"""
+        for index, chunk in enumerate(plan.chunks):
+            if index == plan.error_at:
+                raise plan.error
+            time.sleep(plan.delays[index])
+            yield chunk
+        if plan.error is not None:
+            raise plan.error
+
+    async def _aplay(self, plan: _Plan) -> AsyncIterator[str]:
+        """_play 的非同步版本"""
+        for index, chunk in enumerate(plan.chunks):
+            if index == plan.error_at:
+                raise plan.error
+            await asyncio.sleep(plan.delays[index])
+            yield chunk
+        if plan.error is not None:
+            raise plan.error
+
+    @staticmethod
+    def _chat_payload(messages: Sequence[ChatMessage]) -> List[Dict[str, Any]]:
+        """chat 訊息的 cassette payload"""
+        return [
+            {"role": getattr(message.role, "value", message.role), "content": message.content}
+            for message in messages
+        ]
+
+    def _chat_plan(self, messages: Sequence[ChatMessage]) -> _Plan:
+        payload = self._chat_payload(messages)
+        prompt = "\n".join(message.content or "" for message in messages)
+        return self._plan("chat", payload, prompt)
+
+    @staticmethod
+    def _chat_response(text: str, raw: Any, delta: Optional[str] = None) -> ChatResponse:
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=text), raw=raw, delta=delta
+        )
+
+    def _recorder(self, kind: str, payload: Any) -> _Recorder:
+        return _Recorder(self._cassette, kind, payload)
+
+    # ---- completion ----
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        if self._config.mode == "record":
+            recorder = self._recorder("complete", prompt)
+            response = self._upstream.complete(prompt, formatted=formatted, **kwargs)
+            recorder.chunk(response.text)
+            recorder.finish(response.raw)
+            return response
+        plan = self._plan("complete", prompt, prompt)
+        return CompletionResponse(text="".join(self._play(plan)), raw=plan.raw)
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        if self._config.mode == "record":
+            recorder = self._recorder("complete", prompt)
+            upstream = self._upstream.stream_complete(prompt, formatted=formatted, **kwargs)
+
+            def record() -> CompletionResponseGen:
+                response = None
+                for response in upstream:
+                    recorder.chunk(response.delta)
+                    yield response
+                recorder.finish(response.raw if response is not None else None)
+
+            return record()
+
+        plan = self._plan("complete", prompt, prompt)
+
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for index, delta in enumerate(self._play(plan)):
+                text += delta
+                raw = plan.raw if index == len(plan.chunks) - 1 else None
+                yield CompletionResponse(text=text, delta=delta, raw=raw)
+
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        if self._config.mode == "record":
+            recorder = self._recorder("complete", prompt)
+            response = await self._upstream.acomplete(prompt, formatted=formatted, **kwargs)
+            recorder.chunk(response.text)
+            recorder.finish(response.raw)
+            return response
+        plan = self._plan("complete", prompt, prompt)
+        chunks = [chunk async for chunk in self._aplay(plan)]
+        return CompletionResponse(text="".join(chunks), raw=plan.raw)
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        if self._config.mode == "record":
+            recorder = self._recorder("complete", prompt)
+            upstream = await self._upstream.astream_complete(
+                prompt, formatted=formatted, **kwargs
+            )
+
+            async def record() -> CompletionResponseAsyncGen:
+                response = None
+                async for response in upstream:
+                    recorder.chunk(response.delta)
+                    yield response
+                recorder.finish(response.raw if response is not None else None)
+
+            return record()
+
+        plan = self._plan("complete", prompt, prompt)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            index = 0
+            async for delta in self._aplay(plan):
+                text += delta
+                raw = plan.raw if index == len(plan.chunks) - 1 else None
+                index += 1
+                yield CompletionResponse(text=text, delta=delta, raw=raw)
+
+        return gen()
+
+    # ---- chat ----
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        if self._config.mode == "record":
+            recorder = self._recorder("chat", self._chat_payload(messages))
+            response = self._upstream.chat(messages, **kwargs)
+            recorder.chunk(response.message.content)
+            recorder.finish(response.raw)
+            return response
+        plan = self._chat_plan(messages)
+        return self._chat_response("".join(self._play(plan)), plan.raw)
+
+    @llm_chat_callback()
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        if self._config.mode == "record":
+            recorder = self._recorder("chat", self._chat_payload(messages))
+            upstream = self._upstream.stream_chat(messages, **kwargs)
+
+            def record() -> ChatResponseGen:
+                response = None
+                for response in upstream:
+                    recorder.chunk(response.delta)
+                    yield response
+                recorder.finish(response.raw if response is not None else None)
+
+            return record()
+
+        plan = self._chat_plan(messages)
+
+        def gen() -> ChatResponseGen:
+            text = ""
+            for index, delta in enumerate(self._play(plan)):
+                text += delta
+                raw = plan.raw if index == len(plan.chunks) - 1 else None
+                yield self._chat_response(text, raw, delta)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        if self._config.mode == "record":
+            recorder = self._recorder("chat", self._chat_payload(messages))
+            response = await self._upstream.achat(messages, **kwargs)
+            recorder.chunk(response.message.content)
+            recorder.finish(response.raw)
+            return response
+        plan = self._chat_plan(messages)
+        chunks = [chunk async for chunk in self._aplay(plan)]
+        return self._chat_response("".join(chunks), plan.raw)
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        if self._config.mode == "record":
+            recorder = self._recorder("chat", self._chat_payload(messages))
+            upstream = await self._upstream.astream_chat(messages, **kwargs)
+
+            async def record() -> ChatResponseAsyncGen:
+                response = None
+                async for response in upstream:
+                    recorder.chunk(response.delta)
+                    yield response
+                recorder.finish(response.raw if response is not None else None)
+
+            return record()
+
+        plan = self._chat_plan(messages)
+
+        async def gen() -> ChatResponseAsyncGen:
+            text = ""
+            index = 0
+            async for delta in self._aplay(plan):
+                text += delta
+                raw = plan.raw if index == len(plan.chunks) - 1 else None
+                index += 1
+                yield self._chat_response(text, raw, delta)
+
+        return gen()
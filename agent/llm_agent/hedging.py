@@ -0,0 +1,275 @@
+"""跨 provider 的 hedged request 模組，用於降低尾端延遲"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+
+class HedgingPolicy:
+    """
+    Hedging 策略
+
+    主要 provider 在門檻時間內尚未產生結果（串流時為第一個 token）時，對次要 provider
+    發出相同請求，採用先完成者的結果並取消另一個。門檻依觀察到的主要 provider 延遲
+    分位數（預設 p95）自適應調整。
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.2,
+        max_delay: float = 10.0,
+        window_size: int = 200,
+        min_samples: int = 20,
+    ):
+        """
+        初始化 HedgingPolicy
+
+        Args:
+            quantile: 用於計算門檻的延遲分位數（0-1）
+            initial_delay: 樣本不足時使用的門檻（秒）
+            min_delay: 門檻下限（秒）
+            max_delay: 門檻上限（秒）
+            window_size: 延遲樣本滑動視窗大小
+            min_samples: 開始使用分位數門檻前所需的最少樣本數
+        """
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "hedged": 0,
+            "primary_wins": 0,
+            "secondary_wins": 0,
+        }
+
+    @classmethod
+    def from_config(cls, config: Any) -> "HedgingPolicy":
+        """
+        從 HedgingConfig 建立策略
+
+        Args:
+            config: HedgingConfig 實例
+
+        Returns:
+            HedgingPolicy 實例
+        """
+        return cls(
+            quantile=config.quantile,
+            initial_delay=config.initial_delay,
+            min_delay=config.min_delay,
+            max_delay=config.max_delay,
+            window_size=config.window_size,
+            min_samples=config.min_samples,
+        )
+
+    def threshold(self) -> float:
+        """
+        取得目前的 hedge 門檻
+
+        Returns:
+            門檻（秒）
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            delay = self.initial_delay
+        else:
+            index = min(len(samples) - 1, max(0, math.ceil(self.quantile * len(samples)) - 1))
+            delay = samples[index]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def record_latency(self, latency: float) -> None:
+        """
+        記錄主要 provider 的延遲樣本（秒）
+
+        主要 provider 在 hedge 中落敗時以已等待的時間作為下限樣本，避免最慢的樣本被排除後
+        門檻持續下降、hedge 比例持續上升。
+
+        Args:
+            latency: 延遲（秒）
+        """
+        with self._lock:
+            self._samples.append(latency)
+
+    def _record_outcome(self, hedged: bool, winner: str) -> None:
+        """記錄單次請求的結果"""
+        with self._lock:
+            self._counters["requests"] += 1
+            if hedged:
+                self._counters["hedged"] += 1
+            self._counters[f"{winner}_wins"] += 1
+
+    async def run(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        secondary: Callable[[], Awaitable[T]],
+    ) -> Tuple[T, str, bool]:
+        """
+        以 hedging 執行非串流請求
+
+        Args:
+            primary: 建立主要 provider 呼叫的函數
+            secondary: 建立次要 provider 呼叫的函數
+
+        Returns:
+            (結果, 勝出者 "primary" 或 "secondary", 是否發出 hedge 請求)
+        """
+        start = time.perf_counter()
+        primary_task = asyncio.ensure_future(primary())
+        tasks = {primary_task: PRIMARY}
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.threshold())
+            if primary_task in done:
+                # 門檻前就失敗的呼叫不是延遲樣本，直接拋出（由備援 provider 處理）
+                if primary_task.exception() is not None:
+                    raise primary_task.exception()
+                self.record_latency(time.perf_counter() - start)
+                self._record_outcome(False, PRIMARY)
+                return primary_task.result(), PRIMARY, False
+
+            tasks[asyncio.ensure_future(secondary())] = SECONDARY
+            pending = set(tasks)
+            errors: Dict[str, BaseException] = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors[tasks[task]] = task.exception()
+                        continue
+                    winner = tasks[task]
+                    # 次要 provider 勝出時，主要 provider 的延遲至少為已等待的時間（主要 provider
+                    # 已失敗時不記錄）
+                    if PRIMARY not in errors:
+                        self.record_latency(time.perf_counter() - start)
+                    self._record_outcome(True, winner)
+                    return task.result(), winner, True
+            raise errors.get(PRIMARY) or errors[SECONDARY]
+        finally:
+            await _cancel_all([t for t in tasks if not t.done()])
+
+    async def stream(
+        self,
+        primary: Callable[[], AsyncIterator[str]],
+        secondary: Callable[[], AsyncIterator[str]],
+        outcome: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        以 hedging 執行串流請求：以第一個 token 的時間決定是否發出 hedge 請求
+
+        Args:
+            primary: 建立主要 provider 串流的函數
+            secondary: 建立次要 provider 串流的函數
+            outcome: 可選的字典，會寫入 winner 與 hedged
+
+        Yields:
+            勝出串流的文字片段
+        """
+        start = time.perf_counter()
+        streams = {PRIMARY: primary().__aiter__()}
+        firsts = {asyncio.ensure_future(streams[PRIMARY].__anext__()): PRIMARY}
+        winner: Optional[str] = None
+        try:
+            done, _ = await asyncio.wait(set(firsts), timeout=self.threshold())
+            hedged = not done
+            if hedged:
+                streams[SECONDARY] = secondary().__aiter__()
+                firsts[asyncio.ensure_future(streams[SECONDARY].__anext__())] = SECONDARY
+
+            pending = set(firsts)
+            errors: Dict[str, BaseException] = {}
+            first_task: Optional[asyncio.Future] = None
+            while pending and first_task is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is not None and not isinstance(error, StopAsyncIteration):
+                        errors[firsts[task]] = error
+                        continue
+                    first_task = task
+                    break
+            if first_task is None:
+                raise errors.get(PRIMARY) or errors[SECONDARY]
+
+            winner = firsts[first_task]
+            # 次要 provider 勝出時，主要 provider 的第一個 token 時間至少為已等待的時間
+            # （主要 provider 已失敗時不記錄）
+            if PRIMARY not in errors:
+                self.record_latency(time.perf_counter() - start)
+            self._record_outcome(hedged, winner)
+            if outcome is not None:
+                outcome.update({"winner": winner, "hedged": hedged})
+
+            await _cancel_all([t for t in firsts if not t.done()])
+            for name, iterator in streams.items():
+                if name != winner and hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+
+            if first_task.exception() is not None:
+                return
+            yield first_task.result()
+            async for chunk in streams[winner]:
+                yield chunk
+        finally:
+            await _cancel_all([t for t in firsts if not t.done()])
+            for iterator in streams.values():
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得 hedging 統計
+
+        Returns:
+            包含 requests、hedged、hedge_rate、勝出次數與目前門檻的字典
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        requests = counters["requests"]
+        counters["hedge_rate"] = counters["hedged"] / requests if requests else 0.0
+        counters["threshold"] = self.threshold()
+        return counters
+
+
+async def _cancel_all(tasks) -> None:
+    """取消並等待 task 結束"""
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_policies: Dict[str, HedgingPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedging_policy(key: str, config: Any) -> HedgingPolicy:
+    """
+    取得（必要時建立）程序共用的 HedgingPolicy，讓延遲樣本在所有 Agent 間累積
+
+    Args:
+        key: 策略鍵（通常為主要 provider 配置的雜湊）
+        config: HedgingConfig 實例
+
+    Returns:
+        HedgingPolicy 實例
+    """
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is None:
+            policy = HedgingPolicy.from_config(config)
+            _policies[key] = policy
+        return policy
@@ -2,7 +2,7 @@
 
 import os
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -13,6 +13,8 @@ class LLMProvider(str, Enum):
     OLLAMA = "ollama"
     OPENAI = "openai"
     ANTHROPIC = "anthropic"
+    CUSTOM = "custom"  # 透過 providers.register_provider 註冊的第三方 provider
+    FAKE = "fake"  # 本地模擬 provider（壓力測試、錄製與重播）
     # 可以繼續擴展其他 provider
 
 
@@ -51,6 +53,14 @@ class OllamaConfig(BaseModel):
         default=None,
         description="重複懲罰參數",
     )
+    session_context: bool = Field(
+        default=False,
+        description="是否在同一 session 內重用 Ollama 回傳的 context（後續輪次只送出新訊息）",
+    )
+    keep_alive: Optional[str] = Field(
+        default=None,
+        description="模型在最後一次請求後保持載入的時間（例如 \"30m\"，None 表示使用伺服器預設值）",
+    )
 
     @field_validator("base_url")
     @classmethod
@@ -136,6 +146,341 @@ class AnthropicConfig(BaseModel):
     )
 
 
+class CustomProviderConfig(BaseModel):
+    """自訂（第三方註冊）LLM provider 配置"""
+
+    name: str = Field(
+        ...,
+        description="註冊於 provider registry 的 provider 名稱",
+    )
+    model: str = Field(
+        default="custom",
+        description="使用的模型名稱",
+    )
+    temperature: float = Field(
+        default=0.7,
+        description="溫度參數",
+        ge=0.0,
+    )
+    params: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="傳給 provider factory 的其他參數",
+    )
+
+
+class FakeConfig(BaseModel):
+    """
+    本地模擬 LLM 配置（不需要模型伺服器）
+
+    generate 模式依 prompt 產生確定性的文字，以 TTFT 與每個 token 的延遲分布模擬生成時間；
+    record 模式呼叫 upstream provider 並將請求、回應與時間寫入 cassette；replay 模式從
+    cassette 重播回應（可依錄製時的時間重現延遲）。
+    """
+
+    model: str = Field(
+        default="fake",
+        description="回報的模型名稱",
+    )
+    mode: Literal["generate", "record", "replay"] = Field(
+        default="generate",
+        description="generate（模擬產生）、record（錄製 upstream）或 replay（重播 cassette）",
+    )
+    response: Optional[str] = Field(
+        default=None,
+        description="固定回應文字（None 表示依 prompt 產生確定性的文字）",
+    )
+    response_tokens: int = Field(
+        default=64,
+        description="產生的回應 token 數（response 為 None 時使用）",
+        gt=0,
+    )
+    ttft_ms: float = Field(
+        default=200.0,
+        description="第一個 token 時間的中位數（毫秒）",
+        ge=0.0,
+    )
+    ttft_jitter: float = Field(
+        default=0.0,
+        description="第一個 token 時間的對數常態分布 sigma（0 表示固定延遲）",
+        ge=0.0,
+    )
+    tokens_per_second: Optional[float] = Field(
+        default=50.0,
+        description="生成速度中位數（None 表示不延遲）",
+        gt=0.0,
+    )
+    token_jitter: float = Field(
+        default=0.0,
+        description="每個 token 間隔的對數常態分布 sigma（0 表示固定間隔）",
+        ge=0.0,
+    )
+    error_rate: float = Field(
+        default=0.0,
+        description="在第一個 token 之前失敗的機率",
+        ge=0.0,
+        le=1.0,
+    )
+    midstream_error_rate: float = Field(
+        default=0.0,
+        description="產生部分 token 後失敗的機率",
+        ge=0.0,
+        le=1.0,
+    )
+    error_type: Literal["connection", "timeout", "overload", "server"] = Field(
+        default="connection",
+        description="注入的錯誤類型（overload 為 HTTP 429，server 為 HTTP 500）",
+    )
+    seed: Optional[int] = Field(
+        default=None,
+        description="延遲與錯誤注入的亂數種子（設定後結果可重現）",
+    )
+    cassette_path: Optional[str] = Field(
+        default=None,
+        description="cassette 檔案路徑（JSON Lines，record / replay 模式使用）",
+    )
+    replay_strict: bool = Field(
+        default=True,
+        description="replay 模式找不到錄製的請求時是否拋出 CassetteMissError（否則改為模擬產生）",
+    )
+    replay_timing: bool = Field(
+        default=True,
+        description="replay 模式是否依錄製時的 TTFT 與 token 間隔重現延遲（否則使用延遲分布）",
+    )
+    upstream: Optional["LLMConfig"] = Field(
+        default=None,
+        description="record 模式實際呼叫的 provider 配置",
+    )
+
+    def model_post_init(self, __context: Any) -> None:
+        """檢查模式所需的設定"""
+        if self.mode in ("record", "replay") and not self.cassette_path:
+            raise ValueError(f"Fake provider 的 {self.mode} 模式需要設定 cassette_path")
+        if self.mode == "record" and self.upstream is None:
+            raise ValueError("Fake provider 的 record 模式需要設定 upstream")
+
+    @classmethod
+    def from_env(cls, upstream: Optional["LLMConfig"] = None) -> "FakeConfig":
+        """
+        從 FAKE_* 環境變數建立配置
+
+        Args:
+            upstream: record 模式實際呼叫的 provider 配置
+
+        Returns:
+            FakeConfig 實例
+        """
+
+        seed = os.getenv("FAKE_SEED")
+        # FAKE_TOKENS_PER_SECOND=0 表示不模擬生成延遲
+        tokens_per_second = float(os.getenv("FAKE_TOKENS_PER_SECOND", 50.0))
+        return cls(
+            model=os.getenv("FAKE_MODEL", "fake"),
+            mode=os.getenv("FAKE_MODE", "generate").lower(),
+            response=os.getenv("FAKE_RESPONSE"),
+            response_tokens=int(os.getenv("FAKE_RESPONSE_TOKENS", 64)),
+            ttft_ms=float(os.getenv("FAKE_TTFT_MS", 200.0)),
+            ttft_jitter=float(os.getenv("FAKE_TTFT_JITTER", 0.0)),
+            tokens_per_second=tokens_per_second or None,
+            token_jitter=float(os.getenv("FAKE_TOKEN_JITTER", 0.0)),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", 0.0)),
+            midstream_error_rate=float(os.getenv("FAKE_MIDSTREAM_ERROR_RATE", 0.0)),
+            error_type=os.getenv("FAKE_ERROR_TYPE", "connection").lower(),
+            seed=int(seed) if seed else None,
+            cassette_path=os.getenv("FAKE_CASSETTE_PATH"),
+            replay_strict=os.getenv("FAKE_REPLAY_STRICT", "true").lower() == "true",
+            replay_timing=os.getenv("FAKE_REPLAY_TIMING", "true").lower() == "true",
+            upstream=upstream,
+        )
+
+
+class CircuitBreakerConfig(BaseModel):
+    """Provider 斷路器配置"""
+
+    enabled: bool = Field(
+        default=False,
+        description="是否啟用斷路器（預設停用）",
+    )
+    failure_rate_threshold: float = Field(
+        default=0.5,
+        description="開啟斷路器的失敗率門檻（0-1）",
+        gt=0.0,
+        le=1.0,
+    )
+    slow_call_threshold: Optional[float] = Field(
+        default=None,
+        description="視為慢呼叫的延遲（秒，None 表示不統計慢呼叫）",
+        gt=0.0,
+    )
+    slow_call_rate_threshold: float = Field(
+        default=0.8,
+        description="開啟斷路器的慢呼叫率門檻（0-1）",
+        gt=0.0,
+        le=1.0,
+    )
+    window_size: int = Field(
+        default=20,
+        description="滑動視窗大小（最近幾次呼叫）",
+        gt=0,
+    )
+    min_calls: int = Field(
+        default=5,
+        description="開始計算失敗率前所需的最少呼叫數",
+        gt=0,
+    )
+    open_duration: float = Field(
+        default=30.0,
+        description="斷路器開啟後多久（秒）放行探測請求",
+        gt=0.0,
+    )
+    half_open_max_calls: int = Field(
+        default=1,
+        description="半開狀態允許的探測請求數",
+        gt=0,
+    )
+
+
+class ConcurrencyLimitConfig(BaseModel):
+    """Provider 自適應並行限制（AIMD）配置"""
+
+    enabled: bool = Field(
+        default=False,
+        description="是否啟用並行限制（預設停用）",
+    )
+    initial_limit: int = Field(
+        default=8,
+        description="初始並行上限",
+        gt=0,
+    )
+    min_limit: int = Field(
+        default=1,
+        description="並行上限下限",
+        gt=0,
+    )
+    max_limit: int = Field(
+        default=64,
+        description="並行上限上限",
+        gt=0,
+    )
+    backoff_ratio: float = Field(
+        default=0.5,
+        description="遇到逾時、429 或延遲膨脹時上限的乘數（0-1）",
+        gt=0.0,
+        lt=1.0,
+    )
+    latency_tolerance: float = Field(
+        default=2.0,
+        description="近期延遲超過基準延遲幾倍時視為延遲膨脹",
+        gt=1.0,
+    )
+    latency_window: int = Field(
+        default=100,
+        description="計算基準延遲（中位數）的樣本數",
+        gt=0,
+    )
+    decrease_cooldown: float = Field(
+        default=1.0,
+        description="兩次調降上限之間的最短間隔（秒），避免同一波失敗重複調降",
+        ge=0.0,
+    )
+    max_queue: Optional[int] = Field(
+        default=256,
+        description="超過上限時的等待佇列長度（None 表示不限制，0 表示直接拒絕）",
+        ge=0,
+    )
+    queue_timeout: Optional[float] = Field(
+        default=None,
+        description="最長等待時間（秒，None 表示不限制）",
+        gt=0.0,
+    )
+
+
+class RateLimitConfig(BaseModel):
+    """速率限制（token bucket）配置，用於 provider 與使用者額度"""
+
+    requests_per_minute: Optional[int] = Field(
+        default=None,
+        description="每分鐘請求數上限（None 表示不限制）",
+        gt=0,
+    )
+    tokens_per_minute: Optional[int] = Field(
+        default=None,
+        description="每分鐘 token 數上限（prompt + 回應的估計值，None 表示不限制）",
+        gt=0,
+    )
+    completion_tokens: int = Field(
+        default=256,
+        description="請求前預估的回應 token 數（回應完成後以實際長度校正）",
+        ge=0,
+    )
+    max_wait: Optional[float] = Field(
+        default=30.0,
+        description="等待額度的最長時間（秒，None 表示不限制），超過時拋出 RateLimitExceeded",
+        ge=0.0,
+    )
+
+    @classmethod
+    def from_env(cls, prefix: str) -> Optional["RateLimitConfig"]:
+        """
+        從 {prefix}_RPM、{prefix}_TPM、{prefix}_MAX_WAIT 環境變數建立配置
+
+        Args:
+            prefix: 環境變數前綴
+
+        Returns:
+            RateLimitConfig 實例（未設定 RPM 與 TPM 時為 None）
+        """
+        rpm = os.getenv(f"{prefix}_RPM")
+        tpm = os.getenv(f"{prefix}_TPM")
+        if not rpm and not tpm:
+            return None
+        max_wait = os.getenv(f"{prefix}_MAX_WAIT")
+        return cls(
+            requests_per_minute=int(rpm) if rpm else None,
+            tokens_per_minute=int(tpm) if tpm else None,
+            max_wait=float(max_wait) if max_wait else 30.0,
+        )
+
+
+class HedgingConfig(BaseModel):
+    """Hedged request 配置：主要 provider 過慢時，對次要 provider 發出相同請求"""
+
+    secondary: "LLMConfig" = Field(
+        ...,
+        description="次要 provider 的 LLM 配置",
+    )
+    quantile: float = Field(
+        default=0.95,
+        description="以主要 provider 延遲的哪個分位數作為 hedge 門檻",
+        gt=0.0,
+        le=1.0,
+    )
+    initial_delay: float = Field(
+        default=2.0,
+        description="延遲樣本不足時使用的 hedge 門檻（秒）",
+        gt=0.0,
+    )
+    min_delay: float = Field(
+        default=0.2,
+        description="Hedge 門檻下限（秒）",
+        ge=0.0,
+    )
+    max_delay: float = Field(
+        default=10.0,
+        description="Hedge 門檻上限（秒）",
+        gt=0.0,
+    )
+    window_size: int = Field(
+        default=200,
+        description="延遲樣本滑動視窗大小",
+        gt=0,
+    )
+    min_samples: int = Field(
+        default=20,
+        description="開始使用分位數門檻前所需的最少樣本數",
+        ge=0,
+    )
+
+
 class LLMConfig(BaseModel):
     """LLM 配置類別，管理 provider、model 和 parameters"""
 
@@ -162,6 +507,38 @@ class LLMConfig(BaseModel):
         default=None,
         description="Anthropic 配置",
     )
+    custom: Optional[CustomProviderConfig] = Field(
+        default=None,
+        description="自訂 provider 配置（provider 為 custom 時使用）",
+    )
+    fake: Optional[FakeConfig] = Field(
+        default=None,
+        description="模擬 provider 配置（provider 為 fake 時使用）",
+    )
+
+    # 延遲優化配置
+    hedging: Optional[HedgingConfig] = Field(
+        default=None,
+        description="Hedged request 配置（None 表示不啟用）",
+    )
+
+    # 容錯配置
+    circuit_breaker: CircuitBreakerConfig = Field(
+        default_factory=CircuitBreakerConfig,
+        description="此 provider 的斷路器配置",
+    )
+    concurrency: ConcurrencyLimitConfig = Field(
+        default_factory=ConcurrencyLimitConfig,
+        description="此 provider 的自適應並行限制配置",
+    )
+    rate_limit: Optional[RateLimitConfig] = Field(
+        default=None,
+        description="此 provider 的請求數 / token 數速率限制（None 表示不限制）",
+    )
+    fallbacks: List["LLMConfig"] = Field(
+        default_factory=list,
+        description="主要 provider 失敗或斷路器開啟時，依序嘗試的備援 LLM 配置",
+    )
 
     # 自訂參數（用於擴展）
     custom_params: Dict[str, Any] = Field(
@@ -192,6 +569,10 @@ class LLMConfig(BaseModel):
             if not api_key:
                 raise ValueError("Anthropic provider 需要設定 api_key 或 ANTHROPIC_API_KEY 環境變數")
             self.anthropic = AnthropicConfig(api_key=api_key)
+        elif self.provider == LLMProvider.CUSTOM and self.custom is None:
+            raise ValueError("Custom provider 需要設定 custom 配置（包含已註冊的 provider 名稱）")
+        elif self.provider == LLMProvider.FAKE and self.fake is None:
+            self.fake = FakeConfig()
 
     def get_model_name(self) -> str:
         """
@@ -206,6 +587,10 @@ class LLMConfig(BaseModel):
             return self.openai.model
         elif self.provider == LLMProvider.ANTHROPIC and self.anthropic:
             return self.anthropic.model
+        elif self.provider == LLMProvider.CUSTOM and self.custom:
+            return self.custom.model
+        elif self.provider == LLMProvider.FAKE and self.fake:
+            return self.fake.model
         else:
             raise ValueError(f"Provider {self.provider} 的配置不存在")
 
@@ -222,9 +607,24 @@ class LLMConfig(BaseModel):
             return self.openai
         elif self.provider == LLMProvider.ANTHROPIC and self.anthropic:
             return self.anthropic
+        elif self.provider == LLMProvider.CUSTOM and self.custom:
+            return self.custom
+        elif self.provider == LLMProvider.FAKE and self.fake:
+            return self.fake
         else:
             raise ValueError(f"Provider {self.provider} 的配置不存在")
 
+    def get_provider_name(self) -> str:
+        """
+        取得 provider registry 中使用的 provider 名稱
+
+        Returns:
+            內建 provider 為列舉值，自訂 provider 為註冊名稱
+        """
+        if self.provider == LLMProvider.CUSTOM and self.custom:
+            return self.custom.name
+        return self.provider.value
+
     @classmethod
     def from_env(cls, **kwargs) -> "LLMConfig":
         """
@@ -244,20 +644,74 @@ class LLMConfig(BaseModel):
         config_data = {
             "provider": provider,
             "timeout": float(os.getenv("LLM_TIMEOUT", kwargs.get("timeout", 60.0))),
+            "circuit_breaker": CircuitBreakerConfig(
+                enabled=os.getenv("LLM_CIRCUIT_BREAKER_ENABLED", "false").lower() == "true",
+                open_duration=float(os.getenv("LLM_CIRCUIT_OPEN_DURATION", 30.0)),
+                slow_call_threshold=(
+                    float(os.getenv("LLM_SLOW_CALL_THRESHOLD"))
+                    if os.getenv("LLM_SLOW_CALL_THRESHOLD")
+                    else None
+                ),
+            ),
+            "concurrency": ConcurrencyLimitConfig(
+                enabled=os.getenv("LLM_CONCURRENCY_LIMIT_ENABLED", "false").lower() == "true",
+                initial_limit=int(os.getenv("LLM_INITIAL_CONCURRENCY", 8)),
+                max_limit=int(os.getenv("LLM_MAX_CONCURRENCY", 64)),
+                latency_window=int(os.getenv("LLM_CONCURRENCY_LATENCY_WINDOW", 100)),
+                decrease_cooldown=float(os.getenv("LLM_CONCURRENCY_DECREASE_COOLDOWN", 1.0)),
+                max_queue=int(os.getenv("LLM_MAX_QUEUE", 256)),
+                queue_timeout=(
+                    float(os.getenv("LLM_QUEUE_TIMEOUT"))
+                    if os.getenv("LLM_QUEUE_TIMEOUT")
+                    else None
+                ),
+            ),
+            "rate_limit": RateLimitConfig.from_env("LLM_RATE_LIMIT"),
         }
 
+        config_data.update(cls._provider_settings_from_env(provider, kwargs))
+
+        # 合併額外的 kwargs
+        config_data.update(kwargs)
+        return cls(**config_data)
+
+    @classmethod
+    def _provider_settings_from_env(
+        cls, provider: LLMProvider, kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        從環境變數建立指定 provider 的配置
+
+        Args:
+            provider: LLM provider
+            kwargs: 額外的配置參數（環境變數未設定時使用）
+
+        Returns:
+            provider 配置欄位（例如 {"ollama": OllamaConfig(...)}）
+        """
+        settings: Dict[str, Any] = {}
         if provider == LLMProvider.OLLAMA:
-            config_data["ollama"] = OllamaConfig(
+            settings["ollama"] = OllamaConfig(
                 base_url=os.getenv("OLLAMA_BASE_URL", kwargs.get("ollama_base_url", "http://localhost:11434")),
                 model=os.getenv("OLLAMA_MODEL", kwargs.get("ollama_model", "llama3.2")),
                 temperature=float(os.getenv("OLLAMA_TEMPERATURE", kwargs.get("ollama_temperature", 0.7))),
                 top_p=float(os.getenv("OLLAMA_TOP_P", kwargs.get("ollama_top_p", 0.9))),
+                num_ctx=(
+                    int(os.getenv("OLLAMA_NUM_CTX"))
+                    if os.getenv("OLLAMA_NUM_CTX")
+                    else kwargs.get("ollama_num_ctx")
+                ),
+                session_context=(
+                    os.getenv("OLLAMA_SESSION_CONTEXT", "false").lower() == "true"
+                    or kwargs.get("ollama_session_context", False)
+                ),
+                keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", kwargs.get("ollama_keep_alive")),
             )
         elif provider == LLMProvider.OPENAI:
             api_key = os.getenv("OPENAI_API_KEY", kwargs.get("openai_api_key", ""))
             if not api_key:
                 raise ValueError("OpenAI provider 需要設定 OPENAI_API_KEY 環境變數")
-            config_data["openai"] = OpenAIConfig(
+            settings["openai"] = OpenAIConfig(
                 api_key=api_key,
                 model=os.getenv("OPENAI_MODEL", kwargs.get("openai_model", "gpt-3.5-turbo")),
                 temperature=float(os.getenv("OPENAI_TEMPERATURE", kwargs.get("openai_temperature", 0.7))),
@@ -267,13 +721,24 @@ class LLMConfig(BaseModel):
             api_key = os.getenv("ANTHROPIC_API_KEY", kwargs.get("anthropic_api_key", ""))
             if not api_key:
                 raise ValueError("Anthropic provider 需要設定 ANTHROPIC_API_KEY 環境變數")
-            config_data["anthropic"] = AnthropicConfig(
+            settings["anthropic"] = AnthropicConfig(
                 api_key=api_key,
                 model=os.getenv("ANTHROPIC_MODEL", kwargs.get("anthropic_model", "claude-3-sonnet-20240229")),
                 temperature=float(os.getenv("ANTHROPIC_TEMPERATURE", kwargs.get("anthropic_temperature", 0.7))),
             )
-
-        # 合併額外的 kwargs
-        config_data.update(kwargs)
-        return cls(**config_data)
-
+        elif provider == LLMProvider.FAKE:
+            upstream = None
+            upstream_provider = os.getenv("FAKE_UPSTREAM_PROVIDER")
+            if upstream_provider:
+                upstream_enum = LLMProvider(upstream_provider.lower())
+                if upstream_enum == LLMProvider.FAKE:
+                    raise ValueError("FAKE_UPSTREAM_PROVIDER 不能是 fake")
+                upstream = cls(
+                    provider=upstream_enum,
+                    **cls._provider_settings_from_env(upstream_enum, kwargs),
+                )
+            settings["fake"] = FakeConfig.from_env(upstream=upstream)
+        return settings
+
+
+FakeConfig.model_rebuild()
@@ -0,0 +1,178 @@
+"""Ollama 對話 context 重用模組：同一 session 的後續輪次只送出新訊息，沿用 KV cache"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_config import OllamaConfig
+from .prompts import PromptManager
+from .ratelimit import estimate_tokens
+from .state.memory import ChatMemory
+
+# 未設定 num_ctx 時 Ollama 的預設上下文窗口
+DEFAULT_NUM_CTX = 2048
+
+
+class OllamaContextSession:
+    """
+    以 Ollama /api/generate 回傳的 context 延續對話
+
+    第一輪（或 context 失效後）送出完整的對話 prompt，之後每輪只送出本次使用者訊息並附上上一輪
+    回傳的 context，Ollama 只需 prefill 新訊息。以下情況 context 失效，下一輪改送完整 prompt：
+    記憶被編輯（壓縮、重置、從持久化儲存恢復）、切換 session、上一則助手訊息不是本 session
+    產生的（例如由備援 provider 回應），或 context 長度加上新訊息超過 num_ctx 的 context_ratio。
+    """
+
+    def __init__(self, config: OllamaConfig, context_ratio: float = 0.9):
+        """
+        初始化 OllamaContextSession
+
+        Args:
+            config: Ollama 配置（模型、取樣參數、num_ctx 與 keep_alive）
+            context_ratio: context 長度佔 num_ctx 的上限比例，超過時重新建立 context
+        """
+        self.config = config
+        self.max_context_tokens = int((config.num_ctx or DEFAULT_NUM_CTX) * context_ratio)
+        self._lock = threading.Lock()
+        self._context: Optional[List[int]] = None
+        self._session_id: Optional[str] = None
+        self._edit_version = -1
+        # context 涵蓋的訊息數（包含預期由呼叫端寫入的助手回應）與該則回應內容
+        self._covered = 0
+        self._last_response: Optional[str] = None
+        self._counters: Dict[str, Any] = {
+            "turns": 0,
+            "reused": 0,
+            "rebuilt": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_ms": 0.0,
+        }
+
+    def invalidate(self) -> None:
+        """捨棄目前的 context，下一輪送出完整 prompt"""
+        with self._lock:
+            self._context = None
+            self._covered = 0
+            self._last_response = None
+
+    def _options(self) -> Dict[str, Any]:
+        """取得送往 Ollama 的模型參數（略過未設定的項目）"""
+        options = {
+            "temperature": self.config.temperature,
+            "top_p": self.config.top_p,
+            "top_k": self.config.top_k,
+            "num_ctx": self.config.num_ctx,
+            "repeat_penalty": self.config.repeat_penalty,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+    def _prepare(self, memory: ChatMemory, user_message: str) -> Dict[str, Any]:
+        """
+        決定本輪送出的 prompt 與 context（記憶中最後一則訊息應為本次使用者訊息）
+
+        Returns:
+            /api/generate 的參數
+        """
+        count = len(memory)
+        with self._lock:
+            reusable = (
+                self._context is not None
+                and self._session_id == memory.session_id
+                and self._edit_version == memory.edit_version
+                and count == self._covered + 1
+            )
+            if reusable:
+                previous = memory.get_all_messages()[self._covered - 1]
+                reusable = previous.content == self._last_response and (
+                    len(self._context) + estimate_tokens(user_message) <= self.max_context_tokens
+                )
+            context = self._context if reusable else None
+        if reusable:
+            prompt = user_message
+        else:
+            prompt = PromptManager.get_chat_prompt(
+                user_message=user_message,
+                chat_history=memory.get_history_text(exclude_last=True),
+            )
+        return {
+            "model": self.config.model,
+            "prompt": prompt,
+            "system": None if reusable else PromptManager.get_system_prompt(),
+            "context": context,
+            "options": self._options(),
+            "keep_alive": self.config.keep_alive,
+        }
+
+    def _record(
+        self, memory: ChatMemory, request: Dict[str, Any], response: Any
+    ) -> Tuple[str, Dict[str, Any]]:
+        """保存回傳的 context 並整理統計"""
+        text = response["response"] or ""
+        reused = request["context"] is not None
+        prompt_eval_count = response.get("prompt_eval_count") or 0
+        prompt_eval_ms = (response.get("prompt_eval_duration") or 0) / 1e6
+        context = response.get("context")
+        with self._lock:
+            self._context = list(context) if context else None
+            self._session_id = memory.session_id
+            self._edit_version = memory.edit_version
+            # 呼叫端隨後會將回應寫入記憶
+            self._covered = len(memory) + 1
+            self._last_response = text
+            self._counters["turns"] += 1
+            self._counters["reused" if reused else "rebuilt"] += 1
+            self._counters["prompt_eval_count"] += prompt_eval_count
+            self._counters["prompt_eval_ms"] += prompt_eval_ms
+        return text, {
+            "reused": reused,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_ms": prompt_eval_ms,
+            "eval_count": response.get("eval_count") or 0,
+            "context_tokens": len(context) if context else 0,
+        }
+
+    def generate(
+        self, llm: Any, memory: ChatMemory, user_message: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        以 context 延續對話產生回應（同步版本）
+
+        Args:
+            llm: LlamaIndex Ollama 實例（使用其 Ollama client 與連線池）
+            memory: session 的 ChatMemory（已包含本次使用者訊息）
+            user_message: 本次使用者訊息
+
+        Returns:
+            (回應文字, 本輪統計：reused、prompt_eval_count、prompt_eval_ms、eval_count、context_tokens)
+        """
+        request = self._prepare(memory, user_message)
+        response = llm.client.generate(stream=False, **request)
+        return self._record(memory, request, response)
+
+    async def agenerate(
+        self, llm: Any, memory: ChatMemory, user_message: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        以 context 延續對話產生回應（非同步版本）
+
+        Args:
+            llm: LlamaIndex Ollama 實例（使用其 Ollama async client 與連線池）
+            memory: session 的 ChatMemory（已包含本次使用者訊息）
+            user_message: 本次使用者訊息
+
+        Returns:
+            (回應文字, 本輪統計：reused、prompt_eval_count、prompt_eval_ms、eval_count、context_tokens)
+        """
+        request = self._prepare(memory, user_message)
+        response = await llm.async_client.generate(stream=False, **request)
+        return self._record(memory, request, response)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得累計統計
+
+        Returns:
+            包含 turns、reused、rebuilt、prompt_eval_count、prompt_eval_ms 與
+            context_tokens（目前 context 長度）的字典
+        """
+        with self._lock:
+            return {**self._counters, "context_tokens": len(self._context or ())}
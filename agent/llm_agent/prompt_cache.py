@@ -0,0 +1,123 @@
+"""Provider 端 prompt 前綴快取模組：穩定前綴的組裝、快取斷點標記與快取用量解析"""
+
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from .llm_config import LLMProvider
+from .ratelimit import estimate_tokens
+from .utils import get_field
+
+# Anthropic 快取斷點標記（放在 ChatMessage.additional_kwargs，由 Anthropic 整合轉為 cache_control）
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+class PromptLayout:
+    """
+    分為穩定前綴與變動尾端的 chat 訊息列表
+
+    穩定前綴為系統提示詞與既有對話歷史，在同一 session 的各輪之間只會向後延伸、內容位元組不變；
+    變動尾端為本次使用者訊息。OpenAI 會自動快取相同的前綴，Anthropic 則需要在前綴結尾標記斷點。
+    """
+
+    __slots__ = ("messages", "prefix_length")
+
+    def __init__(self, system_prompt: str, history: List[ChatMessage]):
+        """
+        初始化 PromptLayout
+
+        Args:
+            system_prompt: 系統提示詞（不應包含時間戳等每次呼叫都不同的內容）
+            history: 對話歷史（最後一則為本次使用者訊息）
+        """
+        self.messages: List[ChatMessage] = [
+            ChatMessage(role=MessageRole.SYSTEM, content=system_prompt),
+            *history,
+        ]
+        self.prefix_length = max(1, len(self.messages) - 1)
+
+    @property
+    def stable(self) -> List[ChatMessage]:
+        """穩定前綴（系統提示詞與既有對話歷史）"""
+        return self.messages[: self.prefix_length]
+
+    @property
+    def volatile(self) -> List[ChatMessage]:
+        """變動尾端（本次使用者訊息）"""
+        return self.messages[self.prefix_length :]
+
+    def for_provider(self, provider: str, min_tokens: Optional[int] = 1024) -> List[ChatMessage]:
+        """
+        取得送往指定 provider 的訊息列表
+
+        Anthropic 在系統提示詞與穩定前綴結尾標記快取斷點（前綴達到 min_tokens 才標記，
+        未達 provider 的最小快取長度時標記只會增加寫入成本）；其他 provider 原樣返回。
+
+        Args:
+            provider: Provider 名稱
+            min_tokens: 標記斷點所需的最小前綴 token 數（None 表示不標記）
+
+        Returns:
+            ChatMessage 列表
+        """
+        if provider != LLMProvider.ANTHROPIC.value or min_tokens is None:
+            return self.messages
+        breakpoints = set()
+        total = 0
+        for index, message in enumerate(self.stable):
+            total += estimate_tokens(message.content or "")
+            if index == 0 and total >= min_tokens:
+                breakpoints.add(index)
+        if total >= min_tokens:
+            breakpoints.add(self.prefix_length - 1)
+        if not breakpoints:
+            return self.messages
+        return [
+            ChatMessage(
+                role=message.role,
+                content=message.content,
+                additional_kwargs={**message.additional_kwargs, "cache_control": CACHE_CONTROL},
+            )
+            if index in breakpoints
+            else message
+            for index, message in enumerate(self.messages)
+        ]
+
+
+def extract_cache_usage(raw: Any) -> Optional[Dict[str, Any]]:
+    """
+    從 provider 原始回應解析輸入 token 數與命中快取的 token 數
+
+    支援 Anthropic（usage.cache_read_input_tokens / cache_creation_input_tokens）與
+    OpenAI（usage.prompt_tokens_details.cached_tokens）格式。
+
+    Args:
+        raw: LlamaIndex 回應的 raw 欄位
+
+    Returns:
+        包含 input_tokens、cached_tokens、cache_write_tokens 與 cached_ratio 的字典，
+        沒有用量資訊時為 None
+    """
+    usage = get_field(raw, "usage")
+    if usage is None:
+        return None
+
+    if get_field(usage, "input_tokens") is not None:
+        # Anthropic：input_tokens 不包含讀取與寫入快取的 token
+        cached = get_field(usage, "cache_read_input_tokens") or 0
+        written = get_field(usage, "cache_creation_input_tokens") or 0
+        total = get_field(usage, "input_tokens") + cached + written
+    elif get_field(usage, "prompt_tokens") is not None:
+        # OpenAI：prompt_tokens 已包含命中快取的 token
+        cached = get_field(get_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+        written = 0
+        total = get_field(usage, "prompt_tokens")
+    else:
+        return None
+
+    return {
+        "input_tokens": total,
+        "cached_tokens": cached,
+        "cache_write_tokens": written,
+        "cached_ratio": cached / total if total else 0.0,
+    }
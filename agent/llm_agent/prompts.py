@@ -70,6 +70,14 @@ class PromptManager:
 請提供詳細的執行步驟和結果。""",
     )
 
+    # 對話摘要提示詞模板（記憶壓縮使用）
+    SUMMARY_PROMPT = PromptTemplate(
+        template="""請將以下對話濃縮成一段摘要，保留使用者的目標、偏好、已確認的事實、做出的決定與尚未完成的事項，
+省略寒暄與重複內容。摘要請控制在 {max_tokens} 個 token 以內，只輸出摘要本身。
+
+{conversation}""",
+    )
+
     @classmethod
     def get_system_prompt(cls, additional_context: str = "") -> str:
         """
@@ -111,6 +119,20 @@ class PromptManager:
         """
         return cls.TASK_COMPLETION_PROMPT.format(task_description=task_description, context=context or "（無額外上下文）")
 
+    @classmethod
+    def get_summary_prompt(cls, conversation: str, max_tokens: int = 512) -> str:
+        """
+        取得對話摘要提示詞
+
+        Args:
+            conversation: 要摘要的對話文字
+            max_tokens: 摘要長度上限（token）
+
+        Returns:
+            摘要提示詞
+        """
+        return cls.SUMMARY_PROMPT.format(conversation=conversation, max_tokens=max_tokens)
+
     @classmethod
     def create_custom_prompt(cls, template: str, **variables) -> PromptTemplate:
         """
@@ -0,0 +1,225 @@
+"""LLM Provider 註冊表與共用 LLM 實例工廠模組"""
+
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from .llm_config import LLMConfig, LLMProvider
+
+if TYPE_CHECKING:
+    from llama_index.core.llms import LLM
+
+# Provider factory：接收 LLMConfig，返回 LlamaIndex LLM 實例
+ProviderFactory = Callable[[LLMConfig], "LLM"]
+
+_providers: Dict[str, ProviderFactory] = {}
+# 配置雜湊 -> (provider 名稱, LLM 實例)
+_llm_cache: Dict[str, Tuple[str, "LLM"]] = {}
+_lock = threading.Lock()
+
+
+def register_provider(name: str, factory: ProviderFactory, override: bool = False) -> None:
+    """
+    註冊 LLM provider factory
+
+    第三方 provider 註冊後，以 LLMConfig(provider=LLMProvider.CUSTOM,
+    custom=CustomProviderConfig(name=...)) 使用。
+
+    Args:
+        name: Provider 名稱
+        factory: 接收 LLMConfig 並返回 LLM 實例的函數
+        override: 是否覆蓋已存在的同名 provider
+
+    Example:
+        >>> def create_my_llm(config: LLMConfig):
+        ...     return MyLLM(model=config.custom.model, **config.custom.params)
+        ...
+        >>> register_provider("my_llm", create_my_llm)
+    """
+    with _lock:
+        if name in _providers and not override:
+            raise ValueError(f"Provider {name} 已註冊（如需覆蓋請設定 override=True）")
+        _providers[name] = factory
+        _evict_cached_locked(name)
+
+
+def unregister_provider(name: str) -> bool:
+    """
+    取消註冊 LLM provider
+
+    Args:
+        name: Provider 名稱
+
+    Returns:
+        是否成功取消註冊
+    """
+    with _lock:
+        removed = _providers.pop(name, None) is not None
+        _evict_cached_locked(name)
+        return removed
+
+
+def _evict_cached_locked(name: str) -> None:
+    """移除已快取的同名 provider 實例（呼叫端需持有 _lock）"""
+    for key in [k for k, (provider_name, _) in _llm_cache.items() if provider_name == name]:
+        del _llm_cache[key]
+
+
+def available_providers() -> List[str]:
+    """
+    取得已註冊的 provider 名稱
+
+    Returns:
+        Provider 名稱列表
+    """
+    with _lock:
+        return sorted(_providers)
+
+
+def config_hash(llm_config: LLMConfig) -> str:
+    """
+    計算 LLMConfig 的雜湊值（相同配置得到相同雜湊）
+
+    Args:
+        llm_config: LLM 配置
+
+    Returns:
+        SHA-256 十六進位字串
+    """
+    raw = json.dumps(llm_config.model_dump(mode="json"), sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def create_llm(llm_config: LLMConfig) -> "LLM":
+    """
+    依配置建立新的 LLM 實例（不使用快取）
+
+    Args:
+        llm_config: LLM 配置
+
+    Returns:
+        LLM 實例
+    """
+    name = llm_config.get_provider_name()
+    with _lock:
+        factory = _providers.get(name)
+    if factory is None:
+        raise ValueError(f"不支援的 LLM provider: {name}")
+    return factory(llm_config)
+
+
+def get_llm(llm_config: LLMConfig, use_cache: bool = True) -> "LLM":
+    """
+    取得 LLM 實例；相同配置共用同一個實例（以及其 HTTP 連線池）
+
+    Args:
+        llm_config: LLM 配置
+        use_cache: 是否使用共用實例快取
+
+    Returns:
+        LLM 實例
+    """
+    if not use_cache:
+        return create_llm(llm_config)
+
+    key = config_hash(llm_config)
+    with _lock:
+        cached = _llm_cache.get(key)
+    if cached is not None:
+        return cached[1]
+
+    llm = create_llm(llm_config)
+    with _lock:
+        # 並行建立時以先寫入者為準，確保所有呼叫端共用同一個實例
+        cached = _llm_cache.setdefault(key, (llm_config.get_provider_name(), llm))
+    return cached[1]
+
+
+def clear_llm_cache() -> None:
+    """清除共用 LLM 實例快取"""
+    with _lock:
+        _llm_cache.clear()
+
+
+def _create_ollama(llm_config: LLMConfig) -> "LLM":
+    """建立 Ollama LLM 實例"""
+    from llama_index.llms.ollama import Ollama
+
+    if not llm_config.ollama:
+        raise ValueError("Ollama 配置不存在")
+    ollama_cfg = llm_config.ollama
+    return Ollama(
+        model=ollama_cfg.model,
+        base_url=ollama_cfg.base_url,
+        request_timeout=llm_config.timeout,
+        temperature=ollama_cfg.temperature,
+        top_p=ollama_cfg.top_p,
+        top_k=ollama_cfg.top_k,
+        num_ctx=ollama_cfg.num_ctx,
+        repeat_penalty=ollama_cfg.repeat_penalty,
+    )
+
+
+def _create_openai(llm_config: LLMConfig) -> "LLM":
+    """建立 OpenAI LLM 實例"""
+    try:
+        from llama_index.llms.openai import OpenAI
+    except ImportError:
+        raise ImportError(
+            "使用 OpenAI provider 需要安裝 llama-index-llms-openai: "
+            "pip install llama-index-llms-openai"
+        )
+    if not llm_config.openai:
+        raise ValueError("OpenAI 配置不存在")
+    openai_cfg = llm_config.openai
+    return OpenAI(
+        api_key=openai_cfg.api_key,
+        model=openai_cfg.model,
+        base_url=openai_cfg.base_url,
+        temperature=openai_cfg.temperature,
+        max_tokens=openai_cfg.max_tokens,
+        top_p=openai_cfg.top_p,
+        frequency_penalty=openai_cfg.frequency_penalty,
+        presence_penalty=openai_cfg.presence_penalty,
+        timeout=llm_config.timeout,
+    )
+
+
+def _create_anthropic(llm_config: LLMConfig) -> "LLM":
+    """建立 Anthropic LLM 實例"""
+    try:
+        from llama_index.llms.anthropic import Anthropic
+    except ImportError:
+        raise ImportError(
+            "使用 Anthropic provider 需要安裝 llama-index-llms-anthropic: "
+            "pip install llama-index-llms-anthropic"
+        )
+    if not llm_config.anthropic:
+        raise ValueError("Anthropic 配置不存在")
+    anthropic_cfg = llm_config.anthropic
+    return Anthropic(
+        api_key=anthropic_cfg.api_key,
+        model=anthropic_cfg.model,
+        temperature=anthropic_cfg.temperature,
+        max_tokens=anthropic_cfg.max_tokens,
+        top_p=anthropic_cfg.top_p,
+        timeout=llm_config.timeout,
+    )
+
+
+def _create_fake(llm_config: LLMConfig) -> "LLM":
+    """建立本地模擬 LLM 實例（record 模式同時建立 upstream LLM）"""
+    from .fake_llm import FakeLLM
+
+    if not llm_config.fake:
+        raise ValueError("Fake 配置不存在")
+    fake_cfg = llm_config.fake
+    upstream = get_llm(fake_cfg.upstream) if fake_cfg.mode == "record" else None
+    return FakeLLM(fake_cfg, upstream=upstream)
+
+
+register_provider(LLMProvider.OLLAMA.value, _create_ollama)
+register_provider(LLMProvider.OPENAI.value, _create_openai)
+register_provider(LLMProvider.ANTHROPIC.value, _create_anthropic)
+register_provider(LLMProvider.FAKE.value, _create_fake)
@@ -0,0 +1,316 @@
+"""Token bucket 速率限制模組（每分鐘請求數與 token 數）"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class RateLimitExceeded(RuntimeError):
+    """在期限內無法取得足夠的速率額度時拋出"""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    粗略估計文字的 token 數（約 4 個字元一個 token，CJK 字元一個字一個 token）
+
+    Args:
+        text: 文字
+
+    Returns:
+        估計的 token 數
+    """
+    if not text:
+        return 0
+    wide = sum(1 for ch in text if ord(ch) > 0x2E7F)
+    return wide + (len(text) - wide + 3) // 4
+
+
+class TokenBucket:
+    """
+    Token bucket：以固定速率補充額度，容量為每分鐘額度（允許一分鐘內的突發流量）
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        初始化 TokenBucket
+
+        Args:
+            per_minute: 每分鐘補充的額度
+            capacity: 桶容量（預設等於 per_minute）
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """依經過時間補充額度（呼叫端需持有鎖）"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        取得額度足夠前需要等待的時間（呼叫端需持有鎖）
+
+        Args:
+            amount: 需要的額度（超過容量時以容量計算）
+            now: 目前時間（time.monotonic()）
+
+        Returns:
+            需要等待的秒數（0 表示可立即取得）
+        """
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self._tokens
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """扣除額度（可為負數以退回額度，呼叫端需持有鎖）"""
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    @property
+    def remaining(self) -> float:
+        """目前剩餘的額度（不補充）"""
+        return max(0.0, self._tokens)
+
+
+class RateLimiter:
+    """
+    請求數與 token 數兩個 token bucket 的組合
+
+    請求前以估計的 token 數（prompt + 預估的回應長度）同時扣除兩個 bucket，回應完成後再以
+    實際長度校正 token bucket。額度不足時等待，預計等待超過期限則拋出 RateLimitExceeded。
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_wait: Optional[float] = 30.0,
+    ):
+        """
+        初始化 RateLimiter
+
+        Args:
+            name: 限制器名稱（用於統計）
+            requests_per_minute: 每分鐘請求數上限（None 表示不限制）
+            tokens_per_minute: 每分鐘 token 數上限（None 表示不限制）
+            max_wait: 預設最長等待時間（秒，None 表示不限制）
+        """
+        self.name = name
+        self.max_wait = max_wait
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._counters = {"acquired": 0, "waited": 0, "rejected": 0}
+
+    @classmethod
+    def from_config(cls, name: str, config: Any) -> "RateLimiter":
+        """
+        從 RateLimitConfig 建立限制器
+
+        Args:
+            name: 限制器名稱
+            config: RateLimitConfig 實例
+
+        Returns:
+            RateLimiter 實例
+        """
+        return cls(
+            name=name,
+            requests_per_minute=config.requests_per_minute,
+            tokens_per_minute=config.tokens_per_minute,
+            max_wait=config.max_wait,
+        )
+
+    def _reserve(self, tokens: int) -> float:
+        """額度足夠時扣除並返回 0，否則返回需要等待的秒數"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.wait_time(1, now))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.wait_time(tokens, now))
+            if wait == 0.0:
+                if self._requests is not None:
+                    self._requests.consume(1)
+                if self._tokens is not None:
+                    self._tokens.consume(tokens)
+                self._counters["acquired"] += 1
+            return wait
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        """計算等待期限"""
+        timeout = self.max_wait if timeout is None else timeout
+        return time.monotonic() + timeout if timeout is not None else None
+
+    def _check_deadline(self, wait: float, deadline: Optional[float]) -> None:
+        """預計等待超過期限時拋出 RateLimitExceeded"""
+        if deadline is not None and time.monotonic() + wait > deadline:
+            with self._lock:
+                self._counters["rejected"] += 1
+            raise RateLimitExceeded(
+                f"{self.name} 速率額度不足，需等待 {wait:.1f} 秒，超過等待期限"
+            )
+
+    async def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> None:
+        """
+        等待並扣除一次請求與估計的 token 額度（非同步版本）
+
+        Args:
+            tokens: 估計的 token 數
+            timeout: 最長等待時間（秒，None 表示使用 max_wait）
+
+        Raises:
+            RateLimitExceeded: 在期限內無法取得額度
+        """
+        deadline = self._deadline(timeout)
+        waited = False
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0.0:
+                break
+            self._check_deadline(wait, deadline)
+            waited = True
+            await asyncio.sleep(wait)
+        if waited:
+            with self._lock:
+                self._counters["waited"] += 1
+
+    def acquire_sync(self, tokens: int = 0, timeout: Optional[float] = None) -> None:
+        """
+        等待並扣除一次請求與估計的 token 額度（同步版本）
+
+        Args:
+            tokens: 估計的 token 數
+            timeout: 最長等待時間（秒，None 表示使用 max_wait）
+
+        Raises:
+            RateLimitExceeded: 在期限內無法取得額度
+        """
+        deadline = self._deadline(timeout)
+        waited = False
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0.0:
+                break
+            self._check_deadline(wait, deadline)
+            waited = True
+            time.sleep(wait)
+        if waited:
+            with self._lock:
+                self._counters["waited"] += 1
+
+    def adjust(self, tokens: int) -> None:
+        """
+        以實際用量校正 token 額度
+
+        Args:
+            tokens: 實際用量與估計值的差（正數為多扣，負數為退回）
+        """
+        if self._tokens is None or not tokens:
+            return
+        with self._lock:
+            self._tokens.consume(tokens)
+
+    def refund(self, tokens: int = 0) -> None:
+        """
+        退回一次請求與估計的 token 額度（請求未送出時使用）
+
+        Args:
+            tokens: 先前扣除的估計 token 數
+        """
+        with self._lock:
+            if self._requests is not None:
+                self._requests.consume(-1)
+            if self._tokens is not None:
+                self._tokens.consume(-tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得剩餘額度與統計
+
+        Returns:
+            包含 remaining_requests、remaining_tokens 與累計計數的字典
+        """
+        with self._lock:
+            now = time.monotonic()
+            remaining: Dict[str, Any] = {}
+            for key, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                if bucket is None:
+                    remaining[f"remaining_{key}"] = None
+                    remaining[f"{key}_per_minute"] = None
+                else:
+                    bucket._refill(now)
+                    remaining[f"remaining_{key}"] = int(bucket.remaining)
+                    remaining[f"{key}_per_minute"] = int(bucket.capacity)
+            return {"name": self.name, **remaining, **self._counters}
+
+
+_provider_limiters: Dict[str, RateLimiter] = {}
+_user_limiters: "OrderedDict[str, RateLimiter]" = OrderedDict()
+_limiters_lock = threading.Lock()
+# 每個使用者一個限制器，只保留最近使用的使用者以限制記憶體用量
+MAX_USER_LIMITERS = 10000
+
+
+def get_rate_limiter(key: str, name: str, config: Any) -> RateLimiter:
+    """
+    取得（必要時建立）程序共用的 provider 速率限制器
+
+    Args:
+        key: 限制器鍵（通常為 LLMConfig 的雜湊）
+        name: 限制器名稱
+        config: RateLimitConfig 實例
+
+    Returns:
+        RateLimiter 實例
+    """
+    with _limiters_lock:
+        limiter = _provider_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter.from_config(name, config)
+            _provider_limiters[key] = limiter
+        return limiter
+
+
+def get_user_rate_limiter(user_key: str, config: Any) -> RateLimiter:
+    """
+    取得（必要時建立）使用者或 session 的速率限制器
+
+    Args:
+        user_key: user_id 或 session_id
+        config: RateLimitConfig 實例
+
+    Returns:
+        RateLimiter 實例
+    """
+    with _limiters_lock:
+        limiter = _user_limiters.get(user_key)
+        if limiter is None:
+            limiter = RateLimiter.from_config(user_key, config)
+            _user_limiters[user_key] = limiter
+            while len(_user_limiters) > MAX_USER_LIMITERS:
+                _user_limiters.popitem(last=False)
+        else:
+            _user_limiters.move_to_end(user_key)
+        return limiter
+
+
+def rate_limiter_stats() -> Dict[str, Any]:
+    """
+    取得所有速率限制器的剩餘額度（供監控使用）
+
+    Returns:
+        {"providers": {鍵: 統計}, "users": {使用者: 統計}}
+    """
+    with _limiters_lock:
+        providers = dict(_provider_limiters)
+        users = dict(_user_limiters)
+    return {
+        "providers": {key: limiter.stats() for key, limiter in providers.items()},
+        "users": {key: limiter.stats() for key, limiter in users.items()},
+    }
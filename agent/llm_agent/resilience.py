@@ -0,0 +1,259 @@
+"""LLM provider 斷路器（circuit breaker）模組"""
+
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Dict, Optional
+
+
+class CircuitState(str, Enum):
+    """斷路器狀態"""
+
+    CLOSED = "closed"  # 正常放行
+    OPEN = "open"  # 快速失敗
+    HALF_OPEN = "half_open"  # 放行少量探測請求
+
+
+class CircuitOpenError(RuntimeError):
+    """所有可用的 provider 斷路器皆為開啟狀態時拋出"""
+
+
+class CircuitBreaker:
+    """
+    以滑動視窗統計失敗率與慢呼叫率的斷路器
+
+    視窗內呼叫數達到 min_calls 且失敗率或慢呼叫率超過門檻時開啟斷路器，開啟期間請求直接被拒絕；
+    經過 open_duration 後進入半開狀態，放行 half_open_max_calls 個探測請求，全部成功則關閉，
+    任一失敗則重新開啟。
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        """
+        初始化 CircuitBreaker
+
+        Args:
+            name: 斷路器名稱（用於日誌與統計）
+            failure_rate_threshold: 開啟斷路器的失敗率門檻（0-1）
+            slow_call_threshold: 視為慢呼叫的延遲（秒，None 表示不統計慢呼叫）
+            slow_call_rate_threshold: 開啟斷路器的慢呼叫率門檻（0-1）
+            window_size: 滑動視窗大小（最近幾次呼叫）
+            min_calls: 開始計算比率前所需的最少呼叫數
+            open_duration: 開啟後多久（秒）進入半開狀態
+            half_open_max_calls: 半開狀態允許的探測請求數
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+
+        # 每筆為 (是否失敗, 是否為慢呼叫)
+        self._window: deque = deque(maxlen=window_size)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @classmethod
+    def from_config(cls, name: str, config: Any) -> "CircuitBreaker":
+        """
+        從 CircuitBreakerConfig 建立斷路器
+
+        Args:
+            name: 斷路器名稱
+            config: CircuitBreakerConfig 實例
+
+        Returns:
+            CircuitBreaker 實例
+        """
+        return cls(
+            name=name,
+            failure_rate_threshold=config.failure_rate_threshold,
+            slow_call_threshold=config.slow_call_threshold,
+            slow_call_rate_threshold=config.slow_call_rate_threshold,
+            window_size=config.window_size,
+            min_calls=config.min_calls,
+            open_duration=config.open_duration,
+            half_open_max_calls=config.half_open_max_calls,
+        )
+
+    @property
+    def state(self) -> CircuitState:
+        """目前狀態（開啟時間已過時視為半開）"""
+        with self._lock:
+            self._refresh_locked()
+            return self._state
+
+    def _refresh_locked(self) -> None:
+        """開啟時間已過時轉為半開狀態（呼叫端需持有 self._lock）"""
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.open_duration
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _open_locked(self) -> None:
+        """開啟斷路器（呼叫端需持有 self._lock）"""
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self._counters["opened"] += 1
+
+    def allow_request(self) -> bool:
+        """
+        檢查是否放行請求；放行後呼叫端必須呼叫 record_success 或 record_failure
+
+        Returns:
+            是否放行
+        """
+        with self._lock:
+            self._refresh_locked()
+            if self._state == CircuitState.CLOSED:
+                return True
+            if (
+                self._state == CircuitState.HALF_OPEN
+                and self._probes_in_flight < self.half_open_max_calls
+            ):
+                self._probes_in_flight += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        """
+        記錄成功的呼叫
+
+        Args:
+            latency: 呼叫延遲（秒）
+        """
+        slow = self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        with self._lock:
+            self._counters["successes"] += 1
+            if self._state == CircuitState.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if slow:
+                    self._open_locked()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_max_calls:
+                    self._state = CircuitState.CLOSED
+                    self._window.clear()
+                return
+            self._record_locked(False, slow)
+
+    def record_failure(self, latency: float) -> None:
+        """
+        記錄失敗的呼叫
+
+        Args:
+            latency: 呼叫延遲（秒）
+        """
+        slow = self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        with self._lock:
+            self._counters["failures"] += 1
+            if self._state == CircuitState.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                self._open_locked()
+                return
+            self._record_locked(True, slow)
+
+    def release(self) -> None:
+        """放棄已放行但未完成的請求（例如被取消），不計入成功或失敗"""
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _record_locked(self, failed: bool, slow: bool) -> None:
+        """將結果加入視窗並檢查是否需要開啟（呼叫端需持有 self._lock）"""
+        if self._state != CircuitState.CLOSED:
+            return
+        self._window.append((failed, slow))
+        calls = len(self._window)
+        if calls < self.min_calls:
+            return
+        failure_rate = sum(1 for f, _ in self._window if f) / calls
+        slow_rate = sum(1 for _, s in self._window if s) / calls
+        if failure_rate >= self.failure_rate_threshold or (
+            self.slow_call_threshold is not None and slow_rate >= self.slow_call_rate_threshold
+        ):
+            self._open_locked()
+
+    def reset(self) -> None:
+        """重置為關閉狀態並清除視窗"""
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._window.clear()
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得斷路器統計
+
+        Returns:
+            包含狀態、視窗內失敗率與累計計數的字典
+        """
+        with self._lock:
+            self._refresh_locked()
+            calls = len(self._window)
+            return {
+                "name": self.name,
+                "state": self._state.value,
+                "window_calls": calls,
+                "failure_rate": sum(1 for f, _ in self._window if f) / calls if calls else 0.0,
+                "slow_call_rate": sum(1 for _, s in self._window if s) / calls if calls else 0.0,
+                **self._counters,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key: str, name: str, config: Any) -> CircuitBreaker:
+    """
+    取得（必要時建立）程序共用的斷路器，讓相同 provider 配置的所有 Agent 共用同一個狀態
+
+    Args:
+        key: 斷路器鍵（通常為 LLMConfig 的雜湊）
+        name: 斷路器名稱
+        config: CircuitBreakerConfig 實例
+
+    Returns:
+        CircuitBreaker 實例
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker.from_config(name, config)
+            _breakers[key] = breaker
+        return breaker
+
+
+def circuit_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    取得所有斷路器的統計
+
+    Returns:
+        斷路器鍵 -> 統計字典
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {key: breaker.stats() for key, breaker in breakers.items()}
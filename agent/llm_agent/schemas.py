@@ -28,6 +28,7 @@ class AgentRequest(BaseModel):
 
     message: str = Field(..., description="使用者訊息")
     session_id: Optional[str] = Field(default=None, description="會話 ID，用於區分不同對話")
+    user_id: Optional[str] = Field(default=None, description="使用者 ID，用於使用者速率限制")
     context: Optional[Dict[str, Any]] = Field(default_factory=dict, description="額外的上下文資訊")
     stream: bool = Field(default=False, description="是否使用串流回應")
 
@@ -36,6 +37,7 @@ class AgentRequest(BaseModel):
             "example": {
                 "message": "請幫我查詢天氣",
                 "session_id": "session_123",
+                "user_id": "user_1",
                 "context": {"location": "台北"},
                 "stream": False,
             }
@@ -81,3 +83,56 @@ class ToolResult(BaseModel):
             }
         }
 
+
+class BatchCompletionResult(BaseModel):
+    """批次完成中單一項目的結果模型"""
+
+    index: int = Field(..., description="項目在輸入列表中的位置")
+    prompt: str = Field(..., description="提示詞")
+    response: Optional[str] = Field(default=None, description="完成的文字（失敗時為 None）")
+    success: bool = Field(default=True, description="是否執行成功")
+    error: Optional[str] = Field(default=None, description="錯誤訊息（如果執行失敗）")
+    latency_ms: float = Field(..., description="此項目的 LLM 呼叫延遲（毫秒，不含排隊時間）")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "index": 0,
+                "prompt": "請用一句話介紹台北",
+                "response": "台北是台灣的首都...",
+                "success": True,
+                "error": None,
+                "latency_ms": 812.5,
+            }
+        }
+
+
+class ToolExecutionResult(BaseModel):
+    """ToolRegistry 執行單一工具呼叫的結果模型"""
+
+    index: int = Field(default=0, description="呼叫在批次中的位置")
+    tool_name: str = Field(..., description="工具名稱")
+    arguments: Dict[str, Any] = Field(default_factory=dict, description="呼叫參數")
+    result: Any = Field(default=None, description="工具回傳值（失敗時為 None）")
+    success: bool = Field(default=True, description="是否執行成功")
+    error: Optional[str] = Field(default=None, description="錯誤訊息（如果執行失敗）")
+    duration_ms: float = Field(..., description="執行時間（毫秒，含等待執行緒 / 程序池的時間）")
+    cached: bool = Field(default=False, description="結果是否來自工具結果快取")
+    saved_ms: Optional[float] = Field(
+        default=None, description="快取命中時省下的執行時間（毫秒，即原始呼叫的執行時間）"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "index": 0,
+                "tool_name": "get_weather",
+                "arguments": {"location": "台北"},
+                "result": "台北的天氣是晴天",
+                "success": True,
+                "error": None,
+                "duration_ms": 35.2,
+                "cached": False,
+                "saved_ms": None,
+            }
+        }
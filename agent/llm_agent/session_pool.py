@@ -0,0 +1,500 @@
+"""多 Session Agent 池模組"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Type,
+)
+
+from .cache import create_response_cache
+from .concurrency import concurrency_limiter_stats
+from .config import AgentConfig
+from .schemas import AgentRequest, AgentResponse, BatchCompletionResult
+from .ratelimit import rate_limiter_stats
+from .resilience import circuit_breaker_stats
+from .singleflight import get_singleflight
+from .state.agent_state import AgentState
+from .state.memory_store import get_memory_store
+
+if TYPE_CHECKING:
+    from .agent import BaseAgent
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession:
+    """
+    池中單一 session 的條目
+
+    同步（chat）與非同步（achat）呼叫各自以 sync_lock / async_lock 依序處理，兩者之間
+    不互斥；同一 session 請只使用其中一種呼叫方式，混用時可能同時修改同一份記憶。
+    """
+
+    __slots__ = ("agent", "last_used", "active", "tokens", "async_lock", "sync_lock")
+
+    def __init__(self, agent: "BaseAgent"):
+        self.agent = agent
+        self.last_used = time.monotonic()
+        self.active = 0
+        # 上次計入池記憶總量時的 token 數
+        self.tokens = 0
+        self.async_lock = asyncio.Lock()
+        self.sync_lock = threading.Lock()
+
+
+class AgentSessionPool:
+    """
+    Agent Session 池
+
+    所有 session 共用同一個 LLM 實例、ToolRegistry 與回應快取，每個 session_id 擁有獨立的
+    AgentState / ChatMemory。以 LRU 與閒置 TTL 回收 session，並以 per-session lock
+    讓不同 session 的請求可以並行處理、同一 session 的請求依序處理。
+    """
+
+    def __init__(
+        self,
+        config: Optional[AgentConfig] = None,
+        tools: Optional[List] = None,
+        max_sessions: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        memory_budget: Optional[int] = None,
+        agent_cls: Optional[Type["BaseAgent"]] = None,
+        on_evict: Optional[Callable[[str, AgentState], None]] = None,
+    ):
+        """
+        初始化 AgentSessionPool
+
+        Args:
+            config: Agent 配置（如果為 None，則從環境變數載入）
+            tools: 所有 session 共用的工具列表（可選）
+            max_sessions: 最多保留的 session 數量（預設使用 config.max_sessions）
+            idle_ttl: 閒置回收時間（秒，預設使用 config.session_idle_ttl）
+            memory_budget: 所有 session 記憶 token 總數上限（預設使用 config.session_memory_budget）
+            agent_cls: 建立 session Agent 使用的類別（預設為 BaseAgent，可為其子類別）
+            on_evict: session 被回收時的回呼（可用於持久化 State）
+        """
+        self.config = config or AgentConfig()
+        self.max_sessions = max_sessions or self.config.max_sessions
+        self.idle_ttl = idle_ttl if idle_ttl is not None else self.config.session_idle_ttl
+        self.memory_budget = (
+            memory_budget if memory_budget is not None else self.config.session_memory_budget
+        )
+        # BaseAgent 與 ToolRegistry 依賴 LlamaIndex，建立 session 池時才載入
+        from .agent import BaseAgent
+        from .tools import ToolRegistry
+
+        self.agent_cls = agent_cls or BaseAgent
+        self.on_evict = on_evict
+
+        self.tool_registry = ToolRegistry(
+            max_workers=self.config.tool_max_workers,
+            default_timeout=self.config.tool_timeout,
+        )
+        if tools:
+            self.register_tools(tools)
+
+        self.response_cache = None
+        if self.config.response_cache_enabled:
+            self.response_cache = create_response_cache(
+                max_entries=self.config.response_cache_max_entries,
+                ttl=self.config.response_cache_ttl,
+                path=self.config.response_cache_path,
+            )
+
+        self._llm = None
+        self._completion_agent: Optional["BaseAgent"] = None
+        self._sessions: "OrderedDict[str, _PooledSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+        # 所有 session 記憶 token 數的累計值（歸還 session 時更新，回收時扣除）
+        self._memory_tokens = 0
+
+    def _new_agent(self, session_id: str) -> "BaseAgent":
+        """建立共用 LLM 與 ToolRegistry 的 session Agent"""
+        from .state.token_memory import get_token_counter
+
+        state = AgentState(
+            session_id=session_id,
+            memory_token_limit=self.config.memory_token_limit,
+            max_tool_results=self.config.max_tool_results,
+            max_tool_results_per_tool=self.config.max_tool_results_per_tool,
+            memory_store=(
+                get_memory_store(self.config.memory_store_path)
+                if self.config.memory_store_path
+                else None
+            ),
+            memory_tokenizer=get_token_counter(self.config.memory_tokenizer),
+        )
+        agent = self.agent_cls(
+            config=self.config,
+            state=state,
+            llm=self._llm,
+            tool_registry=self.tool_registry,
+            response_cache=self.response_cache,
+        )
+        if self._llm is None:
+            self._llm = agent.llm
+        return agent
+
+    def _checkout(self, session_id: str) -> _PooledSession:
+        """
+        取得（必要時建立）session 條目，並標記為使用中
+
+        建立 Agent（可能從記憶儲存載入歷史）時不持有池的鎖，避免阻塞其他 session；
+        同一 session 同時被建立時只保留先插入的條目。
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                evicted = self._claim_locked(session_id, entry)
+
+        if entry is None:
+            created = _PooledSession(self._new_agent(session_id))
+            with self._lock:
+                entry = self._sessions.get(session_id)
+                if entry is None:
+                    entry = created
+                    self._sessions[session_id] = entry
+                    self._update_tokens_locked(entry)
+                evicted = self._claim_locked(session_id, entry)
+
+        self._notify_evicted(evicted)
+        return entry
+
+    def _claim_locked(self, session_id: str, entry: _PooledSession) -> List[_PooledSession]:
+        """標記條目為使用中並回收超出預算的 session（呼叫端需持有 self._lock）"""
+        self._sessions.move_to_end(session_id)
+        entry.active += 1
+        entry.last_used = time.monotonic()
+        return self._evict_locked()
+
+    def _checkin(self, entry: _PooledSession) -> None:
+        """歸還 session 條目，並更新記憶 token 累計值"""
+        with self._lock:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            if self._sessions.get(entry.agent.state.session_id) is entry:
+                self._update_tokens_locked(entry)
+
+    def _update_tokens_locked(self, entry: _PooledSession) -> None:
+        """以條目目前的記憶 token 數（O(1)）更新累計值（呼叫端需持有 self._lock）"""
+        tokens = entry.agent.state.memory.token_count()
+        self._memory_tokens += tokens - entry.tokens
+        entry.tokens = tokens
+
+    def _pop_locked(self, session_id: str) -> Optional[_PooledSession]:
+        """移除 session 並從累計值扣除其 token 數（呼叫端需持有 self._lock）"""
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._memory_tokens -= entry.tokens
+        return entry
+
+    def _evict_locked(self) -> List[_PooledSession]:
+        """依閒置 TTL、session 數量與記憶預算回收 session（呼叫端需持有 self._lock）"""
+        evicted: List[_PooledSession] = []
+
+        if self.idle_ttl is not None:
+            deadline = time.monotonic() - self.idle_ttl
+            for session_id in [
+                sid for sid, e in self._sessions.items() if not e.active and e.last_used < deadline
+            ]:
+                evicted.append(self._pop_locked(session_id))
+
+        def over_budget() -> bool:
+            if len(self._sessions) > self.max_sessions:
+                return True
+            return self.memory_budget is not None and self._memory_tokens > self.memory_budget
+
+        # 由最久未使用的 session 開始回收，使用中的 session 不回收
+        while over_budget():
+            victim = next((sid for sid, e in self._sessions.items() if not e.active), None)
+            if victim is None:
+                break
+            evicted.append(self._pop_locked(victim))
+
+        self._evictions += len(evicted)
+        return evicted
+
+    def _notify_evicted(self, evicted: List[_PooledSession]) -> None:
+        """呼叫 on_evict 回呼"""
+        if not self.on_evict:
+            return
+        for entry in evicted:
+            try:
+                self.on_evict(entry.agent.state.session_id, entry.agent.state)
+            except Exception as e:
+                logger.error(f"Session 回收回呼失敗: {e}", exc_info=True)
+
+    @staticmethod
+    def _with_session_id(request: AgentRequest) -> AgentRequest:
+        """確保請求帶有 session_id"""
+        if request.session_id:
+            return request
+        return request.model_copy(update={"session_id": str(uuid.uuid4())})
+
+    def get_agent(self, session_id: str) -> "BaseAgent":
+        """
+        取得 session 對應的 Agent（不存在時建立）
+
+        注意：直接操作回傳的 Agent 不會經過 per-session lock。
+
+        Args:
+            session_id: 會話 ID
+
+        Returns:
+            BaseAgent 實例
+        """
+        entry = self._checkout(session_id)
+        self._checkin(entry)
+        return entry.agent
+
+    def get_state(self, session_id: str) -> Optional[AgentState]:
+        """
+        取得 session 的 AgentState（不會建立新 session）
+
+        Args:
+            session_id: 會話 ID
+
+        Returns:
+            AgentState 實例或 None
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry.agent.state if entry else None
+
+    def chat(self, request: AgentRequest) -> AgentResponse:
+        """
+        在請求所屬的 session 中進行對話（同步版本）
+
+        Args:
+            request: Agent 請求（未提供 session_id 時會自動產生）
+
+        Returns:
+            Agent 回應
+        """
+        request = self._with_session_id(request)
+        entry = self._checkout(request.session_id)
+        try:
+            with entry.sync_lock:
+                return entry.agent.chat(request)
+        finally:
+            self._checkin(entry)
+
+    async def achat(self, request: AgentRequest) -> AgentResponse:
+        """
+        在請求所屬的 session 中進行對話（非同步版本）
+
+        Args:
+            request: Agent 請求（未提供 session_id 時會自動產生）
+
+        Returns:
+            Agent 回應
+        """
+        request = self._with_session_id(request)
+        entry = self._checkout(request.session_id)
+        try:
+            async with entry.async_lock:
+                return await entry.agent.achat(request)
+        finally:
+            self._checkin(entry)
+
+    def stream_chat(self, request: AgentRequest) -> Iterator[str]:
+        """
+        在請求所屬的 session 中進行串流對話（同步版本）
+
+        Args:
+            request: Agent 請求（未提供 session_id 時會自動產生）
+
+        Yields:
+            回應文字片段
+        """
+        request = self._with_session_id(request)
+        entry = self._checkout(request.session_id)
+        try:
+            with entry.sync_lock:
+                yield from entry.agent.stream_chat(request)
+        finally:
+            self._checkin(entry)
+
+    async def astream_chat(self, request: AgentRequest) -> AsyncIterator[str]:
+        """
+        在請求所屬的 session 中進行串流對話（非同步版本）
+
+        Args:
+            request: Agent 請求（未提供 session_id 時會自動產生）
+
+        Yields:
+            回應文字片段
+        """
+        request = self._with_session_id(request)
+        entry = self._checkout(request.session_id)
+        try:
+            async with entry.async_lock:
+                tokens = entry.agent.astream_chat(request)
+                try:
+                    async for delta in tokens:
+                        yield delta
+                finally:
+                    await tokens.aclose()
+        finally:
+            self._checkin(entry)
+
+    def _get_completion_agent(self) -> "BaseAgent":
+        """
+        取得不綁定 session 的 Agent（用於無狀態的文字完成）
+
+        與 _checkout 相同，建立 Agent 時不持有池的鎖；同時建立時只保留先設定的 Agent。
+        """
+        with self._lock:
+            agent = self._completion_agent
+        if agent is None:
+            created = self._new_agent("__completion__")
+            with self._lock:
+                if self._completion_agent is None:
+                    self._completion_agent = created
+                agent = self._completion_agent
+        return agent
+
+    async def acomplete(self, prompt: str, user_id: Optional[str] = None, **kwargs) -> str:
+        """
+        使用共用 LLM 完成文字（不屬於任何 session）
+
+        Args:
+            prompt: 提示詞
+            user_id: 可選的使用者 ID（套用該使用者的速率限制）
+            **kwargs: 額外的參數
+
+        Returns:
+            完成的文字
+        """
+        return await self._get_completion_agent().acomplete(prompt, user_id=user_id, **kwargs)
+
+    def aiter_batch_complete(
+        self,
+        prompts: Sequence[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[BatchCompletionResult]:
+        """
+        使用共用 LLM 並行完成多個提示詞，依完成順序逐一產生結果
+
+        參數同 BaseAgent.aiter_batch_complete。
+        """
+        return self._get_completion_agent().aiter_batch_complete(
+            prompts, max_concurrency=max_concurrency, return_exceptions=return_exceptions, **kwargs
+        )
+
+    async def abatch_complete(
+        self,
+        prompts: Sequence[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[BatchCompletionResult]:
+        """
+        使用共用 LLM 並行完成多個提示詞，結果順序與輸入相同
+
+        參數同 BaseAgent.abatch_complete。
+        """
+        return await self._get_completion_agent().abatch_complete(
+            prompts, max_concurrency=max_concurrency, return_exceptions=return_exceptions, **kwargs
+        )
+
+    def register_tool(self, tool) -> None:
+        """
+        註冊工具到所有 session 共用的 ToolRegistry
+
+        各 session 的 ReActAgent 在下一次對話時才依 ToolRegistry 版本重建，註冊本身不會重建。
+
+        Args:
+            tool: FunctionTool 實例
+        """
+        self.register_tools([tool])
+
+    def register_tools(self, tools: List[Any]) -> None:
+        """
+        批次註冊工具到所有 session 共用的 ToolRegistry（整批只遞增一次版本）
+
+        Args:
+            tools: FunctionTool 列表
+        """
+        valid = []
+        for tool in tools:
+            if hasattr(tool, "metadata"):
+                valid.append(tool)
+            else:
+                logger.warning(f"工具 {tool} 不是有效的 FunctionTool，已跳過")
+        self.tool_registry.register_many(valid)
+
+    def remove(self, session_id: str) -> bool:
+        """
+        移除 session
+
+        Args:
+            session_id: 會話 ID
+
+        Returns:
+            是否成功移除
+        """
+        with self._lock:
+            entry = self._pop_locked(session_id)
+        if entry is None:
+            return False
+        self._notify_evicted([entry])
+        return True
+
+    def evict_idle(self) -> int:
+        """
+        立即回收閒置超時或超出預算的 session（可由背景任務定期呼叫）
+
+        Returns:
+            回收的 session 數量
+        """
+        with self._lock:
+            evicted = self._evict_locked()
+        self._notify_evicted(evicted)
+        return len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得池的統計資訊
+
+        Returns:
+            統計資訊字典
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "active_sessions": sum(1 for e in self._sessions.values() if e.active),
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "memory_budget": self.memory_budget,
+                "memory_tokens": self._memory_tokens,
+                "evictions": self._evictions,
+                "coalescing": get_singleflight().stats(),
+                "circuit_breakers": circuit_breaker_stats(),
+                "concurrency": concurrency_limiter_stats(),
+                "rate_limits": rate_limiter_stats(),
+            }
+
+    def __len__(self) -> int:
+        """取得 session 數量"""
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        """檢查 session 是否存在"""
+        return session_id in self._sessions
@@ -0,0 +1,256 @@
+"""相同請求合併（single-flight）模組"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _SyncCall:
+    """同步版本進行中的呼叫"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncCall:
+    """非同步版本進行中的呼叫"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamBroadcast:
+    """將單一上游串流廣播給多個訂閱者；晚加入的訂閱者會先收到已緩衝的片段"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        # 建立上游串流的 leader 提供的 metadata（串流結束後交給其他訂閱者）
+        self.meta: Any = None
+
+    async def pump(self, source: AsyncIterator[str]) -> None:
+        """從上游讀取片段並通知所有訂閱者"""
+        try:
+            async for chunk in source:
+                async with self.changed:
+                    self.chunks.append(chunk)
+                    self.changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+
+class SingleFlight:
+    """
+    合併進行中的相同請求
+
+    相同 key 的並行呼叫只會有一個（leader）真正送往 provider，其餘呼叫等待並共用同一個結果。
+    串流呼叫則由 leader 讀取上游串流並轉送給所有訂閱者。
+    """
+
+    def __init__(self):
+        """初始化 SingleFlight"""
+        self._calls: Dict[Tuple[int, str], _AsyncCall] = {}
+        self._streams: Dict[Tuple[int, str], _StreamBroadcast] = {}
+        self._sync_calls: Dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "leaders": 0,
+            "coalesced": 0,
+            "stream_leaders": 0,
+            "stream_coalesced": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        """遞增計數器"""
+        with self._lock:
+            self._counters[name] += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        執行（或加入進行中的）非同步呼叫
+
+        上游呼叫在獨立的 task 中執行，因此個別呼叫端被取消不會影響其他等待者；
+        所有等待者都離開時會取消上游呼叫。
+
+        Args:
+            key: 請求鍵（相同鍵視為相同請求）
+            fn: 產生上游呼叫 coroutine 的函數
+
+        Returns:
+            (結果, 是否為共用其他呼叫的結果)
+        """
+        call_key = (id(asyncio.get_running_loop()), key)
+        call = self._calls.get(call_key)
+        shared = call is not None
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda t: self._finish_call(call_key, call))
+            self._count("leaders")
+        else:
+            self._count("coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 沒有等待者了：取消上游呼叫，之後的相同請求重新開始
+                if self._calls.get(call_key) is call:
+                    del self._calls[call_key]
+                call.task.cancel()
+
+    def _finish_call(self, call_key: Tuple[int, str], call: _AsyncCall) -> None:
+        """移除已完成的呼叫，並取回例外避免未處理例外警告"""
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def do_sync(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        執行（或加入進行中的）同步呼叫
+
+        Args:
+            key: 請求鍵
+            fn: 上游呼叫函數
+
+        Returns:
+            (結果, 是否為共用其他呼叫的結果)
+        """
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+                self._counters["leaders"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._sync_calls[key]
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[str]],
+        meta: Any = None,
+        on_shared: Optional[Callable[[Any], None]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        訂閱（或建立）串流呼叫，將同一個上游串流扇出給所有訂閱者
+
+        所有訂閱者都離開時會取消上游串流。
+
+        Args:
+            key: 請求鍵
+            factory: 建立上游串流的函數
+            meta: 本次呼叫的 metadata（成為 leader 時保存，供其他訂閱者使用）
+            on_shared: 共用其他呼叫的串流且串流成功結束時，以 leader 的 meta 呼叫此函數
+
+        Yields:
+            文字片段
+        """
+        stream_key = (id(asyncio.get_running_loop()), key)
+        broadcast = self._streams.get(stream_key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = _StreamBroadcast()
+            broadcast.meta = meta
+            self._streams[stream_key] = broadcast
+            broadcast.task = asyncio.ensure_future(broadcast.pump(factory()))
+            broadcast.task.add_done_callback(lambda t: self._finish_stream(stream_key, broadcast))
+            self._count("stream_leaders")
+        else:
+            self._count("stream_coalesced")
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(
+                        lambda: index < len(broadcast.chunks) or broadcast.done
+                    )
+                    pending = broadcast.chunks[index:]
+                    finished = broadcast.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index >= len(broadcast.chunks):
+                    break
+            if broadcast.error is not None:
+                raise broadcast.error
+            if shared and on_shared is not None:
+                on_shared(broadcast.meta)
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and broadcast.task and not broadcast.task.done():
+                broadcast.task.cancel()
+
+    def _finish_stream(self, stream_key: Tuple[int, str], broadcast: _StreamBroadcast) -> None:
+        """移除已結束的串流"""
+        if self._streams.get(stream_key) is broadcast:
+            del self._streams[stream_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得合併統計（供監控使用）
+
+        Returns:
+            包含 leaders、coalesced、in_flight 等計數的字典
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        counters["in_flight"] = len(self._calls) + len(self._sync_calls)
+        counters["in_flight_streams"] = len(self._streams)
+        return counters
+
+
+_default_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """
+    取得程序共用的 SingleFlight 實例（讓不同 Agent 的相同請求也能合併）
+
+    Returns:
+        SingleFlight 實例
+    """
+    return _default_singleflight
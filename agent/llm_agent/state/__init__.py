@@ -1,7 +1,36 @@
 """Agent State 管理模組"""
 
-from .agent_state import AgentState
-from .memory import ChatMemory
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
 
-__all__ = ["AgentState", "ChatMemory"]
+if TYPE_CHECKING:
+    from .agent_state import AgentState
+    from .memory import ChatMemory
+    from .memory_store import BaseMemoryStore, SQLiteMemoryStore
+    from .token_memory import TokenCountedMemory
 
+# 公開名稱 -> 定義所在的子模組（ChatMemory 與 TokenCountedMemory 依賴 LlamaIndex，延遲載入）
+_LAZY_IMPORTS: Dict[str, str] = {
+    "AgentState": ".agent_state",
+    "ChatMemory": ".memory",
+    "BaseMemoryStore": ".memory_store",
+    "SQLiteMemoryStore": ".memory_store",
+    "TokenCountedMemory": ".token_memory",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    """第一次存取公開名稱時載入對應的子模組，並快取到套件命名空間"""
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    """列出模組屬性與尚未載入的公開名稱"""
+    return sorted({*globals(), *__all__})
@@ -1,28 +1,67 @@
 """Agent State 管理模組"""
 
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from .memory import ChatMemory
+from .memory_store import BaseMemoryStore
+from .tool_results import ToolResultStore
+
+if TYPE_CHECKING:
+    from .memory import ChatMemory
+    from .token_memory import TokenCounter
 
 
 class AgentState:
     """Agent State 管理器，管理對話上下文、tool result、workflow context 等"""
 
-    def __init__(self, session_id: Optional[str] = None, memory_token_limit: Optional[int] = None):
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        memory_token_limit: Optional[int] = None,
+        max_tool_results: Optional[int] = 1000,
+        max_tool_results_per_tool: Optional[int] = None,
+        memory_store: Optional[BaseMemoryStore] = None,
+        memory_tokenizer: Optional["TokenCounter"] = None,
+    ):
         """
         初始化 AgentState
 
         Args:
             session_id: 會話 ID，用於區分不同對話
             memory_token_limit: Memory token 限制
+            max_tool_results: 保留的工具結果數上限（None 表示不限制）
+            max_tool_results_per_tool: 每個工具保留的結果數上限（None 表示不個別限制）
+            memory_store: 對話記憶的持久化儲存（可選，設定後會從 session 的對話紀錄恢復）
+            memory_tokenizer: 對話記憶的 token 計數函數（可選，預設為精確的 tiktoken 計數）
         """
+        # ChatMemory 依賴 LlamaIndex，建立實例時才載入，讓只引用 AgentState 的程式不需載入
+        from .memory import ChatMemory
+
+        self.memory: "ChatMemory" = ChatMemory(
+            token_limit=memory_token_limit, store=memory_store, tokenizer=memory_tokenizer
+        )
+        self._session_id: Optional[str] = None
         self.session_id = session_id
-        self.memory = ChatMemory(token_limit=memory_token_limit)
-        self.tool_results: List[Dict[str, Any]] = []
+        self.tool_results = ToolResultStore(
+            max_results=max_tool_results, max_per_tool=max_tool_results_per_tool
+        )
         self.workflow_context: Dict[str, Any] = {}
         self.prompt_context: Dict[str, Any] = {}
         self.metadata: Dict[str, Any] = {}
 
+    @property
+    def session_id(self) -> Optional[str]:
+        """會話 ID"""
+        return self._session_id
+
+    @session_id.setter
+    def session_id(self, session_id: Optional[str]) -> None:
+        """設定會話 ID；使用持久化儲存且記憶為空時，從該 session 的對話紀錄恢復"""
+        changed = session_id != self._session_id
+        self._session_id = session_id
+        self.memory.session_id = session_id
+        if changed and session_id and self.memory.store is not None and len(self.memory) == 0:
+            self.memory.resume()
+
     def add_message(self, role: str, content: str) -> None:
         """
         新增訊息到對話歷史
@@ -50,41 +89,93 @@ class AgentState:
             return messages
         return [messages]
 
-    def add_tool_result(self, tool_name: str, result: Any, success: bool = True, error: Optional[str] = None) -> None:
+    def get_older_messages(self, limit: int = 20) -> List[Dict[str, str]]:
+        """
+        從持久化儲存載入比目前記憶更早的訊息（未使用持久化儲存時返回空列表）
+
+        Args:
+            limit: 最多載入的訊息數
+
+        Returns:
+            由舊到新的訊息列表
+        """
+        return self.memory.load_older(limit)
+
+    def get_chat_messages(self) -> List[Any]:
+        """
+        取得原生 LlamaIndex ChatMessage 格式的對話歷史（供 LLM chat 介面使用）
+
+        Returns:
+            ChatMessage 列表
+        """
+        return self.memory.get_messages()
+
+    def add_tool_result(
+        self,
+        tool_name: str,
+        result: Any,
+        success: bool = True,
+        error: Optional[str] = None,
+        duration_ms: Optional[float] = None,
+        cached: bool = False,
+        saved_ms: Optional[float] = None,
+    ) -> None:
         """
-        新增工具執行結果
+        新增工具執行結果（超過上限時淘汰最舊的結果）
 
         Args:
             tool_name: 工具名稱
             result: 執行結果
             success: 是否執行成功
             error: 錯誤訊息（如果執行失敗）
+            duration_ms: 執行時間（毫秒，可選）
+            cached: 結果是否來自工具結果快取
+            saved_ms: 快取命中時省下的執行時間（毫秒，可選）
         """
-        from datetime import datetime
-
         self.tool_results.append(
-            {
-                "tool_name": tool_name,
-                "result": result,
-                "success": success,
-                "error": error,
-                "timestamp": datetime.now().isoformat(),
-            }
+            tool_name,
+            result,
+            success=success,
+            error=error,
+            duration_ms=duration_ms,
+            cached=cached,
+            saved_ms=saved_ms,
         )
 
-    def get_tool_results(self, tool_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_tool_results(
+        self,
+        tool_name: Optional[str] = None,
+        since_seq: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
         """
         取得工具執行結果
 
         Args:
             tool_name: 可選的工具名稱過濾
+            since_seq: 只取得序號大於此值的結果（用於增量讀取，可選）
+            limit: 只取得最新的幾筆（可選）
 
         Returns:
-            工具執行結果列表
+            工具執行結果列表（由舊到新，每筆包含遞增的 seq）
         """
-        if tool_name:
-            return [r for r in self.tool_results if r.get("tool_name") == tool_name]
-        return self.tool_results.copy()
+        if since_seq is not None:
+            records = self.tool_results.since(since_seq, tool_name)
+            if limit is not None:
+                records = records[-limit:]
+        else:
+            records = self.tool_results.records(tool_name, limit)
+        return [record.to_dict() for record in records]
+
+    def get_tool_cache_summary(self) -> Dict[str, Any]:
+        """
+        取得工具結果快取的命中摘要
+
+        Returns:
+            包含 calls、cache_hits 與 saved_ms（快取省下的總執行時間）的字典
+        """
+        stats = self.tool_results.stats()
+        return {key: stats[key] for key in ("calls", "cache_hits", "saved_ms")}
 
     def set_workflow_context(self, key: str, value: Any) -> None:
         """
@@ -173,17 +264,27 @@ class AgentState:
         if not keep_session:
             self.session_id = None
 
-    def to_dict(self) -> Dict[str, Any]:
+    def to_dict(
+        self, tool_results_since: Optional[int] = None, tool_results_limit: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         將 Agent State 轉換為字典
 
+        Args:
+            tool_results_since: 只包含序號大於此值的工具結果（可選）
+            tool_results_limit: 最多包含的工具結果數（可選，保留最新的）
+
         Returns:
-            Agent State 字典表示
+            Agent State 字典表示（tool_results_seq 為最新工具結果的序號，可作為下次的
+            tool_results_since）
         """
         return {
             "session_id": self.session_id,
             "chat_history": self.get_chat_history(),
-            "tool_results": self.tool_results,
+            "tool_results": self.get_tool_results(
+                since_seq=tool_results_since, limit=tool_results_limit
+            ),
+            "tool_results_seq": self.tool_results.last_seq,
             "workflow_context": self.workflow_context,
             "prompt_context": self.prompt_context,
             "metadata": self.metadata,
@@ -1,22 +1,46 @@
-"""Memory 管理模組，整合 LlamaIndex ChatMemoryBuffer"""
+"""Memory 管理模組，整合 LlamaIndex memory 介面"""
 
 from typing import List, Optional
 
-from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.llms import ChatMessage
+
+from .memory_store import BaseMemoryStore
+from .token_memory import TokenCountedMemory, TokenCounter
 
 
 class ChatMemory:
-    """聊天記憶管理類別，封裝 LlamaIndex ChatMemoryBuffer"""
+    """聊天記憶管理類別，封裝 TokenCountedMemory（與 LlamaIndex ChatMemoryBuffer 相容）"""
 
-    def __init__(self, token_limit: Optional[int] = None):
+    def __init__(
+        self,
+        token_limit: Optional[int] = None,
+        store: Optional[BaseMemoryStore] = None,
+        session_id: Optional[str] = None,
+        tokenizer: Optional[TokenCounter] = None,
+    ):
         """
         初始化 ChatMemory
 
         Args:
             token_limit: Token 限制（可選）
+            store: 持久化儲存（可選，設定後新增的訊息會附加到 session 的對話紀錄）
+            session_id: 對話紀錄所屬的會話 ID（使用 store 時需要）
+            tokenizer: token 計數函數（可選，預設為精確的 tiktoken 計數；
+                       每則訊息只在新增時計算一次）
         """
-        self._memory = ChatMemoryBuffer.from_defaults(token_limit=token_limit)
+        self._memory = TokenCountedMemory.from_defaults(
+            token_limit=token_limit, tokenizer_fn=tokenizer
+        )
         self.token_limit = token_limit
+        self.store = store
+        self.session_id = session_id
+        # 非附加的修改（重置、恢復、壓縮）時遞增，讓依賴既有歷史的快取（例如 Ollama context）失效
+        self.edit_version = 0
+        # 從 store 載入的最舊訊息序號，用於按需載入更早的訊息
+        self._oldest_seq: Optional[int] = None
+        # 逐則渲染的歷史文字快取（"role: content"），供 completion prompt 使用
+        self._rendered_lines: List[str] = []
+        self._rendered_prefix = ""
 
     def add_message(self, role: str, content: str) -> None:
         """
@@ -26,8 +50,13 @@ class ChatMemory:
             role: 訊息角色（user, assistant, system）
             content: 訊息內容
         """
-        from llama_index.core.llms import ChatMessage
-        from llama_index.core.llms.types import MessageRole
+        role_value = self._put(role, content)
+        if self.store is not None and self.session_id:
+            self.store.append(self.session_id, role_value, content)
+
+    def _put(self, role: str, content: str) -> str:
+        """將訊息放入 buffer 並返回正規化後的角色名稱"""
+        from llama_index.core.llms import MessageRole
 
         # 轉換角色名稱
         role_mapping = {
@@ -39,6 +68,137 @@ class ChatMemory:
         message_role = role_mapping.get(role.lower(), MessageRole.USER)
         chat_message = ChatMessage(role=message_role, content=content)
         self._memory.put(chat_message)
+        self._append_rendered(f"{message_role.value}: {content}")
+        return message_role.value
+
+    def resume(self) -> int:
+        """
+        從持久化儲存載入 session 最新的訊息，只載入符合 token 限制的尾端
+
+        Returns:
+            載入的訊息數
+        """
+        if self.store is None or not self.session_id:
+            return 0
+        # 使用 buffer 實際的上限（未設定 token_limit 時為預設值），長對話不會讀取整個紀錄
+        messages = self.store.load_tail(self.session_id, self._memory.token_limit)
+        self._memory.reset()
+        self.edit_version += 1
+        self._rendered_lines = []
+        self._rendered_prefix = ""
+        for _, role, content in messages:
+            self._put(role, content)
+        self._oldest_seq = messages[0][0] if messages else None
+        return len(messages)
+
+    def load_older(self, limit: int = 20) -> List[dict]:
+        """
+        按需從持久化儲存載入比目前記憶更早的訊息（不會放入記憶，不影響 prompt）
+
+        連續呼叫會逐段往前載入。
+
+        Args:
+            limit: 最多載入的訊息數
+
+        Returns:
+            由舊到新的訊息列表，每個項目包含 role 和 content
+        """
+        if self.store is None or not self.session_id or self._oldest_seq is None:
+            return []
+        messages = self.store.load_before(self.session_id, self._oldest_seq, limit)
+        if messages:
+            self._oldest_seq = messages[0][0]
+        return [{"role": role, "content": content} for _, role, content in messages]
+
+    def _append_rendered(self, line: str) -> None:
+        """將一則渲染後的訊息附加到快取；前綴只會向後延伸，保持位元組穩定"""
+        if self._rendered_lines:
+            last = self._rendered_lines[-1]
+            self._rendered_prefix = (
+                f"{self._rendered_prefix}\n{last}" if len(self._rendered_lines) > 1 else last
+            )
+        self._rendered_lines.append(line)
+
+    def _sync_rendered(self) -> None:
+        """若底層 buffer 被直接修改（例如 ReActAgent 寫入），重建渲染快取"""
+        if self._memory.message_count == len(self._rendered_lines):
+            return
+        messages = self._memory.get_all()
+        self._rendered_lines = []
+        self._rendered_prefix = ""
+        for msg in messages:
+            self._append_rendered(f"{msg.role.value}: {msg.content}")
+
+    def get_messages(self) -> List[ChatMessage]:
+        """
+        取得符合 token 限制的原生 ChatMessage 列表（供 llm.chat / achat 使用）
+
+        Returns:
+            LlamaIndex ChatMessage 列表
+        """
+        return self._memory.get()
+
+    def get_all_messages(self) -> List[ChatMessage]:
+        """
+        取得所有原生 ChatMessage（不套用 token 限制）
+
+        Returns:
+            LlamaIndex ChatMessage 列表
+        """
+        return self._memory.get_all()
+
+    def replace_prefix(self, expected: List[ChatMessage], replacement: ChatMessage) -> bool:
+        """
+        以單一訊息（例如摘要）取代最舊的一段訊息
+
+        只有在最舊的訊息仍與 expected 相同時才會取代，避免覆蓋期間被重置或改寫的記憶。
+        持久化儲存中的原始紀錄不受影響。
+
+        Args:
+            expected: 要被取代的最舊訊息
+            replacement: 取代後的訊息
+
+        Returns:
+            是否已取代
+        """
+        messages = self._memory.get_all()
+        if len(messages) < len(expected) or any(
+            current.role != old.role or current.content != old.content
+            for current, old in zip(messages, expected)
+        ):
+            return False
+        self._memory.set([replacement, *messages[len(expected) :]])
+        self.edit_version += 1
+        self._rendered_lines = []
+        self._rendered_prefix = ""
+        self._sync_rendered()
+        return True
+
+    def get_history_text(self, exclude_last: bool = True) -> str:
+        """
+        取得渲染後的對話歷史文字（每行為 "role: content"）
+
+        未超出 token 限制時直接使用增量維護的快取，不需每輪重新渲染整段歷史。
+
+        Args:
+            exclude_last: 是否排除最後一則訊息（通常是本次使用者訊息）
+
+        Returns:
+            對話歷史文字
+        """
+        self._sync_rendered()
+        total = len(self._rendered_lines)
+        count = total - self._memory.window_start()
+        if count == total:
+            if exclude_last:
+                return self._rendered_prefix
+            return "\n".join(self._rendered_lines)
+
+        # 超出 token 限制：只渲染保留的尾端訊息
+        lines = self._rendered_lines[total - count :] if count else []
+        if exclude_last:
+            lines = lines[:-1]
+        return "\n".join(lines)
 
     def get_all(self) -> List[dict]:
         """
@@ -53,7 +213,7 @@ class ChatMemory:
             result.append({"role": msg.role.value, "content": msg.content})
         return result
 
-    def get(self, k: int = -1) -> Optional[dict]:
+    def get(self, k: int = -1) -> Optional[List[dict]]:
         """
         取得最近的 k 條訊息（k=-1 表示取得所有）
 
@@ -61,34 +221,44 @@ class ChatMemory:
             k: 要取得的訊息數量
 
         Returns:
-            訊息列表或單一訊息字典
+            訊息列表（符合 token 限制），沒有訊息時為 None
         """
-        messages = self._memory.get(k)
+        messages = self._memory.get()
+        if k > 0:
+            messages = messages[-k:]
         if not messages:
             return None
-
-        if isinstance(messages, list):
-            if k == -1:
-                return [{"role": msg.role.value, "content": msg.content} for msg in messages]
-            else:
-                return [{"role": msg.role.value, "content": msg.content} for msg in messages]
-        else:
-            return {"role": messages.role.value, "content": messages.content}
+        return [{"role": msg.role.value, "content": msg.content} for msg in messages]
 
     def reset(self) -> None:
-        """重置記憶"""
+        """重置記憶（使用持久化儲存時一併刪除 session 的對話紀錄）"""
         self._memory.reset()
+        self.edit_version += 1
+        self._rendered_lines = []
+        self._rendered_prefix = ""
+        self._oldest_seq = None
+        if self.store is not None and self.session_id:
+            self.store.delete(self.session_id)
 
-    def get_memory_buffer(self) -> ChatMemoryBuffer:
+    def get_memory_buffer(self) -> TokenCountedMemory:
         """
-        取得底層的 ChatMemoryBuffer 實例（供 LlamaIndex 使用）
+        取得底層的 memory buffer 實例（供 LlamaIndex 使用）
 
         Returns:
-            ChatMemoryBuffer 實例
+            TokenCountedMemory 實例
         """
         return self._memory
 
+    def token_count(self) -> int:
+        """
+        取得記憶中所有訊息的 token 總數（O(1)）
+
+        Returns:
+            token 總數
+        """
+        return self._memory.token_count
+
     def __len__(self) -> int:
-        """取得記憶中的訊息數量"""
-        return len(self._memory.get_all())
+        """取得記憶中的訊息數量（O(1)）"""
+        return self._memory.message_count
 
@@ -0,0 +1,234 @@
+"""對話記憶的持久化儲存模組"""
+
+import atexit
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..ratelimit import estimate_tokens
+
+# (序號, 角色, 內容)
+StoredMessage = Tuple[int, str, str]
+
+
+class BaseMemoryStore(ABC):
+    """對話記憶持久化儲存的抽象介面，可自訂實作後傳入 AgentState"""
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """
+        附加一則訊息到 session 的對話紀錄
+
+        Args:
+            session_id: 會話 ID
+            role: 訊息角色
+            content: 訊息內容
+        """
+
+    @abstractmethod
+    def load_tail(
+        self,
+        session_id: str,
+        token_limit: Optional[int] = None,
+        max_messages: Optional[int] = None,
+    ) -> List[StoredMessage]:
+        """
+        載入 session 最新、總 token 數不超過 token_limit 的訊息
+
+        Args:
+            session_id: 會話 ID
+            token_limit: token 上限（None 表示不限制）
+            max_messages: 訊息數上限（None 表示不限制）
+
+        Returns:
+            由舊到新的 (序號, 角色, 內容) 列表
+        """
+
+    @abstractmethod
+    def load_before(self, session_id: str, before_seq: int, limit: int) -> List[StoredMessage]:
+        """
+        載入序號小於 before_seq 的較舊訊息
+
+        Args:
+            session_id: 會話 ID
+            before_seq: 序號上界（不含）
+            limit: 最多載入的訊息數
+
+        Returns:
+            由舊到新的 (序號, 角色, 內容) 列表
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """
+        刪除 session 的對話紀錄
+
+        Args:
+            session_id: 會話 ID
+        """
+
+    def flush(self) -> None:
+        """將尚未寫入的訊息寫入儲存（預設實作為立即寫入，不需要 flush）"""
+
+    def close(self) -> None:
+        """關閉儲存"""
+
+
+class SQLiteMemoryStore(BaseMemoryStore):
+    """
+    以 SQLite 儲存的 append-only 對話紀錄
+
+    訊息先放入寫入緩衝區，累積 batch_size 則或經過 flush_interval 秒後以單一交易寫入；
+    讀取前會先寫入緩衝區，確保讀到自己寫入的訊息。序號由資料庫自動遞增產生，多個程序寫入同一個
+    檔案時不會衝突。每則訊息寫入時記錄估計的 token 數，載入尾端訊息時只需由新到舊讀取到 token
+    上限為止。
+    """
+
+    def __init__(self, path: str, batch_size: int = 32, flush_interval: float = 1.0):
+        """
+        初始化 SQLiteMemoryStore
+
+        Args:
+            path: SQLite 資料庫檔案路徑
+            batch_size: 緩衝區累積多少則訊息時寫入
+            flush_interval: 緩衝區中的訊息最長等待寫入時間（秒）
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, str, str, int, float]] = []
+        self._timer: Optional[threading.Timer] = None
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_log ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_log_session ON chat_log (session_id, seq)"
+        )
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """附加一則訊息（寫入緩衝區）"""
+        with self._lock:
+            self._pending.append(
+                (session_id, role, content, estimate_tokens(content), time.time())
+            )
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_locked(self) -> None:
+        """以單一交易寫入緩衝區（呼叫端需持有 self._lock）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        self._conn.executemany(
+            "INSERT INTO chat_log (session_id, role, content, tokens, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._conn.commit()
+
+    def flush(self) -> None:
+        """寫入緩衝區中的訊息"""
+        with self._lock:
+            self._flush_locked()
+
+    def load_tail(
+        self,
+        session_id: str,
+        token_limit: Optional[int] = None,
+        max_messages: Optional[int] = None,
+    ) -> List[StoredMessage]:
+        """載入 session 最新、總 token 數不超過 token_limit 的訊息"""
+        messages: List[StoredMessage] = []
+        total = 0
+        with self._lock:
+            self._flush_locked()
+            cursor = self._conn.execute(
+                "SELECT seq, role, content, tokens FROM chat_log "
+                "WHERE session_id = ? ORDER BY seq DESC",
+                (session_id,),
+            )
+            # 由新到舊分批讀取，超過上限即停止，不讀取整個紀錄
+            full = False
+            while not full:
+                rows = cursor.fetchmany(64)
+                if not rows:
+                    break
+                for seq, role, content, tokens in rows:
+                    full = (token_limit is not None and total + tokens > token_limit) or (
+                        max_messages is not None and len(messages) >= max_messages
+                    )
+                    if full:
+                        break
+                    total += tokens
+                    messages.append((seq, role, content))
+            cursor.close()
+        messages.reverse()
+        return messages
+
+    def load_before(self, session_id: str, before_seq: int, limit: int) -> List[StoredMessage]:
+        """載入序號小於 before_seq 的較舊訊息"""
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM chat_log "
+                "WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (session_id, before_seq, limit),
+            ).fetchall()
+        rows.reverse()
+        return [(seq, role, content) for seq, role, content in rows]
+
+    def delete(self, session_id: str) -> None:
+        """刪除 session 的對話紀錄"""
+        with self._lock:
+            self._flush_locked()
+            self._conn.execute("DELETE FROM chat_log WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        """寫入緩衝區並關閉資料庫連線"""
+        atexit.unregister(self.flush)
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+
+_stores: Dict[str, SQLiteMemoryStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_memory_store(path: str) -> SQLiteMemoryStore:
+    """
+    取得（必要時建立）程序共用的 SQLiteMemoryStore，讓同一個檔案只有一個連線與寫入緩衝區
+
+    Args:
+        path: SQLite 資料庫檔案路徑
+
+    Returns:
+        SQLiteMemoryStore 實例
+    """
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = SQLiteMemoryStore(path)
+            _stores[path] = store
+        return store
@@ -0,0 +1,184 @@
+"""以快取 token 數與前綴和實作的對話記憶 buffer"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
+from llama_index.core.memory.types import BaseMemory
+
+from ..ratelimit import estimate_tokens
+
+# 與 LlamaIndex ChatMemoryBuffer 相同的預設值
+DEFAULT_TOKEN_LIMIT = 3000
+DEFAULT_TOKEN_LIMIT_RATIO = 0.75
+
+TokenCounter = Callable[[str], int]
+
+
+def exact_token_counter() -> TokenCounter:
+    """
+    建立以 tiktoken（LlamaIndex 全域 tokenizer）精確計算 token 數的函數
+
+    Returns:
+        接受文字並返回 token 數的函數
+    """
+    from llama_index.core.utils import get_tokenizer
+
+    encode = get_tokenizer()
+    return lambda text: len(encode(text)) if text else 0
+
+
+def get_token_counter(name: str = "exact") -> TokenCounter:
+    """
+    依名稱取得 token 計數函數
+
+    Args:
+        name: "exact"（tiktoken，精確）或 "approximate"（依字元數估計，不需要編碼）
+
+    Returns:
+        接受文字並返回 token 數的函數
+    """
+    if name == "exact":
+        return exact_token_counter()
+    if name == "approximate":
+        return estimate_tokens
+    raise ValueError(f"未知的 memory tokenizer: {name}（可用值：exact, approximate）")
+
+
+def _content_text(message: ChatMessage) -> str:
+    """取得訊息內容文字"""
+    return "" if message.content is None else str(message.content)
+
+
+class TokenCountedMemory(BaseMemory):
+    """
+    記錄每則訊息 token 數的對話記憶 buffer，可直接取代 ChatMemoryBuffer 供 ReActAgent 使用
+
+    每則訊息只在放入時計算一次 token 數，並維護 token 數的前綴和：依 token_limit 截取尾端訊息時
+    以二分搜尋找出起點（O(log n)），不需每次重新編碼整段歷史；訊息數與總 token 數為 O(1)。
+    以 set 覆寫歷史時（例如 ReActAgent 完成任務後寫回），沿用仍在歷史中的訊息物件已計算的
+    token 數。
+    """
+
+    token_limit: int = Field(default=DEFAULT_TOKEN_LIMIT, gt=0)
+    tokenizer_fn: TokenCounter = Field(default=estimate_tokens, exclude=True)
+
+    _messages: List[ChatMessage] = PrivateAttr(default_factory=list)
+    _tokens: List[int] = PrivateAttr(default_factory=list)
+    # _prefix[i] 為前 i 則訊息的 token 總數，長度為訊息數 + 1
+    _prefix: List[int] = PrivateAttr(default_factory=lambda: [0])
+
+    @classmethod
+    def class_name(cls) -> str:
+        """取得類別名稱"""
+        return "TokenCountedMemory"
+
+    @classmethod
+    def from_defaults(
+        cls,
+        chat_history: Optional[List[ChatMessage]] = None,
+        llm: Optional[LLM] = None,
+        token_limit: Optional[int] = None,
+        tokenizer_fn: Optional[TokenCounter] = None,
+    ) -> "TokenCountedMemory":
+        """
+        建立 TokenCountedMemory
+
+        Args:
+            chat_history: 初始對話歷史（可選）
+            llm: 用於推算 token 限制的 LLM（可選，取 context window 的 75%）
+            token_limit: Token 限制（未設定且沒有 llm 時為 3000）
+            tokenizer_fn: token 計數函數（預設為精確的 tiktoken 計數）
+
+        Returns:
+            TokenCountedMemory 實例
+        """
+        if token_limit is None:
+            if llm is not None:
+                token_limit = int(llm.metadata.context_window * DEFAULT_TOKEN_LIMIT_RATIO)
+            else:
+                token_limit = DEFAULT_TOKEN_LIMIT
+        memory = cls(token_limit=token_limit, tokenizer_fn=tokenizer_fn or exact_token_counter())
+        if chat_history:
+            memory.set(chat_history)
+        return memory
+
+    @property
+    def message_count(self) -> int:
+        """訊息數量（不定義 __len__，避免空記憶被 ReActAgent 的 `memory or ...` 視為未提供）"""
+        return len(self._messages)
+
+    @property
+    def token_count(self) -> int:
+        """所有訊息的 token 總數"""
+        return self._prefix[-1]
+
+    def window_start(self, initial_token_count: int = 0) -> int:
+        """
+        計算符合 token 限制的尾端訊息起點
+
+        與 ChatMemoryBuffer 相同，保留的訊息不會以 assistant 或 tool 訊息開頭；
+        最新一則訊息本身就超過限制時不保留任何訊息。
+
+        Args:
+            initial_token_count: 已被其他內容佔用的 token 數
+
+        Returns:
+            第一則保留訊息的索引（等於訊息數表示不保留任何訊息）
+        """
+        if initial_token_count > self.token_limit:
+            raise ValueError("Initial token count exceeds token limit")
+        count = len(self._messages)
+        # 找出最小的 start，使 _prefix[count] - _prefix[start] + initial <= token_limit
+        excess = self._prefix[count] + initial_token_count - self.token_limit
+        start = bisect_left(self._prefix, excess)
+        while start < count and self._messages[start].role in (
+            MessageRole.ASSISTANT,
+            MessageRole.TOOL,
+        ):
+            start += 1
+        return start
+
+    def get(
+        self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs: Any
+    ) -> List[ChatMessage]:
+        """取得符合 token 限制的尾端訊息"""
+        return self._messages[self.window_start(initial_token_count) :]
+
+    def get_all(self) -> List[ChatMessage]:
+        """取得所有訊息"""
+        return list(self._messages)
+
+    def put(self, message: ChatMessage) -> None:
+        """附加一則訊息並計算其 token 數"""
+        tokens = self.tokenizer_fn(_content_text(message))
+        self._messages.append(message)
+        self._tokens.append(tokens)
+        self._prefix.append(self._prefix[-1] + tokens)
+
+    def set(self, messages: List[ChatMessage]) -> None:
+        """覆寫所有訊息，已在歷史中的訊息物件不重新計算 token 數"""
+        known: Dict[int, int] = {
+            id(message): tokens for message, tokens in zip(self._messages, self._tokens)
+        }
+        previous = self._messages
+        self._messages = []
+        self._tokens = []
+        self._prefix = [0]
+        for message in messages:
+            tokens = known.get(id(message))
+            if tokens is None:
+                tokens = self.tokenizer_fn(_content_text(message))
+            self._messages.append(message)
+            self._tokens.append(tokens)
+            self._prefix.append(self._prefix[-1] + tokens)
+        # previous 保持舊訊息存活到比對完成，確保 id 不會被重複使用
+        del previous
+
+    def reset(self) -> None:
+        """清除所有訊息"""
+        self._messages = []
+        self._tokens = []
+        self._prefix = [0]
+
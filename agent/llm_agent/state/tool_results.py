@@ -0,0 +1,280 @@
+"""有上限的工具執行結果儲存模組"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+
+class ToolResultRecord:
+    """單筆工具執行結果（以 slots 儲存，時間為 epoch 秒，轉為字典時才格式化）"""
+
+    __slots__ = (
+        "seq",
+        "tool_name",
+        "result",
+        "success",
+        "error",
+        "duration_ms",
+        "cached",
+        "saved_ms",
+        "created_at",
+        "evicted",
+    )
+
+    def __init__(
+        self,
+        seq: int,
+        tool_name: str,
+        result: Any,
+        success: bool,
+        error: Optional[str],
+        duration_ms: Optional[float],
+        cached: bool,
+        saved_ms: Optional[float],
+        created_at: float,
+    ):
+        self.seq = seq
+        self.tool_name = tool_name
+        self.result = result
+        self.success = success
+        self.error = error
+        self.duration_ms = duration_ms
+        self.cached = cached
+        self.saved_ms = saved_ms
+        self.created_at = created_at
+        # 因超過單一工具上限而被淘汰（仍可能暫留在全域佇列中，讀取時略過）
+        self.evicted = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        轉換為字典
+
+        Returns:
+            包含 seq、tool_name、result、success、error、duration_ms、cached、saved_ms
+            與 ISO 格式 timestamp 的字典
+        """
+        return {
+            "seq": self.seq,
+            "tool_name": self.tool_name,
+            "result": self.result,
+            "success": self.success,
+            "error": self.error,
+            "duration_ms": self.duration_ms,
+            "cached": self.cached,
+            "saved_ms": self.saved_ms,
+            "timestamp": datetime.fromtimestamp(self.created_at).isoformat(),
+        }
+
+
+class ToolResultStore:
+    """
+    環狀緩衝區形式的工具結果儲存
+
+    全部結果與單一工具的結果各有上限，超過時淘汰最舊的結果。每筆結果有遞增的序號，
+    依工具名稱建立索引，可以只取得某個序號或時間之後的結果，不需要掃描整個歷史。
+    """
+
+    def __init__(self, max_results: Optional[int] = 1000, max_per_tool: Optional[int] = None):
+        """
+        初始化 ToolResultStore
+
+        Args:
+            max_results: 每個 session 保留的結果數上限（None 表示不限制）
+            max_per_tool: 每個工具保留的結果數上限（None 表示只受 max_results 限制）
+        """
+        self.max_results = max_results
+        self.max_per_tool = max_per_tool
+        self._records: Deque[ToolResultRecord] = deque()
+        self._by_tool: Dict[str, Deque[ToolResultRecord]] = {}
+        self._size = 0
+        self._next_seq = 1
+        # 累計統計（不受淘汰影響）
+        self._counters: Dict[str, Any] = {"calls": 0, "cache_hits": 0, "saved_ms": 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        """最新一筆結果的序號（尚無結果時為 0）"""
+        return self._next_seq - 1
+
+    def append(
+        self,
+        tool_name: str,
+        result: Any,
+        success: bool = True,
+        error: Optional[str] = None,
+        duration_ms: Optional[float] = None,
+        cached: bool = False,
+        saved_ms: Optional[float] = None,
+    ) -> ToolResultRecord:
+        """
+        新增一筆結果，超過上限時淘汰最舊的結果
+
+        Args:
+            tool_name: 工具名稱
+            result: 執行結果
+            success: 是否執行成功
+            error: 錯誤訊息（如果執行失敗）
+            duration_ms: 執行時間（毫秒，可選）
+            cached: 結果是否來自工具結果快取
+            saved_ms: 快取命中時省下的執行時間（毫秒，可選）
+
+        Returns:
+            新增的 ToolResultRecord
+        """
+        with self._lock:
+            return self._append_locked(
+                tool_name, result, success, error, duration_ms, cached, saved_ms
+            )
+
+    def _append_locked(
+        self,
+        tool_name: str,
+        result: Any,
+        success: bool,
+        error: Optional[str],
+        duration_ms: Optional[float],
+        cached: bool,
+        saved_ms: Optional[float],
+    ) -> ToolResultRecord:
+        """新增一筆結果（呼叫端需持有 self._lock）"""
+        record = ToolResultRecord(
+            self._next_seq,
+            tool_name,
+            result,
+            success,
+            error,
+            duration_ms,
+            cached,
+            saved_ms,
+            time.time(),
+        )
+        self._next_seq += 1
+        self._counters["calls"] += 1
+        if cached:
+            self._counters["cache_hits"] += 1
+            self._counters["saved_ms"] += saved_ms or 0.0
+        self._records.append(record)
+        self._size += 1
+
+        per_tool = self._by_tool.setdefault(tool_name, deque())
+        per_tool.append(record)
+        if self.max_per_tool is not None and len(per_tool) > self.max_per_tool:
+            oldest = per_tool.popleft()
+            oldest.evicted = True
+            self._size -= 1
+
+        while self.max_results is not None and self._size > self.max_results:
+            oldest = self._records.popleft()
+            if oldest.evicted:
+                continue
+            # 全域最舊的結果也是該工具最舊的結果
+            per_tool = self._by_tool[oldest.tool_name]
+            per_tool.popleft()
+            if not per_tool:
+                del self._by_tool[oldest.tool_name]
+            self._size -= 1
+
+        # 被單一工具上限淘汰的結果累積過多時壓縮全域佇列，維持記憶體上限
+        if len(self._records) > 2 * max(self._size, 1) and len(self._records) > 64:
+            self._records = deque(r for r in self._records if not r.evicted)
+        return record
+
+    def _select(
+        self,
+        tool_name: Optional[str],
+        stop: Callable[[ToolResultRecord], bool],
+        limit: Optional[int],
+    ) -> List[ToolResultRecord]:
+        """由新到舊掃描全域或單一工具的結果，直到 stop 成立或達到 limit，返回由舊到新的列表"""
+        selected: List[ToolResultRecord] = []
+        with self._lock:
+            source = self._by_tool.get(tool_name, ()) if tool_name else self._records
+            for record in reversed(source):
+                if stop(record) or (limit is not None and len(selected) >= limit):
+                    break
+                if not record.evicted:
+                    selected.append(record)
+        selected.reverse()
+        return selected
+
+    def records(
+        self, tool_name: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[ToolResultRecord]:
+        """
+        取得結果（由舊到新）
+
+        Args:
+            tool_name: 可選的工具名稱過濾
+            limit: 只取得最新的幾筆（None 表示全部）
+
+        Returns:
+            ToolResultRecord 列表
+        """
+        return self._select(tool_name, lambda record: False, limit)
+
+    def since(self, seq: int, tool_name: Optional[str] = None) -> List[ToolResultRecord]:
+        """
+        取得序號大於 seq 的結果（由舊到新），只掃描較新的部分
+
+        Args:
+            seq: 上次讀取到的序號
+            tool_name: 可選的工具名稱過濾
+
+        Returns:
+            ToolResultRecord 列表
+        """
+        return self._select(tool_name, lambda record: record.seq <= seq, None)
+
+    def since_time(
+        self, timestamp: float, tool_name: Optional[str] = None
+    ) -> List[ToolResultRecord]:
+        """
+        取得指定時間之後的結果（由舊到新）
+
+        Args:
+            timestamp: epoch 秒
+            tool_name: 可選的工具名稱過濾
+
+        Returns:
+            ToolResultRecord 列表
+        """
+        return self._select(tool_name, lambda record: record.created_at <= timestamp, None)
+
+    def tool_names(self) -> List[str]:
+        """
+        取得目前有結果的工具名稱
+
+        Returns:
+            工具名稱列表
+        """
+        with self._lock:
+            return list(self._by_tool)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得累計統計
+
+        Returns:
+            包含 size、last_seq、calls、cache_hits 與 saved_ms（快取省下的總執行時間）的字典
+        """
+        with self._lock:
+            return {"size": self._size, "last_seq": self.last_seq, **self._counters}
+
+    def clear(self) -> None:
+        """清除所有結果與統計（序號不重置，讓增量讀取的呼叫端不會漏讀）"""
+        with self._lock:
+            self._records.clear()
+            self._by_tool.clear()
+            self._size = 0
+            self._counters = {"calls": 0, "cache_hits": 0, "saved_ms": 0.0}
+
+    def __len__(self) -> int:
+        """取得保留中的結果數量"""
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """依序產生結果字典（由舊到新）"""
+        return (record.to_dict() for record in self.records())
@@ -0,0 +1,331 @@
+"""串流結構化輸出解析模組：在 LLM 逐段產生文字時擷取完整的 JSON 與程式碼區塊"""
+
+import json
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE = "```"
+
+
+class StructuredItem:
+    """擷取到的結構化內容（JSON 值或 fenced 程式碼區塊）"""
+
+    __slots__ = ("kind", "value", "raw", "language", "start", "end")
+
+    def __init__(
+        self,
+        kind: str,
+        value: Any,
+        raw: str,
+        start: int,
+        end: int,
+        language: Optional[str] = None,
+    ):
+        """
+        初始化 StructuredItem
+
+        Args:
+            kind: "json" 或 "code"
+            value: 解析後的 JSON 值，或去除前後空白的程式碼
+            raw: 原始文字
+            start: 在整段輸出中的起始位置（字元索引）
+            end: 在整段輸出中的結束位置（不含）
+            language: 程式碼區塊的語言標記（kind 為 "code" 時）
+        """
+        self.kind = kind
+        self.value = value
+        self.raw = raw
+        self.start = start
+        self.end = end
+        self.language = language
+
+    def __repr__(self) -> str:
+        return f"StructuredItem(kind={self.kind!r}, start={self.start}, end={self.end})"
+
+
+class StructuredStreamParser:
+    """
+    可增量餵入的 JSON / 程式碼區塊解析器
+
+    以括號堆疊（會略過字串內容與跳脫字元）追蹤 JSON 物件與陣列，最外層括號閉合時立即以
+    json.loads 驗證並產生結果；候選區段括號不成對或無法解析時，從其起始位置的下一個字元重新掃描，
+    因此文字中的 [註解] 或引號內的括號不會遮蔽後面的 JSON。以行首的 ``` 標記追蹤 fenced 程式碼
+    區塊，結束標記出現時立即產生結果。只保留尚未閉合的內容，不需要保存整段輸出。達到 max_items 或
+    until 成立後 done 為 True，呼叫端可以停止產生。
+
+    輸入結束時呼叫 close()：仍未閉合的候選區段（例如沒有閉合的 [）會被放棄並重新掃描其中的內容，
+    位於其中的 JSON 值在此時才會產生。
+    """
+
+    def __init__(
+        self,
+        json_values: bool = True,
+        code_blocks: bool = True,
+        language: Optional[str] = None,
+        max_items: Optional[int] = None,
+        until: Optional[Callable[[StructuredItem], bool]] = None,
+    ):
+        """
+        初始化 StructuredStreamParser
+
+        Args:
+            json_values: 是否擷取 JSON 物件與陣列
+            code_blocks: 是否擷取 fenced 程式碼區塊
+            language: 只擷取指定語言標記的程式碼區塊（None 表示不限制）
+            max_items: 擷取到幾個結果後完成（None 表示不限制）
+            until: 對每個結果呼叫，返回 True 時完成
+        """
+        self.json_values = json_values
+        self.code_blocks = code_blocks
+        self.language = language
+        self.max_items = max_items
+        self.until = until
+        self.items: List[StructuredItem] = []
+        self.done = False
+        self._pos = 0
+        # JSON 掃描狀態
+        self._stack: List[str] = []
+        self._json_chars: List[str] = []
+        self._json_start = 0
+        self._in_string = False
+        self._escaped = False
+        # 程式碼區塊掃描狀態：text（區塊外）、info（讀取語言標記）、code（區塊內）
+        self._fence_state = "text"
+        self._ticks = 0
+        self._ticks_at_line_start = False
+        self._line_blank = True
+        self._info_chars: List[str] = []
+        self._code_chars: List[str] = []
+        self._code_start = 0
+
+    def feed(self, chunk: str) -> List[StructuredItem]:
+        """
+        餵入一段新產生的文字
+
+        Args:
+            chunk: 文字片段
+
+        Returns:
+            本次片段中閉合的結果（完成後不再產生新結果）
+        """
+        produced: List[StructuredItem] = []
+        for char in chunk:
+            if self.done:
+                break
+            if self.json_values:
+                self._feed_json(deque([(char, self._pos)]), produced)
+            if self.code_blocks and not self.done:
+                self._scan_fence(char, produced)
+            self._pos += 1
+        return produced
+
+    def close(self) -> List[StructuredItem]:
+        """
+        輸入結束：放棄仍未閉合的 JSON 候選區段並重新掃描其中的內容
+
+        Returns:
+            重新掃描時閉合的結果
+        """
+        produced: List[StructuredItem] = []
+        while self._stack and not self.done:
+            self._feed_json(self._abandon_json(), produced)
+        return produced
+
+    def _feed_json(self, pending: Deque[Tuple[str, int]], produced: List[StructuredItem]) -> None:
+        """依序掃描 (字元, 位置)；候選區段失敗時將其內容放回佇列前端重新掃描"""
+        while pending and not self.done:
+            char, pos = pending.popleft()
+            if not self._scan_json(char, pos, produced):
+                pending.extendleft(reversed(self._abandon_json()))
+
+    def _scan_json(self, char: str, pos: int, produced: List[StructuredItem]) -> bool:
+        """
+        以括號堆疊追蹤 JSON 值
+
+        Returns:
+            目前的候選區段是否仍然有效（False 表示需要從下一個字元重新掃描）
+        """
+        if not self._stack:
+            if char in _CLOSERS:
+                self._stack.append(_CLOSERS[char])
+                self._json_chars = [char]
+                self._json_start = pos
+            return True
+
+        self._json_chars.append(char)
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+            return True
+        if char == '"':
+            self._in_string = True
+        elif char in _CLOSERS:
+            self._stack.append(_CLOSERS[char])
+        elif char in "}]":
+            if char != self._stack[-1]:
+                # 括號不成對，不是 JSON
+                return False
+            self._stack.pop()
+            if not self._stack:
+                raw = "".join(self._json_chars)
+                try:
+                    value = json.loads(raw)
+                except json.JSONDecodeError:
+                    return False
+                self._reset_json()
+                self._emit(StructuredItem("json", value, raw, self._json_start, pos + 1), produced)
+        return True
+
+    def _abandon_json(self) -> Deque[Tuple[str, int]]:
+        """放棄目前的 JSON 候選區段，返回起始括號之後需要重新掃描的 (字元, 位置)"""
+        start = self._json_start + 1
+        replay = deque(zip(self._json_chars[1:], range(start, start + len(self._json_chars))))
+        self._reset_json()
+        return replay
+
+    def _reset_json(self) -> None:
+        """清除 JSON 候選區段"""
+        self._stack = []
+        self._json_chars = []
+        self._in_string = False
+        self._escaped = False
+
+    def _scan_fence(self, char: str, produced: List[StructuredItem]) -> None:
+        """以行首的 ``` 標記追蹤 fenced 程式碼區塊"""
+        if char == "`":
+            if self._fence_state == "info":
+                # 語言標記不能包含反引號（例如行首的 ```x```），不是程式碼區塊
+                self._fence_state = "text"
+                return
+            if self._ticks == 0:
+                self._ticks_at_line_start = self._line_blank
+            self._ticks += 1
+            self._line_blank = False
+            if self._ticks < len(_FENCE):
+                return
+            self._ticks = 0
+            if not self._ticks_at_line_start:
+                # 行內的 ``` 不是區塊標記
+                if self._fence_state == "code":
+                    self._code_chars.append(_FENCE)
+                return
+            if self._fence_state == "text":
+                self._fence_state = "info"
+                self._info_chars = []
+            else:
+                self._close_code(produced)
+            return
+
+        pending, self._ticks = self._ticks, 0
+        if self._fence_state == "info":
+            if char == "\n":
+                self._fence_state = "code"
+                self._code_chars = []
+                self._code_start = self._pos + 1
+            else:
+                self._info_chars.append(char)
+        elif self._fence_state == "code":
+            self._code_chars.append("`" * pending)
+            self._code_chars.append(char)
+        if char == "\n":
+            self._line_blank = True
+        elif char not in " \t":
+            self._line_blank = False
+
+    def _close_code(self, produced: List[StructuredItem]) -> None:
+        """程式碼區塊結束"""
+        self._fence_state = "text"
+        info = "".join(self._info_chars).strip()
+        language = info.split()[0] if info else None
+        raw = "".join(self._code_chars)
+        self._code_chars = []
+        if self.language is not None and language != self.language:
+            return
+        end = self._pos + 1 - len(_FENCE)
+        self._emit(
+            StructuredItem("code", raw.strip(), raw, self._code_start, end, language), produced
+        )
+
+    def _emit(self, item: StructuredItem, produced: List[StructuredItem]) -> None:
+        """記錄結果並檢查是否完成"""
+        self.items.append(item)
+        produced.append(item)
+        if (self.max_items is not None and len(self.items) >= self.max_items) or (
+            self.until is not None and self.until(item)
+        ):
+            self.done = True
+
+
+def iter_structured(chunks: Iterable[str], **options: Any) -> Iterator[StructuredItem]:
+    """
+    從文字片段串流（例如 BaseAgent.stream_complete）依序產生閉合的結構化結果
+
+    完成條件成立時停止讀取並關閉來源串流，讓 LLM 不必繼續產生剩下的內容。
+
+    Args:
+        chunks: 文字片段的可迭代物件
+        **options: StructuredStreamParser 的參數（json_values、code_blocks、language、
+                   max_items、until）
+
+    Returns:
+        StructuredItem 迭代器
+    """
+    parser = StructuredStreamParser(**options)
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            yield from parser.feed(chunk)
+            if parser.done:
+                break
+        else:
+            yield from parser.close()
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+async def aiter_structured(
+    chunks: AsyncIterable[str], **options: Any
+) -> AsyncIterator[StructuredItem]:
+    """
+    iter_structured 的非同步版本（例如搭配 BaseAgent.astream_complete）
+
+    Args:
+        chunks: 文字片段的非同步可迭代物件
+        **options: StructuredStreamParser 的參數
+
+    Returns:
+        StructuredItem 非同步迭代器
+    """
+    parser = StructuredStreamParser(**options)
+    iterator = chunks.__aiter__()
+    try:
+        async for chunk in iterator:
+            for item in parser.feed(chunk):
+                yield item
+            if parser.done:
+                break
+        else:
+            for item in parser.close():
+                yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
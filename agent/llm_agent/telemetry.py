@@ -0,0 +1,529 @@
+"""LLM 呼叫效能遙測模組：每次呼叫的延遲分解、token 數與 Prometheus 指標輸出"""
+
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ratelimit import estimate_tokens
+from .utils import get_field
+
+# 延遲直方圖的 bucket 上限（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# 生成速度直方圖的 bucket 上限（tokens/s）
+THROUGHPUT_BUCKETS: Tuple[float, ...] = (1, 5, 10, 20, 40, 60, 80, 120, 200, 400)
+
+
+def extract_token_usage(raw: Any) -> Optional[Tuple[int, int]]:
+    """
+    從 provider 原始回應解析 prompt 與 completion token 數
+
+    支援 OpenAI（usage.prompt_tokens / completion_tokens）、Anthropic（usage.input_tokens，
+    含讀取與寫入快取的 token / output_tokens）與 Ollama（prompt_eval_count / eval_count）格式。
+
+    Args:
+        raw: LlamaIndex 回應的 raw 欄位
+
+    Returns:
+        (prompt token 數, completion token 數)，沒有用量資訊時為 None
+    """
+    usage = get_field(raw, "usage")
+    if usage is not None:
+        if get_field(usage, "input_tokens") is not None:
+            prompt = (
+                get_field(usage, "input_tokens")
+                + (get_field(usage, "cache_read_input_tokens") or 0)
+                + (get_field(usage, "cache_creation_input_tokens") or 0)
+            )
+            return prompt, get_field(usage, "output_tokens") or 0
+        if get_field(usage, "prompt_tokens") is not None:
+            return get_field(usage, "prompt_tokens"), get_field(usage, "completion_tokens") or 0
+    if get_field(raw, "eval_count") is not None:
+        return get_field(raw, "prompt_eval_count") or 0, get_field(raw, "eval_count")
+    return None
+
+
+class CallTelemetry:
+    """
+    單次 Agent 呼叫的效能量測
+
+    記錄 prompt 組裝時間、排隊等待（速率與並行額度）、第一個 token 的時間（串流呼叫）、
+    總延遲、prompt / completion token 數（provider 未回報時以估計值代替）與生成速度。
+    Agent 模式下每個 ReAct 步驟的 LLM 呼叫會累加到同一筆量測。
+    """
+
+    __slots__ = (
+        "operation",
+        "provider",
+        "model",
+        "prompt_build_ms",
+        "queue_wait_ms",
+        "ttft_ms",
+        "llm_calls",
+        "_start",
+        "_prompt_tokens",
+        "_completion_tokens",
+        "_estimated_prompt",
+        "_reported",
+        "_estimated",
+        "_step_start",
+        "_step_ms",
+        "_coalesced",
+    )
+
+    def __init__(self, operation: str, provider: str, model: str):
+        """
+        初始化 CallTelemetry
+
+        Args:
+            operation: 呼叫類型（chat、achat、complete、acomplete、stream_chat 等）
+            provider: Provider 名稱（實際回應的 provider 會在呼叫後更新）
+            model: 模型名稱
+        """
+        self.operation = operation
+        self.provider = provider
+        self.model = model
+        self.prompt_build_ms = 0.0
+        self.queue_wait_ms = 0.0
+        self.ttft_ms: Optional[float] = None
+        self.llm_calls = 0
+        self._start = time.perf_counter()
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+        self._estimated_prompt = 0
+        self._reported = False
+        self._estimated = False
+        self._step_start: Optional[float] = None
+        self._step_ms = 0.0
+        self._coalesced = False
+
+    def add_prompt_build(self, seconds: float) -> None:
+        """累加 prompt 組裝時間"""
+        self.prompt_build_ms += seconds * 1000
+
+    def add_queue_wait(self, seconds: float) -> None:
+        """累加等待速率額度與並行額度的時間"""
+        self.queue_wait_ms += seconds * 1000
+
+    def set_provider(self, provider: str, model: str) -> None:
+        """記錄實際回應的 provider（備援或 hedge 的次要 provider 勝出時）"""
+        self.provider = provider
+        self.model = model
+
+    def first_token(self) -> None:
+        """記錄第一個 token 的時間（只記錄第一次）"""
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self._start) * 1000
+
+    def estimate_prompt(self, tokens: int) -> None:
+        """記錄估計的 prompt token 數（provider 未回報用量時使用）"""
+        self._estimated_prompt = tokens
+
+    def record_usage(self, raw: Any) -> bool:
+        """
+        記錄 provider 回報的 token 用量（單次 LLM 呼叫）
+
+        Args:
+            raw: LlamaIndex 回應的 raw 欄位（或 Ollama 的回應字典）
+
+        Returns:
+            是否解析到用量資訊
+        """
+        usage = extract_token_usage(raw)
+        if usage is None:
+            return False
+        self._prompt_tokens, self._completion_tokens = usage
+        self._reported = True
+        self.llm_calls = max(self.llm_calls, 1)
+        return True
+
+    def adopt(self, leader: "CallTelemetry") -> None:
+        """
+        採用合併請求中 leader 呼叫的 provider 與 token 用量（本次呼叫沒有送出 provider 請求）
+
+        Args:
+            leader: 實際送出請求的 leader 呼叫的 CallTelemetry
+        """
+        self.provider = leader.provider
+        self.model = leader.model
+        self._prompt_tokens = leader._prompt_tokens
+        self._completion_tokens = leader._completion_tokens
+        self._estimated_prompt = leader._estimated_prompt
+        self._reported = leader._reported
+        self._estimated = leader._estimated
+        self._coalesced = True
+
+    def step_started(self) -> None:
+        """ReAct 步驟的 LLM 呼叫開始"""
+        self._step_start = time.perf_counter()
+
+    def step_finished(self, raw: Any, prompt_text: str, completion_text: str) -> None:
+        """
+        ReAct 步驟的 LLM 呼叫結束，累加用量（provider 未回報時以文字估計）
+
+        Args:
+            raw: LlamaIndex 回應的 raw 欄位
+            prompt_text: 送出的訊息文字
+            completion_text: 回應文字
+        """
+        if self._step_start is not None:
+            self._step_ms += (time.perf_counter() - self._step_start) * 1000
+            self._step_start = None
+        self.llm_calls += 1
+        usage = extract_token_usage(raw)
+        if usage is None:
+            usage = (estimate_tokens(prompt_text), estimate_tokens(completion_text))
+            self._estimated = True
+        else:
+            self._reported = True
+        self._prompt_tokens += usage[0]
+        self._completion_tokens += usage[1]
+
+    def finish(self, completion_text: str, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """
+        結束量測並整理結果
+
+        Args:
+            completion_text: 最終回應文字（provider 未回報用量時用於估計 completion token 數）
+            error: 呼叫失敗時的例外
+
+        Returns:
+            包含各階段耗時、token 數與生成速度的字典
+        """
+        latency_ms = (time.perf_counter() - self._start) * 1000
+        prompt_tokens, completion_tokens = self._prompt_tokens, self._completion_tokens
+        estimated = self._estimated
+        if not self._reported and not self._estimated:
+            prompt_tokens = self._estimated_prompt
+            completion_tokens = estimate_tokens(completion_text)
+            estimated = True
+
+        # 生成時間：ReAct 步驟取各步驟 LLM 時間總和；串流取第一個 token 之後的時間
+        if self._step_ms:
+            generation_ms = self._step_ms
+        elif self.ttft_ms is not None:
+            generation_ms = latency_ms - self.ttft_ms
+        else:
+            generation_ms = latency_ms - self.prompt_build_ms - self.queue_wait_ms
+        tokens_per_second = (
+            completion_tokens / (generation_ms / 1000)
+            if generation_ms > 0 and error is None
+            else None
+        )
+
+        return {
+            "operation": self.operation,
+            "provider": self.provider,
+            "model": self.model,
+            "status": "error" if error is not None else "ok",
+            "prompt_build_ms": round(self.prompt_build_ms, 3),
+            "queue_wait_ms": round(self.queue_wait_ms, 3),
+            "ttft_ms": round(self.ttft_ms, 3) if self.ttft_ms is not None else None,
+            "latency_ms": round(latency_ms, 3),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "token_source": "estimate" if estimated else "provider",
+            "tokens_per_second": (
+                round(tokens_per_second, 2) if tokens_per_second is not None else None
+            ),
+            "llm_calls": (
+                0 if self._coalesced else self.llm_calls or (0 if error is not None else 1)
+            ),
+            "coalesced": self._coalesced,
+        }
+
+
+# Agent 模式下目前正在進行的呼叫（供 ReAct 步驟的 LLM 事件累加用量）
+_current_call: ContextVar[Optional[CallTelemetry]] = ContextVar(
+    "llm_agent_current_call", default=None
+)
+
+
+def set_current_call(telemetry: Optional[CallTelemetry]) -> Any:
+    """
+    設定目前的呼叫量測（ReAct 步驟的 LLM 事件會記錄到這筆量測）
+
+    Args:
+        telemetry: CallTelemetry 或 None
+
+    Returns:
+        用於 reset_current_call 的 token
+    """
+    return _current_call.set(telemetry)
+
+
+def reset_current_call(token: Any) -> None:
+    """還原 set_current_call 之前的呼叫量測"""
+    _current_call.reset(token)
+
+
+_handler_lock = threading.Lock()
+_handler_installed = False
+
+
+def install_llm_event_handler() -> None:
+    """
+    註冊 LlamaIndex instrumentation 事件處理器（程序內只註冊一次）
+
+    ReActAgent 每個推理步驟都會呼叫 LLM；處理器將 LLMChatStart / LLMChatEnd 事件累加到
+    目前 context 中的 CallTelemetry，沒有進行中的量測時不做任何事。
+    """
+    global _handler_installed
+    with _handler_lock:
+        if _handler_installed:
+            return
+        from llama_index.core.instrumentation import get_dispatcher
+        from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+        from llama_index.core.instrumentation.events.llm import (
+            LLMChatEndEvent,
+            LLMChatStartEvent,
+        )
+
+        class _StepEventHandler(BaseEventHandler):
+            @classmethod
+            def class_name(cls) -> str:
+                return "LLMAgentStepEventHandler"
+
+            def handle(self, event: Any, **kwargs: Any) -> None:
+                telemetry = _current_call.get()
+                if telemetry is None:
+                    return
+                if isinstance(event, LLMChatStartEvent):
+                    telemetry.step_started()
+                elif isinstance(event, LLMChatEndEvent):
+                    response = event.response
+                    telemetry.step_finished(
+                        response.raw if response is not None else None,
+                        "\n".join(message.content or "" for message in event.messages),
+                        (response.message.content or "") if response is not None else "",
+                    )
+
+        get_dispatcher().add_event_handler(_StepEventHandler())
+        _handler_installed = True
+
+
+class MetricsSink:
+    """指標輸出介面：接收每次呼叫的量測結果（預設不做任何事）"""
+
+    def record(self, telemetry: Dict[str, Any]) -> None:
+        """
+        記錄一次呼叫的量測結果
+
+        Args:
+            telemetry: CallTelemetry.finish 返回的字典
+        """
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """格式化 Prometheus 標籤（跳脫反斜線、引號與換行）"""
+    parts = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    """格式化 Prometheus 數值"""
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class PrometheusMetricsSink(MetricsSink):
+    """
+    以 Prometheus text exposition 格式輸出的指標
+
+    依 provider、model 與 operation 分組：各階段耗時與生成速度為直方圖，
+    請求數（依 status）與 token 數為計數器。
+    """
+
+    # 量測欄位 -> (指標名稱, 說明, 單位換算, bucket)
+    HISTOGRAMS: Dict[str, Tuple[str, str, float, Tuple[float, ...]]] = {
+        "prompt_build_ms": (
+            "llm_agent_prompt_build_seconds",
+            "Time spent building the prompt.",
+            1000.0,
+            LATENCY_BUCKETS,
+        ),
+        "queue_wait_ms": (
+            "llm_agent_queue_wait_seconds",
+            "Time spent waiting for rate and concurrency slots.",
+            1000.0,
+            LATENCY_BUCKETS,
+        ),
+        "ttft_ms": (
+            "llm_agent_time_to_first_token_seconds",
+            "Time to first streamed token.",
+            1000.0,
+            LATENCY_BUCKETS,
+        ),
+        "latency_ms": (
+            "llm_agent_request_duration_seconds",
+            "Total call latency.",
+            1000.0,
+            LATENCY_BUCKETS,
+        ),
+        "tokens_per_second": (
+            "llm_agent_tokens_per_second",
+            "Completion tokens generated per second.",
+            1.0,
+            THROUGHPUT_BUCKETS,
+        ),
+    }
+    COUNTERS: Dict[str, Tuple[str, str]] = {
+        "prompt_tokens": ("llm_agent_prompt_tokens_total", "Prompt tokens sent to the LLM."),
+        "completion_tokens": (
+            "llm_agent_completion_tokens_total",
+            "Completion tokens generated by the LLM.",
+        ),
+    }
+    REQUESTS = ("llm_agent_requests_total", "LLM agent calls by status.")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (欄位, 標籤) -> [各 bucket 計數..., 總和, 次數]
+        self._histograms: Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+        self._counters: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+
+    def record(self, telemetry: Dict[str, Any]) -> None:
+        """
+        記錄一次呼叫的量測結果
+
+        Args:
+            telemetry: CallTelemetry.finish 返回的字典
+        """
+        labels = (telemetry["provider"], telemetry["model"], telemetry["operation"])
+        with self._lock:
+            for field, (_, _, scale, buckets) in self.HISTOGRAMS.items():
+                value = telemetry.get(field)
+                if value is None:
+                    continue
+                value = value / scale
+                series = self._histograms.setdefault((field, labels), [0.0] * (len(buckets) + 2))
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        series[index] += 1
+                series[-2] += value
+                series[-1] += 1
+            # 合併請求的 token 已由 leader 計入，不重複計算
+            for field in () if telemetry.get("coalesced") else self.COUNTERS:
+                key = (field, labels)
+                self._counters[key] = self._counters.get(key, 0) + (telemetry.get(field) or 0)
+            key = ("requests", (*labels, telemetry["status"]))
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def render(self) -> str:
+        """
+        輸出 Prometheus text exposition 格式（供 /metrics 端點使用）
+
+        Returns:
+            指標文字
+        """
+        with self._lock:
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines: List[str] = []
+        for field, (name, help_text, _, buckets) in self.HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (series_field, labels), series in sorted(histograms.items()):
+                if series_field != field:
+                    continue
+                base = dict(zip(("provider", "model", "operation"), labels))
+                # bucket 計數在記錄時已累積（value <= bound 的每個 bucket 都加一）
+                cumulative = (*series[: len(buckets)], series[-1])
+                for bound, count in zip((*buckets, math.inf), cumulative):
+                    bucket_labels = _format_labels({**base, "le": _format_value(bound)})
+                    lines.append(f"{name}_bucket{bucket_labels} {_format_value(count)}")
+                lines.append(f"{name}_sum{_format_labels(base)} {_format_value(series[-2])}")
+                lines.append(f"{name}_count{_format_labels(base)} {_format_value(series[-1])}")
+
+        for field, (name, help_text) in (*self.COUNTERS.items(), ("requests", self.REQUESTS)):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            label_names = ("provider", "model", "operation", "status")
+            for (series_field, labels), value in sorted(counters.items()):
+                if series_field == field:
+                    series_labels = _format_labels(dict(zip(label_names, labels)))
+                    lines.append(f"{name}{series_labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 相同請求合併指標名稱 -> (說明, 類型, kind 標籤 -> SingleFlight.stats() 欄位)
+COALESCING_METRICS: Dict[str, Tuple[str, str, Dict[str, str]]] = {
+    "llm_agent_coalesce_leaders_total": (
+        "Calls sent upstream by single-flight.",
+        "counter",
+        {"call": "leaders", "stream": "stream_leaders"},
+    ),
+    "llm_agent_coalesced_requests_total": (
+        "Calls that shared an in-flight identical request.",
+        "counter",
+        {"call": "coalesced", "stream": "stream_coalesced"},
+    ),
+    "llm_agent_coalesce_in_flight": (
+        "Single-flight calls in progress.",
+        "gauge",
+        {"call": "in_flight", "stream": "in_flight_streams"},
+    ),
+}
+
+
+def render_coalescing_metrics(stats: Dict[str, Any]) -> str:
+    """
+    將相同請求合併的統計輸出為 Prometheus text exposition 格式
+
+    Args:
+        stats: SingleFlight.stats() 返回的字典
+
+    Returns:
+        指標文字
+    """
+    lines: List[str] = []
+    for name, (help_text, metric_type, fields) in COALESCING_METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        for kind, field in fields.items():
+            value = _format_value(stats.get(field, 0))
+            lines.append(f"{name}{_format_labels({'kind': kind})} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_sink_lock = threading.Lock()
+_default_sink: MetricsSink = PrometheusMetricsSink()
+
+
+def get_metrics_sink() -> MetricsSink:
+    """
+    取得程序共用的指標輸出（預設為 PrometheusMetricsSink）
+
+    Returns:
+        MetricsSink 實例
+    """
+    return _default_sink
+
+
+def set_metrics_sink(sink: MetricsSink) -> None:
+    """
+    替換程序共用的指標輸出（例如轉送到 StatsD 或 OpenTelemetry）
+
+    Args:
+        sink: MetricsSink 實例
+    """
+    global _default_sink
+    with _sink_lock:
+        _default_sink = sink
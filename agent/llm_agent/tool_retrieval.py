@@ -0,0 +1,237 @@
+"""工具檢索模組：以 BM25 挑選與使用者訊息最相關的工具，減少送入 LLM 的工具描述"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from llama_index.core.tools import BaseTool, ToolMetadata
+
+from .ratelimit import estimate_tokens
+
+if TYPE_CHECKING:
+    from .state.agent_state import AgentState
+    from .tools import ToolRegistry
+
+_CAMEL_CASE = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    將文字切成 BM25 詞彙：英數字以單字切分（含 snake_case / camelCase 名稱），
+    CJK 文字以單字與相鄰兩字切分
+
+    Args:
+        text: 文字
+
+    Returns:
+        詞彙列表
+    """
+    text = _CAMEL_CASE.sub(r"\1 \2", text or "")
+    tokens = _WORD.findall(text.lower())
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def tool_document(metadata: ToolMetadata) -> str:
+    """
+    取得工具送入 prompt 的描述文字（名稱、描述與參數 schema）
+
+    Args:
+        metadata: 工具的 ToolMetadata
+
+    Returns:
+        描述文字
+    """
+    return f"{metadata.name}\n{metadata.description}\n{metadata.fn_schema_str}"
+
+
+class BM25Index:
+    """
+    可增量更新的 BM25 索引
+
+    新增與移除文件時只更新該文件的詞頻與文件頻率，不需要重建整個索引；查詢時只對包含查詢詞的
+    文件計分。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        初始化 BM25Index
+
+        Args:
+            k1: 詞頻飽和參數
+            b: 文件長度正規化參數（0-1）
+        """
+        self.k1 = k1
+        self.b = b
+        self._term_freqs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def add(self, doc_id: str, text: str) -> None:
+        """
+        新增或更新文件
+
+        Args:
+            doc_id: 文件 ID（工具名稱）
+            text: 文件內容
+        """
+        term_freqs = Counter(tokenize(text))
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._term_freqs[doc_id] = term_freqs
+            length = sum(term_freqs.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            for term in term_freqs:
+                self._postings.setdefault(term, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        """
+        移除文件
+
+        Args:
+            doc_id: 文件 ID
+        """
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        """移除文件（呼叫端需持有 self._lock）"""
+        term_freqs = self._term_freqs.pop(doc_id, None)
+        if term_freqs is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in term_freqs:
+            docs = self._postings.get(term)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._postings[term]
+
+    def clear(self) -> None:
+        """清除所有文件"""
+        with self._lock:
+            self._term_freqs.clear()
+            self._lengths.clear()
+            self._postings.clear()
+            self._total_length = 0
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        查詢最相關的文件
+
+        Args:
+            query: 查詢文字
+            k: 最多返回的文件數
+
+        Returns:
+            依分數由高到低排序的 (文件 ID, 分數) 列表，不包含分數為 0 的文件
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._term_freqs)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id in docs:
+                    freq = self._term_freqs[doc_id][term]
+                    norm = 1 - self.b + self.b * self._lengths[doc_id] / average_length
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (
+                        freq + self.k1 * norm
+                    )
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self) -> int:
+        """取得文件數量"""
+        return len(self._term_freqs)
+
+
+class ToolRetriever:
+    """
+    依使用者訊息從 ToolRegistry 挑選 top-k 工具，作為 ReActAgent 的 tool_retriever
+
+    訊息與任何工具都不相關時（例如「再做一次」這類接續對話）沿用上一次挑選的工具。
+    """
+
+    def __init__(self, registry: "ToolRegistry", top_k: int, state: Optional["AgentState"] = None):
+        """
+        初始化 ToolRetriever
+
+        Args:
+            registry: 已啟用檢索索引的工具註冊表
+            top_k: 每則訊息最多挑選的工具數
+            state: 記錄工具結果的 AgentState（可選）
+        """
+        self.registry = registry
+        self.top_k = top_k
+        self.state = state
+        self._selected: List[str] = []
+        self._last_stats: Dict[str, Any] = {}
+
+    def retrieve(self, query: str) -> List[BaseTool]:
+        """
+        挑選與訊息最相關的工具
+
+        Args:
+            query: 使用者訊息
+
+        Returns:
+            經過執行層包裝的工具列表
+        """
+        start = time.perf_counter()
+        names = [name for name, _ in self.registry.search_tools(query, self.top_k)]
+        if names:
+            self._selected = names
+        else:
+            names = [name for name in self._selected if name in self.registry]
+        tools = self.registry.get_agent_tools(self.state, names=names)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        total_tokens = self.registry.tool_tokens()
+        selected_tokens = self.registry.tool_tokens(names)
+        self._last_stats = {
+            "candidates": len(self.registry),
+            "selected": names,
+            "latency_ms": latency_ms,
+            "tool_tokens": selected_tokens,
+            "tool_tokens_saved": total_tokens - selected_tokens,
+        }
+        return tools
+
+    def last_stats(self) -> Dict[str, Any]:
+        """
+        取得最近一次檢索的統計
+
+        Returns:
+            包含 candidates、selected、latency_ms、tool_tokens 與 tool_tokens_saved
+            （每個推理步驟省下的 prompt token 估計值）的字典
+        """
+        return dict(self._last_stats)
+
+
+def estimate_tool_tokens(metadata: ToolMetadata) -> int:
+    """
+    估計工具描述在 prompt 中佔用的 token 數
+
+    Args:
+        metadata: 工具的 ToolMetadata
+
+    Returns:
+        估計的 token 數
+    """
+    return estimate_tokens(tool_document(metadata))
@@ -1,50 +1,460 @@
 """Agent 工具定義框架模組"""
 
-from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-from llama_index.core.tools import FunctionTool
+from llama_index.core.tools import FunctionTool, ToolMetadata
+from llama_index.core.tools.function_tool import sync_to_async
+
+from .schemas import ToolExecutionResult
+from .tool_retrieval import BM25Index, estimate_tool_tokens, tool_document
+
+if TYPE_CHECKING:
+    from .state.agent_state import AgentState
+
+# 工具呼叫：(工具名稱, 參數)
+ToolCall = Tuple[str, Dict[str, Any]]
+
+
+class ToolExecutionMode(str, Enum):
+    """工具執行方式"""
+
+    ASYNC = "async"  # 在 event loop 上直接 await（async 工具）
+    THREAD = "thread"  # 在有上限的執行緒池中執行（一般同步工具，例如 I/O）
+    PROCESS = "process"  # 在程序池中執行（CPU 密集工具，函數需可 pickle）
+
+
+class ToolCacheScope(str, Enum):
+    """工具結果快取的範圍"""
+
+    SESSION = "session"  # 每個 session 各自快取（結果依使用者或對話而異的工具）
+    GLOBAL = "global"  # 所有 session 共用（結果只取決於參數的工具）
+
+
+class ToolCachePolicy:
+    """
+    工具結果快取策略，於註冊工具時宣告
+
+    相同參數（由 key_fn 產生鍵）的呼叫在 ttl 內直接返回先前成功的結果，不再執行工具。
+    失敗或逾時的結果不會被快取。
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = 300.0,
+        max_entries: int = 256,
+        key_fn: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        scope: ToolCacheScope = ToolCacheScope.SESSION,
+    ):
+        """
+        初始化 ToolCachePolicy
+
+        Args:
+            ttl: 結果存活時間（秒，None 表示不過期）
+            max_entries: 每個工具最多快取的結果數，超過時淘汰最久未使用的項目
+            key_fn: 從呼叫參數產生快取鍵的函數（預設為參數的 JSON 序列化）
+            scope: 快取範圍（每個 session 或全域共用）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_fn = key_fn
+        self.scope = ToolCacheScope(scope)
+
+    def make_key(self, kwargs: Dict[str, Any], session_id: Optional[str]) -> str:
+        """
+        產生快取鍵
+
+        Args:
+            kwargs: 呼叫參數
+            session_id: 呼叫所屬的 session（scope 為 SESSION 時使用）
+
+        Returns:
+            快取鍵
+        """
+        if self.key_fn is not None:
+            arguments = repr(self.key_fn(kwargs))
+        else:
+            arguments = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=repr)
+        if self.scope == ToolCacheScope.SESSION:
+            return f"{session_id or ''}\x00{arguments}"
+        return arguments
+
+
+class _ToolResultCache:
+    """
+    單一工具的結果快取（LRU + TTL）
+
+    值為 (工具結果, 原始執行時間毫秒)；工具結果可為任意物件，不經過序列化。
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float]):
+        """
+        初始化 _ToolResultCache
+
+        Args:
+            max_entries: 最大項目數，超過時淘汰最久未使用的項目
+            ttl: 項目存活時間（秒，None 表示不過期）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # 鍵 -> (過期時間, 工具結果, 原始執行時間毫秒)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        讀取快取並更新命中統計
+
+        Args:
+            key: 快取鍵
+
+        Returns:
+            (工具結果, 原始執行時間毫秒)，未命中或已過期時返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key: str, result: Any, duration_ms: float) -> None:
+        """
+        寫入快取
+
+        Args:
+            key: 快取鍵
+            result: 工具結果
+            duration_ms: 原始執行時間（毫秒）
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, result, duration_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得快取統計
+
+        Returns:
+            包含 hits、misses、hit_rate、size 的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
+
+    def __len__(self) -> int:
+        """取得快取項目數量"""
+        return len(self._entries)
+
+
+# create_tool_from_function 宣告的快取策略，於註冊到 ToolRegistry 時套用
+_declared_cache_policies: "weakref.WeakKeyDictionary[FunctionTool, ToolCachePolicy]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class _ToolOptions:
+    """單一工具的執行設定"""
+
+    __slots__ = ("mode", "timeout", "cache_policy", "cache")
+
+    def __init__(
+        self,
+        mode: ToolExecutionMode,
+        timeout: Optional[float],
+        cache_policy: Optional[ToolCachePolicy] = None,
+    ):
+        self.mode = mode
+        self.timeout = timeout
+        self.cache_policy = cache_policy
+        self.cache = (
+            _ToolResultCache(max_entries=cache_policy.max_entries, ttl=cache_policy.ttl)
+            if cache_policy is not None
+            else None
+        )
+
+
+class _CachedToolMetadata(ToolMetadata):
+    """快取參數 schema 的 ToolMetadata（ReActAgent 每個推理步驟都會重新渲染工具描述）"""
+
+    @classmethod
+    def from_metadata(cls, metadata: ToolMetadata) -> "_CachedToolMetadata":
+        """從既有的 ToolMetadata 建立"""
+        return cls(
+            description=metadata.description,
+            name=metadata.name,
+            fn_schema=metadata.fn_schema,
+            return_direct=metadata.return_direct,
+        )
+
+    def get_parameters_dict(self) -> dict:
+        """取得參數 schema（只計算一次）"""
+        parameters = self.__dict__.get("_parameters")
+        if parameters is None:
+            parameters = super().get_parameters_dict()
+            self.__dict__["_parameters"] = parameters
+        return dict(parameters)
+
+    @functools.cached_property
+    def fn_schema_str(self) -> str:
+        """取得參數 schema 的 JSON 字串（只序列化一次）"""
+        if self.fn_schema is None:
+            raise ValueError("fn_schema is None.")
+        return json.dumps(self.get_parameters_dict())
+
+
+# FunctionTool 未提供 async_fn 時以 sync_to_async 包裝同步函數；包裝函數共用同一個 code 物件
+_SYNC_TO_ASYNC_CODE = sync_to_async(lambda: None).__code__
+
+
+def _infer_mode(tool: FunctionTool) -> ToolExecutionMode:
+    """
+    推斷工具的執行方式
+
+    原始函數為 coroutine function，或明確提供了 async_fn（不是 FunctionTool 自動包裝的）時
+    視為 async 工具，其餘在執行緒池中執行。
+    """
+    if inspect.iscoroutinefunction(inspect.unwrap(tool.fn)):
+        return ToolExecutionMode.ASYNC
+    async_fn = getattr(tool, "async_fn", None)
+    if (
+        inspect.iscoroutinefunction(async_fn)
+        and getattr(async_fn, "__code__", None) is not _SYNC_TO_ASYNC_CODE
+    ):
+        return ToolExecutionMode.ASYNC
+    return ToolExecutionMode.THREAD
+
+
+def _build_function_tool(
+    fn: Callable, name: Optional[str], description: Optional[str]
+) -> FunctionTool:
+    """從同步或 async 函數建立 FunctionTool"""
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        def sync_fn(*args: Any, **kwargs: Any) -> Any:
+            return asyncio.run(fn(*args, **kwargs))
+
+        return FunctionTool.from_defaults(
+            fn=sync_fn,
+            async_fn=fn,
+            name=name or fn.__name__,
+            description=description or (fn.__doc__ or ""),
+        )
+    return FunctionTool.from_defaults(
+        fn=fn,
+        name=name or fn.__name__,
+        description=description or (fn.__doc__ or ""),
+    )
 
 
 class ToolRegistry:
-    """工具註冊表，管理 Agent 可用的工具"""
+    """
+    工具註冊表，管理 Agent 可用的工具並提供執行層
+
+    執行層依工具類型選擇執行方式：async 工具直接在 event loop 上執行，同步工具在有上限的
+    執行緒池中執行（不阻塞 event loop），CPU 密集工具可指定在程序池中執行。每個工具可設定
+    逾時與結果快取策略，同一推理步驟中互不相依的呼叫可透過 aexecute_many 並行執行。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        max_process_workers: Optional[int] = None,
+        default_timeout: Optional[float] = None,
+    ):
+        """
+        初始化工具註冊表
 
-    def __init__(self):
-        """初始化工具註冊表"""
+        Args:
+            max_workers: 同步工具執行緒池大小
+            max_process_workers: CPU 密集工具程序池大小（None 表示使用 CPU 數量）
+            default_timeout: 未個別設定時的工具逾時（秒，None 表示不限制）
+        """
         self._tools: Dict[str, FunctionTool] = {}
+        self._options: Dict[str, _ToolOptions] = {}
+        # 渲染 prompt 用的 metadata 與包裝後的工具（依 state 快取，工具變更時失效）
+        self._metadata: Dict[str, _CachedToolMetadata] = {}
+        self._agent_tools: "weakref.WeakKeyDictionary[Any, Dict[str, FunctionTool]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._stateless_agent_tools: Dict[str, FunctionTool] = {}
+        # 每次註冊 / 取消註冊時遞增，供 Agent 判斷是否需要重建
+        self.version = 0
+        self.max_workers = max_workers
+        self.max_process_workers = max_process_workers
+        self.default_timeout = default_timeout
+        self._thread_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # 工具檢索索引（enable_retrieval 後於註冊 / 取消註冊時增量更新）
+        self._index: Optional[BM25Index] = None
+        self._tool_tokens: Dict[str, int] = {}
+
+    def enable_retrieval(self) -> None:
+        """啟用工具檢索索引並索引已註冊的工具"""
+        if self._index is not None:
+            return
+        self._index = BM25Index()
+        for name, tool in self._tools.items():
+            self._index_tool(name, tool)
+
+    def _index_tool(self, name: str, tool: FunctionTool) -> None:
+        """將工具加入檢索索引"""
+        if self._index is not None:
+            metadata = self._metadata[name]
+            self._index.add(name, tool_document(metadata))
+            self._tool_tokens[name] = estimate_tool_tokens(metadata)
+
+    def _invalidate(self, names: Optional[Sequence[str]] = None) -> None:
+        """使工具的包裝快取失效並遞增版本（names 為 None 表示所有工具）"""
+        self.version += 1
+        for cached in [self._stateless_agent_tools, *self._agent_tools.values()]:
+            if names is None:
+                cached.clear()
+            else:
+                for name in names:
+                    cached.pop(name, None)
+
+    def search_tools(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        以 BM25 查詢與文字最相關的工具
+
+        Args:
+            query: 查詢文字（通常為使用者訊息）
+            k: 最多返回的工具數
+
+        Returns:
+            依分數由高到低排序的 (工具名稱, 分數) 列表
+
+        Raises:
+            RuntimeError: 尚未呼叫 enable_retrieval
+        """
+        if self._index is None:
+            raise RuntimeError("工具檢索索引尚未啟用，請先呼叫 enable_retrieval()")
+        return self._index.search(query, k)
+
+    def tool_tokens(self, names: Optional[Sequence[str]] = None) -> int:
+        """
+        估計工具描述在 prompt 中佔用的 token 數（需先呼叫 enable_retrieval）
 
-    def register(self, name: str, tool: FunctionTool) -> None:
+        Args:
+            names: 工具名稱（None 表示所有工具）
+
+        Returns:
+            估計的 token 數
+        """
+        if names is None:
+            return sum(self._tool_tokens.values())
+        return sum(self._tool_tokens.get(name, 0) for name in names)
+
+    def register(
+        self,
+        name: str,
+        tool: FunctionTool,
+        timeout: Optional[float] = None,
+        mode: Optional[ToolExecutionMode] = None,
+        cache: Optional[ToolCachePolicy] = None,
+    ) -> None:
         """
         註冊工具
 
         Args:
             name: 工具名稱
             tool: FunctionTool 實例
+            timeout: 工具逾時（秒，None 表示使用 default_timeout）
+            mode: 執行方式（None 表示依工具自動推斷）
+            cache: 結果快取策略（None 表示使用 create_tool_from_function 宣告的策略，
+                皆未設定則不快取）
         """
+        self._add(name, tool, timeout, mode, cache)
+        self._invalidate([name])
+
+    def register_many(self, tools: Sequence[FunctionTool]) -> None:
+        """
+        批次註冊工具（使用各工具的 metadata.name 作為名稱），整批只遞增一次版本
+
+        Args:
+            tools: FunctionTool 列表
+        """
+        names = []
+        for tool in tools:
+            self._add(tool.metadata.name, tool)
+            names.append(tool.metadata.name)
+        if names:
+            self._invalidate(names)
+
+    def _add(
+        self,
+        name: str,
+        tool: FunctionTool,
+        timeout: Optional[float] = None,
+        mode: Optional[ToolExecutionMode] = None,
+        cache: Optional[ToolCachePolicy] = None,
+    ) -> None:
+        """加入工具與其選項、metadata 與檢索索引（不遞增版本）"""
         self._tools[name] = tool
+        self._options[name] = _ToolOptions(
+            mode or _infer_mode(tool), timeout, cache or _declared_cache_policies.get(tool)
+        )
+        self._metadata[name] = _CachedToolMetadata.from_metadata(tool.metadata)
+        self._index_tool(name, tool)
 
     def register_function(
         self,
         fn: Callable,
         name: Optional[str] = None,
         description: Optional[str] = None,
+        timeout: Optional[float] = None,
+        mode: Optional[ToolExecutionMode] = None,
+        cache: Optional[ToolCachePolicy] = None,
     ) -> FunctionTool:
         """
         註冊函數為工具
 
         Args:
-            fn: 要註冊的函數
+            fn: 要註冊的函數（同步或 async）
             name: 工具名稱（預設使用函數名稱）
             description: 工具描述（預設使用函數 docstring）
+            timeout: 工具逾時（秒，None 表示使用 default_timeout）
+            mode: 執行方式（None 表示 async 函數使用 ASYNC，其餘使用 THREAD；
+                CPU 密集且可 pickle 的函數可指定 PROCESS）
+            cache: 結果快取策略（None 表示不快取）
 
         Returns:
             建立的 FunctionTool 實例
         """
-        tool = FunctionTool.from_defaults(
-            fn=fn,
-            name=name or fn.__name__,
-            description=description or (fn.__doc__ or ""),
-        )
-        self.register(tool.metadata.name, tool)
+        tool = _build_function_tool(fn, name, description)
+        self.register(tool.metadata.name, tool, timeout=timeout, mode=mode, cache=cache)
         return tool
 
     def get_tool(self, name: str) -> Optional[FunctionTool]:
@@ -68,6 +478,370 @@ class ToolRegistry:
         """
         return list(self._tools.values())
 
+    def get_agent_tools(
+        self, state: Optional["AgentState"] = None, names: Optional[Sequence[str]] = None
+    ) -> List[FunctionTool]:
+        """
+        取得經過執行層包裝的工具（供 ReActAgent 使用）
+
+        包裝後的工具會套用逾時與執行緒 / 程序池，並將結果記錄到 state。包裝結果與參數 schema
+        會被快取，工具變更前重複呼叫不會重新建立。
+
+        Args:
+            state: 記錄工具結果的 AgentState（可選）
+            names: 只取得指定名稱的工具（None 表示所有工具）
+
+        Returns:
+            工具列表
+        """
+        if names is None:
+            names = list(self._tools)
+        if state is None:
+            cached = self._stateless_agent_tools
+        else:
+            cached = self._agent_tools.setdefault(state, {})
+        tools = []
+        for name in names:
+            if name not in self._tools:
+                continue
+            tool = cached.get(name)
+            if tool is None:
+                tool = self._wrap_tool(name, state)
+                cached[name] = tool
+            tools.append(tool)
+        return tools
+
+    def _wrap_tool(self, name: str, state: Optional["AgentState"]) -> FunctionTool:
+        """以執行層包裝單一工具；失敗時拋出例外，由 ReActAgent 轉為錯誤觀察"""
+        # 以弱參照持有 state，讓依 state 快取的包裝工具不會阻止 state 被回收
+        state_ref = weakref.ref(state) if state is not None else None
+
+        def unwrap(result: ToolExecutionResult) -> Any:
+            if not result.success:
+                raise RuntimeError(result.error)
+            return result.result
+
+        def call(**kwargs: Any) -> Any:
+            state = state_ref() if state_ref is not None else None
+            return unwrap(self.execute(name, kwargs, state=state))
+
+        async def acall(**kwargs: Any) -> Any:
+            state = state_ref() if state_ref is not None else None
+            return unwrap(await self.aexecute(name, kwargs, state=state))
+
+        return FunctionTool(fn=call, metadata=self._metadata[name], async_fn=acall)
+
+    def _get_thread_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        """取得（必要時建立）執行緒池"""
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="tool"
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """取得（必要時建立）程序池"""
+        with self._pool_lock:
+            if self._process_pool is None:
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_process_workers
+                )
+            return self._process_pool
+
+    def _submit(
+        self, tool: FunctionTool, options: _ToolOptions, kwargs: Dict[str, Any]
+    ) -> concurrent.futures.Future:
+        """將同步或 CPU 密集工具送入對應的池"""
+        if options.mode == ToolExecutionMode.PROCESS:
+            # 程序池只能傳遞可 pickle 的原始函數
+            return self._get_process_pool().submit(functools.partial(tool.fn, **kwargs))
+        return self._get_thread_pool().submit(lambda: tool.call(**kwargs).raw_output)
+
+    def _resolve(
+        self, name: str, timeout: Optional[float]
+    ) -> Tuple[Optional[FunctionTool], _ToolOptions, Optional[float]]:
+        """取得工具、執行設定與實際逾時"""
+        tool = self._tools.get(name)
+        options = self._options.get(name) or _ToolOptions(ToolExecutionMode.THREAD, None)
+        if timeout is None:
+            timeout = options.timeout if options.timeout is not None else self.default_timeout
+        return tool, options, timeout
+
+    @staticmethod
+    def _finish(
+        index: int,
+        name: str,
+        kwargs: Dict[str, Any],
+        start: float,
+        state: Optional["AgentState"],
+        result: Any = None,
+        error: Optional[str] = None,
+        end: Optional[float] = None,
+        saved_ms: Optional[float] = None,
+    ) -> ToolExecutionResult:
+        """建立執行結果並記錄到 state（saved_ms 不為 None 表示結果來自快取）"""
+        duration_ms = ((end or time.perf_counter()) - start) * 1000
+        cached = saved_ms is not None
+        if state is not None:
+            state.add_tool_result(
+                name,
+                result,
+                success=error is None,
+                error=error,
+                duration_ms=duration_ms,
+                cached=cached,
+                saved_ms=saved_ms,
+            )
+        return ToolExecutionResult(
+            index=index,
+            tool_name=name,
+            arguments=kwargs,
+            result=result,
+            success=error is None,
+            error=error,
+            duration_ms=duration_ms,
+            cached=cached,
+            saved_ms=saved_ms,
+        )
+
+    @staticmethod
+    def _cache_key(
+        options: _ToolOptions, kwargs: Dict[str, Any], state: Optional["AgentState"]
+    ) -> Optional[str]:
+        """取得呼叫的快取鍵（工具未設定快取或無法產生鍵時返回 None）"""
+        if options.cache_policy is None:
+            return None
+        try:
+            return options.cache_policy.make_key(kwargs, state.session_id if state else None)
+        except Exception:
+            # key_fn 無法處理的參數不快取
+            return None
+
+    @staticmethod
+    def _lookup(options: _ToolOptions, key: Optional[str]) -> Optional[Tuple[Any, float]]:
+        """讀取快取的 (結果, 原始執行時間毫秒)"""
+        if key is None or options.cache is None:
+            return None
+        return options.cache.get(key)
+
+    @staticmethod
+    def _store(options: _ToolOptions, key: Optional[str], result: ToolExecutionResult) -> None:
+        """快取成功的執行結果"""
+        if key is not None and options.cache is not None and result.success:
+            options.cache.set(key, result.result, result.duration_ms)
+
+    async def aexecute(
+        self,
+        name: str,
+        kwargs: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        state: Optional["AgentState"] = None,
+        index: int = 0,
+    ) -> ToolExecutionResult:
+        """
+        執行單一工具呼叫（非同步版本），不會阻塞 event loop
+
+        逾時時 async 工具會被取消；執行緒池中的同步工具無法強制中止，會在背景完成後丟棄結果。
+
+        Args:
+            name: 工具名稱
+            kwargs: 呼叫參數
+            timeout: 逾時（秒，None 表示使用工具或註冊表的設定）
+            state: 記錄工具結果的 AgentState（可選）
+            index: 呼叫在批次中的位置
+
+        Returns:
+            ToolExecutionResult（錯誤與逾時不會拋出，而是記錄在結果中）
+        """
+        kwargs = kwargs or {}
+        start = time.perf_counter()
+        tool, options, timeout = self._resolve(name, timeout)
+        if tool is None:
+            return self._finish(index, name, kwargs, start, state, error=f"工具 {name} 不存在")
+        key = self._cache_key(options, kwargs, state)
+        hit = self._lookup(options, key)
+        if hit is not None:
+            return self._finish(index, name, kwargs, start, state, result=hit[0], saved_ms=hit[1])
+
+        try:
+            if options.mode == ToolExecutionMode.ASYNC:
+                output = await asyncio.wait_for(tool.acall(**kwargs), timeout)
+                result = output.raw_output
+            else:
+                future = asyncio.wrap_future(self._submit(tool, options, kwargs))
+                result = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            error = f"工具 {name} 執行逾時（{timeout} 秒）"
+            return self._finish(index, name, kwargs, start, state, error=error)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            return self._finish(index, name, kwargs, start, state, error=error)
+        execution = self._finish(index, name, kwargs, start, state, result=result)
+        self._store(options, key, execution)
+        return execution
+
+    async def aexecute_many(
+        self,
+        calls: Sequence[ToolCall],
+        timeout: Optional[float] = None,
+        state: Optional["AgentState"] = None,
+    ) -> List[ToolExecutionResult]:
+        """
+        並行執行多個互不相依的工具呼叫（非同步版本）
+
+        Args:
+            calls: (工具名稱, 參數) 列表
+            timeout: 每個呼叫的逾時（秒，None 表示使用各工具的設定）
+            state: 記錄工具結果的 AgentState（可選）
+
+        Returns:
+            與輸入順序相同的 ToolExecutionResult 列表
+        """
+        return list(
+            await asyncio.gather(
+                *(
+                    self.aexecute(name, kwargs, timeout=timeout, state=state, index=index)
+                    for index, (name, kwargs) in enumerate(calls)
+                )
+            )
+        )
+
+    def execute(
+        self,
+        name: str,
+        kwargs: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        state: Optional["AgentState"] = None,
+        index: int = 0,
+    ) -> ToolExecutionResult:
+        """
+        執行單一工具呼叫（同步版本）
+
+        Args:
+            name: 工具名稱
+            kwargs: 呼叫參數
+            timeout: 逾時（秒，None 表示使用工具或註冊表的設定）
+            state: 記錄工具結果的 AgentState（可選）
+            index: 呼叫在批次中的位置
+
+        Returns:
+            ToolExecutionResult（錯誤與逾時不會拋出，而是記錄在結果中）
+        """
+        calls = [(name, kwargs or {})]
+        return self.execute_many(calls, timeout=timeout, state=state, start_index=index)[0]
+
+    def execute_many(
+        self,
+        calls: Sequence[ToolCall],
+        timeout: Optional[float] = None,
+        state: Optional["AgentState"] = None,
+        start_index: int = 0,
+    ) -> List[ToolExecutionResult]:
+        """
+        並行執行多個互不相依的工具呼叫（同步版本）
+
+        所有呼叫都在執行緒 / 程序池中執行（async 工具在工作執行緒中以獨立 event loop 執行）。
+
+        Args:
+            calls: (工具名稱, 參數) 列表
+            timeout: 每個呼叫的逾時（秒，None 表示使用各工具的設定）
+            state: 記錄工具結果的 AgentState（可選）
+            start_index: 第一個呼叫的 index
+
+        Returns:
+            與輸入順序相同的 ToolExecutionResult 列表
+        """
+        start = time.perf_counter()
+        submitted = []
+        for offset, (name, kwargs) in enumerate(calls):
+            tool, options, call_timeout = self._resolve(name, timeout)
+            key = self._cache_key(options, kwargs, state) if tool is not None else None
+            hit = self._lookup(options, key)
+            future = None
+            if tool is not None and hit is None:
+                future = self._submit(tool, options, kwargs)
+                # 記錄各呼叫實際完成的時間，避免依收集順序計算執行時間
+                future.add_done_callback(lambda f: setattr(f, "finished_at", time.perf_counter()))
+            submitted.append(
+                (start_index + offset, name, kwargs, future, call_timeout, options, key, hit)
+            )
+
+        results: List[ToolExecutionResult] = []
+        for index, name, kwargs, future, call_timeout, options, key, hit in submitted:
+            if hit is not None:
+                results.append(
+                    self._finish(
+                        index, name, kwargs, start, state, result=hit[0], end=start, saved_ms=hit[1]
+                    )
+                )
+                continue
+            if future is None:
+                error = f"工具 {name} 不存在"
+                results.append(self._finish(index, name, kwargs, start, state, error=error))
+                continue
+            remaining = None
+            if call_timeout is not None:
+                remaining = max(0.0, call_timeout - (time.perf_counter() - start))
+            try:
+                result = future.result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                error = f"工具 {name} 執行逾時（{call_timeout} 秒）"
+                results.append(self._finish(index, name, kwargs, start, state, error=error))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                end = getattr(future, "finished_at", None)
+                results.append(
+                    self._finish(index, name, kwargs, start, state, error=error, end=end)
+                )
+            else:
+                end = getattr(future, "finished_at", None)
+                execution = self._finish(index, name, kwargs, start, state, result=result, end=end)
+                self._store(options, key, execution)
+                results.append(execution)
+        return results
+
+    def clear_cache(self, name: Optional[str] = None) -> None:
+        """
+        清除工具結果快取
+
+        Args:
+            name: 工具名稱（None 表示清除所有工具的快取）
+        """
+        options = [self._options.get(name)] if name else list(self._options.values())
+        for option in options:
+            if option is not None and option.cache is not None:
+                option.cache.clear()
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        取得各工具的結果快取統計
+
+        Returns:
+            工具名稱 -> 包含 hits、misses、hit_rate、size 的字典
+        """
+        return {
+            name: options.cache.stats()
+            for name, options in self._options.items()
+            if options.cache is not None
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        關閉執行緒池與程序池
+
+        Args:
+            wait: 是否等待執行中的工具完成
+        """
+        with self._pool_lock:
+            pools = [self._thread_pool, self._process_pool]
+            self._thread_pool = None
+            self._process_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+
     def unregister(self, name: str) -> bool:
         """
         取消註冊工具
@@ -80,12 +854,24 @@ class ToolRegistry:
         """
         if name in self._tools:
             del self._tools[name]
+            self._options.pop(name, None)
+            self._metadata.pop(name, None)
+            self._tool_tokens.pop(name, None)
+            self._invalidate([name])
+            if self._index is not None:
+                self._index.remove(name)
             return True
         return False
 
     def clear(self) -> None:
         """清除所有工具"""
         self._tools.clear()
+        self._options.clear()
+        self._metadata.clear()
+        self._tool_tokens.clear()
+        self._invalidate()
+        if self._index is not None:
+            self._index.clear()
 
     def __len__(self) -> int:
         """取得工具數量"""
@@ -100,14 +886,16 @@ def create_tool_from_function(
     fn: Callable,
     name: Optional[str] = None,
     description: Optional[str] = None,
+    cache: Optional[ToolCachePolicy] = None,
 ) -> FunctionTool:
     """
     從函數建立工具（便利函數）
 
     Args:
-        fn: 要轉換為工具的函數
+        fn: 要轉換為工具的函數（同步或 async）
         name: 工具名稱（預設使用函數名稱）
         description: 工具描述（預設使用函數 docstring）
+        cache: 結果快取策略，在工具註冊到 ToolRegistry 時套用（None 表示不快取）
 
     Returns:
         FunctionTool 實例
@@ -121,9 +909,7 @@ def create_tool_from_function(
         >>> print(tool.metadata.name)
         get_weather
     """
-    return FunctionTool.from_defaults(
-        fn=fn,
-        name=name or fn.__name__,
-        description=description or (fn.__doc__ or ""),
-    )
-
+    tool = _build_function_tool(fn, name, description)
+    if cache is not None:
+        _declared_cache_policies[tool] = cache
+    return tool
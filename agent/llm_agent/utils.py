@@ -2,10 +2,18 @@
 
 import json
 import logging
+import re
 from typing import Any, Dict, Optional
 
+from .structured_stream import StructuredStreamParser
+
 logger = logging.getLogger(__name__)
 
+# 解析器沒有結果時使用的舊版 JSON 規則（最多兩層巢狀的 {...} / [...]）
+_JSON_PATTERN = re.compile(
+    r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}|\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]", re.DOTALL
+)
+
 
 def parse_json_response(text: str) -> Optional[Dict[str, Any]]:
     """
@@ -21,13 +29,14 @@ def parse_json_response(text: str) -> Optional[Dict[str, Any]]:
         # 嘗試直接解析
         return json.loads(text)
     except json.JSONDecodeError:
-        # 嘗試從文字中提取 JSON（尋找 {...} 或 [...]）
-        import re
-
-        json_pattern = r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}|\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]"
-        matches = re.findall(json_pattern, text, re.DOTALL)
-
-        for match in matches:
+        # 掃描文字，取第一個括號成對且可解析的 {...} 或 [...]
+        parser = StructuredStreamParser(code_blocks=False, max_items=1)
+        parser.feed(text)
+        parser.close()
+        if parser.items:
+            return parser.items[0].value
+
+        for match in _JSON_PATTERN.findall(text):
             try:
                 return json.loads(match)
             except json.JSONDecodeError:
@@ -66,15 +75,32 @@ def extract_code_blocks(text: str, language: Optional[str] = None) -> list[str]:
     Returns:
         提取的程式碼區塊列表
     """
-    import re
+    parser = StructuredStreamParser(json_values=False, language=language or None)
+    parser.feed(text)
+    if parser.items:
+        return [item.value for item in parser.items]
+
+    # 沒有行首的區塊標記時，沿用舊版規則（例如結束標記緊接在程式碼之後）
+    pattern = rf"```{re.escape(language)}\n(.*?)```" if language else r"```(?:\w+)?\n(.*?)```"
+    return [match.strip() for match in re.findall(pattern, text, re.DOTALL)]
+
+
+def get_field(obj: Any, name: str) -> Any:
+    """
+    讀取字典鍵或物件屬性（用於解析 provider 原始回應）
 
-    # 匹配 ```language\ncode\n``` 格式
-    pattern = r"```(?:\w+)?\n(.*?)```"
-    if language:
-        pattern = rf"```{language}\n(.*?)```"
+    Args:
+        obj: 字典或物件（可為 None）
+        name: 欄位名稱
 
-    matches = re.findall(pattern, text, re.DOTALL)
-    return [match.strip() for match in matches]
+    Returns:
+        欄位值，不存在時返回 None
+    """
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
 
 
 def sanitize_text(text: str, max_length: Optional[int] = None) -> str:
@@ -0,0 +1,42 @@
+"""測試共用 fixture：以本地模擬 provider 建立配置，並隔離程序共用的狀態"""
+
+import os
+
+import pytest
+
+from llm_agent import concurrency, hedging, providers, ratelimit, resilience
+from llm_agent.llm_config import FakeConfig, LLMConfig, LLMProvider
+
+
+@pytest.fixture(autouse=True)
+def _isolate_shared_state(monkeypatch):
+    """每個測試使用乾淨的斷路器、並行限制器、速率限制器、hedging 策略與 LLM 實例快取"""
+    for name in list(os.environ):
+        if name.startswith(("LLM_", "FAKE_", "OLLAMA_", "AGENT_", "MEMORY_")):
+            monkeypatch.delenv(name, raising=False)
+    yield
+    resilience._breakers.clear()
+    concurrency._limiters.clear()
+    ratelimit._provider_limiters.clear()
+    ratelimit._user_limiters.clear()
+    hedging._policies.clear()
+    providers.clear_llm_cache()
+
+
+@pytest.fixture
+def fake_llm_config():
+    """建立 provider 為 fake 的 LLMConfig（預設不模擬延遲）"""
+
+    def build(model: str = "fake", **options) -> LLMConfig:
+        llm_options = {
+            key: options.pop(key)
+            for key in ("circuit_breaker", "concurrency", "fallbacks", "hedging", "rate_limit")
+            if key in options
+        }
+        options.setdefault("ttft_ms", 0.0)
+        options.setdefault("tokens_per_second", None)
+        return LLMConfig(
+            provider=LLMProvider.FAKE, fake=FakeConfig(model=model, **options), **llm_options
+        )
+
+    return build
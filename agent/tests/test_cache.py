@@ -0,0 +1,106 @@
+"""回應快取測試"""
+
+import pytest
+
+from llm_agent import AgentConfig, BaseAgent
+from llm_agent.cache import (
+    InMemoryResponseCache,
+    SQLiteResponseCache,
+    create_response_cache,
+    make_cache_key,
+)
+from llm_agent.fake_llm import FakeLLM
+
+
+def _agent(llm_config):
+    config = AgentConfig(
+        llm=llm_config,
+        use_agent_mode=False,
+        coalesce_requests=False,
+        response_cache_enabled=True,
+    )
+    return BaseAgent(config=config)
+
+
+@pytest.fixture
+def provider_calls(monkeypatch):
+    """記錄實際送往模擬 provider 的模型名稱"""
+    calls = []
+    original = FakeLLM._plan
+
+    def counting_plan(self, kind, payload, prompt):
+        calls.append(self._config.model)
+        return original(self, kind, payload, prompt)
+
+    monkeypatch.setattr(FakeLLM, "_plan", counting_plan)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_primary_answers_are_cached(fake_llm_config, provider_calls):
+    agent = _agent(fake_llm_config("primary", response="cached"))
+    assert await agent.acomplete("prompt") == "cached"
+    assert await agent.acomplete("prompt") == "cached"
+    assert provider_calls == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_fallback_answers_are_not_cached_under_primary_key(fake_llm_config, provider_calls):
+    fallback = fake_llm_config("fallback", response="from fallback")
+    agent = _agent(fake_llm_config("broken", error_rate=1.0, fallbacks=[fallback]))
+    for _ in range(2):
+        assert await agent.acomplete("prompt") == "from fallback"
+    assert provider_calls == ["broken", "fallback", "broken", "fallback"]
+    assert len(agent.response_cache) == 0
+
+
+def test_cache_key_normalizes_whitespace_and_separates_models():
+    params = {"temperature": 0.0}
+    key = make_cache_key("openai", "gpt-4o", params, "  hello\r\nworld ")
+    assert key == make_cache_key("openai", "gpt-4o", params, "hello\nworld")
+    assert key != make_cache_key("openai", "gpt-4o-mini", params, "hello\nworld")
+
+
+def test_memory_cache_evicts_least_recently_used_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_agent.cache.time.time", lambda: now[0])
+    cache = InMemoryResponseCache(max_entries=2, ttl=10.0)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    # b 最久未使用，被淘汰
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert cache.stats() == {"hits": 1, "misses": 3, "hit_rate": 0.25}
+
+
+def test_sqlite_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteResponseCache(path, ttl=None, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+    cache.close()
+
+    reopened = SQLiteResponseCache(path)
+    # 超過 max_entries 時刪除最舊的項目
+    assert reopened.get("a") is None
+    assert reopened.get("c") == "C"
+    reopened.close()
+
+
+def test_tiered_cache_backfills_memory_from_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = create_response_cache(path=path)
+    writer.set("key", "value")
+    writer.disk.close()
+
+    cache = create_response_cache(path=path)
+    assert len(cache.memory) == 0
+    assert cache.get("key") == "value"
+    assert cache.memory.get("key") == "value"
+    cache.disk.close()
@@ -0,0 +1,65 @@
+"""對話記憶背景壓縮測試"""
+
+from llm_agent import AgentConfig, AgentRequest, BaseAgent
+from llm_agent.compaction import SUMMARY_PREFIX
+from llm_agent.config import MemoryCompactionConfig
+from llm_agent.fake_llm import FakeLLM
+
+
+def _agent(llm_config, summarizer=None):
+    compaction = MemoryCompactionConfig(
+        trigger_tokens=20, keep_recent_messages=2, min_messages=2, summarizer=summarizer
+    )
+    config = AgentConfig(
+        llm=llm_config,
+        use_agent_mode=False,
+        coalesce_requests=False,
+        memory_compaction=compaction,
+    )
+    return BaseAgent(config=config)
+
+
+def _chat_until_compacted(agent):
+    """對話到背景摘要排程，等待完成後再對話一輪以套用摘要"""
+    for turn in range(10):
+        agent.chat(AgentRequest(message=f"第 {turn} 輪的問題 " * 5))
+        if agent.compactor._pending is not None:
+            break
+    agent.compactor._pending.result(timeout=5)
+    return agent.chat(AgentRequest(message="下一輪"))
+
+
+def test_compaction_replaces_oldest_messages_with_summary(fake_llm_config):
+    agent = _agent(fake_llm_config(response="回答 " * 5))
+    response = _chat_until_compacted(agent)
+
+    stats = response.metadata["compaction"]
+    assert stats["messages"] >= 2
+    assert stats["tokens_after"] < stats["tokens_before"]
+    first = agent.state.memory.get_all_messages()[0]
+    assert first.content.startswith(SUMMARY_PREFIX)
+    assert agent.compactor.stats()["compactions"] == 1
+
+
+def test_summarizer_calls_use_the_provider_chain(fake_llm_config, monkeypatch):
+    calls = []
+    original = FakeLLM._plan
+
+    def counting_plan(self, kind, payload, prompt):
+        calls.append(self._config.model)
+        return original(self, kind, payload, prompt)
+
+    monkeypatch.setattr(FakeLLM, "_plan", counting_plan)
+    summarizer = fake_llm_config(
+        "summarizer",
+        error_rate=1.0,
+        fallbacks=[fake_llm_config("summary-fallback", response="摘要")],
+    )
+    agent = _agent(fake_llm_config("chat", response="回答 " * 5), summarizer=summarizer)
+    _chat_until_compacted(agent)
+
+    # 摘要呼叫與一般呼叫相同地在主要摘要模型失敗時改用備援 provider
+    assert calls.count("summarizer") == 1
+    assert calls.count("summary-fallback") == 1
+    first = agent.state.memory.get_all_messages()[0]
+    assert first.content == f"{SUMMARY_PREFIX}\n摘要"
@@ -0,0 +1,94 @@
+"""自適應並行限制器測試"""
+
+import asyncio
+
+import pytest
+
+from llm_agent import AgentConfig, BaseAgent
+from llm_agent.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from llm_agent.llm_config import ConcurrencyLimitConfig, LLMConfig
+
+
+@pytest.mark.asyncio
+async def test_queue_is_fifo_and_bounded():
+    limiter = AdaptiveConcurrencyLimiter(name="queue", initial_limit=1, max_queue=1)
+    await limiter.acquire()
+    order = []
+
+    async def waiter(name):
+        await limiter.acquire()
+        order.append(name)
+
+    queued = asyncio.ensure_future(waiter("queued"))
+    await asyncio.sleep(0)
+    assert limiter.stats()["queue_depth"] == 1
+    # 佇列已滿時直接拒絕
+    with pytest.raises(ConcurrencyLimitExceeded):
+        await limiter.acquire()
+
+    limiter.release(0.1)
+    await queued
+    assert order == ["queued"]
+    limiter.release(0.1)
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 1
+    assert stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects_and_frees_the_slot():
+    limiter = AdaptiveConcurrencyLimiter(name="timeout", initial_limit=1, queue_timeout=0.01)
+    await limiter.acquire()
+    with pytest.raises(ConcurrencyLimitExceeded):
+        await limiter.acquire()
+    limiter.release(0.1)
+    await limiter.acquire()
+    limiter.release(0.1)
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_limit_increases_additively_and_decreases_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(name="aimd", initial_limit=2, decrease_cooldown=0.0)
+    for _ in range(4):
+        limiter.acquire_sync()
+        limiter.acquire_sync()
+        limiter.release(0.1)
+        limiter.release(0.1)
+    assert limiter.limit > 2
+
+    limit = limiter.limit
+    limiter.acquire_sync()
+    limiter.release(overloaded=True)
+    assert limiter.limit == max(1, int(limit * 0.5))
+    assert limiter.stats()["decreases"] == 1
+
+
+@pytest.mark.asyncio
+async def test_overload_errors_from_provider_shrink_the_limit(fake_llm_config):
+    llm_config = fake_llm_config(
+        "overloaded",
+        error_rate=1.0,
+        error_type="overload",
+        concurrency=ConcurrencyLimitConfig(enabled=True, initial_limit=8),
+    )
+    agent = BaseAgent(
+        config=AgentConfig(llm=llm_config, use_agent_mode=False, coalesce_requests=False)
+    )
+    with pytest.raises(Exception) as info:
+        await agent.acomplete("prompt")
+    assert getattr(info.value, "status_code", None) == 429
+
+    stats = agent.providers[0].limiter.stats()
+    assert stats["limit"] == 4
+    assert stats["decreases"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_from_config_applies_latency_window_and_cooldown(monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY_LATENCY_WINDOW", "10")
+    monkeypatch.setenv("LLM_CONCURRENCY_DECREASE_COOLDOWN", "5")
+    config = LLMConfig.from_env(provider="fake").concurrency
+    limiter = AdaptiveConcurrencyLimiter.from_config("configured", config)
+    assert limiter._latencies.maxlen == 10
+    assert limiter.decrease_cooldown == 5.0
@@ -0,0 +1,43 @@
+"""本地模擬 provider 與 cassette 錄製 / 重播測試"""
+
+import pytest
+
+from llm_agent import fake_llm
+from llm_agent.fake_llm import CassetteMissError, FakeLLM
+from llm_agent.llm_config import FakeConfig, LLMConfig, LLMProvider
+
+NO_DELAY = {"ttft_ms": 0.0, "tokens_per_second": None}
+
+
+def test_generate_mode_is_deterministic_per_prompt_and_seed():
+    first = FakeLLM(FakeConfig(seed=1, **NO_DELAY))
+    same_seed = FakeLLM(FakeConfig(seed=1, **NO_DELAY))
+    text = first.complete("相同的 prompt").text
+    assert text == same_seed.complete("相同的 prompt").text
+    assert text != first.complete("不同的 prompt").text
+    assert text != FakeLLM(FakeConfig(seed=2, **NO_DELAY)).complete("相同的 prompt").text
+    assert "".join(r.delta for r in first.stream_complete("相同的 prompt")) == text
+
+
+def test_recorded_cassette_replays_identical_output(tmp_path, monkeypatch):
+    path = str(tmp_path / "cassette.jsonl")
+    upstream_config = LLMConfig(provider=LLMProvider.FAKE, fake=FakeConfig(**NO_DELAY))
+    recorder = FakeLLM(
+        FakeConfig(mode="record", cassette_path=path, upstream=upstream_config),
+        upstream=FakeLLM(FakeConfig(model="upstream", **NO_DELAY)),
+    )
+    recorded = recorder.complete("錄製的 prompt")
+    recorded_chunks = [r.delta for r in recorder.stream_complete("串流的 prompt")]
+
+    # 以新的 cassette 實例從檔案載入，確認重播不依賴程序內的狀態
+    monkeypatch.setattr(fake_llm, "_cassettes", {})
+    player = FakeLLM(
+        FakeConfig(mode="replay", cassette_path=path, replay_strict=True, response="不應使用")
+    )
+    replayed = player.complete("錄製的 prompt")
+    assert replayed.text == recorded.text
+    assert replayed.raw["usage"] == recorded.raw["usage"]
+    assert [r.delta for r in player.stream_complete("串流的 prompt")] == recorded_chunks
+
+    with pytest.raises(CassetteMissError):
+        player.complete("沒有錄製的 prompt")
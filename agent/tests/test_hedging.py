@@ -0,0 +1,133 @@
+"""Hedged request 測試（以本地模擬 provider 作為主要與次要 provider）"""
+
+import asyncio
+
+import pytest
+
+from llm_agent import AgentConfig, BaseAgent
+from llm_agent.hedging import SECONDARY, HedgingPolicy
+from llm_agent.llm_config import CircuitBreakerConfig, ConcurrencyLimitConfig, HedgingConfig
+
+GUARDS = {
+    "circuit_breaker": CircuitBreakerConfig(enabled=True, min_calls=2),
+    "concurrency": ConcurrencyLimitConfig(enabled=True, initial_limit=4),
+}
+
+
+def _hedged_agent(fake_llm_config, primary_ttft_ms, secondary_ttft_ms=0.0, **hedging):
+    hedging.setdefault("initial_delay", 0.05)
+    hedging.setdefault("min_delay", 0.01)
+    hedging.setdefault("min_samples", 1000)
+    secondary = fake_llm_config(
+        "secondary", ttft_ms=secondary_ttft_ms, response="from secondary", **GUARDS
+    )
+    primary = fake_llm_config(
+        "primary",
+        ttft_ms=primary_ttft_ms,
+        response="from primary",
+        hedging=HedgingConfig(secondary=secondary, **hedging),
+        **GUARDS,
+    )
+    config = AgentConfig(llm=primary, use_agent_mode=False, coalesce_requests=False)
+    return BaseAgent(config=config)
+
+
+def _route_stats(route):
+    return route.breaker.stats(), route.limiter.stats()
+
+
+@pytest.mark.asyncio
+async def test_secondary_win_is_recorded_on_the_secondary_route(fake_llm_config):
+    agent = _hedged_agent(fake_llm_config, primary_ttft_ms=2000)
+    for index in range(3):
+        assert await agent.acomplete(f"prompt {index}") == "from secondary"
+
+    primary_breaker, primary_limiter = _route_stats(agent.providers[0])
+    secondary_breaker, secondary_limiter = _route_stats(agent._hedge_route)
+    # 被取消的主要 provider 不記錄成功，也不提供延遲樣本
+    assert primary_breaker["successes"] == 0
+    assert primary_breaker["window_calls"] == 0
+    assert primary_limiter["in_flight"] == 0
+    assert primary_limiter["recent_latency"] is None
+    assert secondary_breaker["successes"] == 3
+    assert secondary_limiter["acquired"] == 3
+    assert secondary_limiter["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_secondary_win_is_recorded_on_the_secondary_route(fake_llm_config):
+    agent = _hedged_agent(fake_llm_config, primary_ttft_ms=2000)
+    chunks = [chunk async for chunk in agent.astream_complete("prompt")]
+    assert "".join(chunks) == "from secondary"
+
+    primary_breaker, primary_limiter = _route_stats(agent.providers[0])
+    secondary_breaker, secondary_limiter = _route_stats(agent._hedge_route)
+    assert primary_breaker["successes"] == 0
+    assert primary_limiter["in_flight"] == 0
+    assert secondary_breaker["successes"] == 1
+    assert secondary_limiter["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_secondary_win_records_lower_bound_sample():
+    policy = HedgingPolicy(initial_delay=0.02, min_delay=0.01, min_samples=1)
+
+    async def primary():
+        await asyncio.sleep(1.0)
+        return "primary"
+
+    async def secondary():
+        return "secondary"
+
+    result, winner, hedged = await policy.run(primary, secondary)
+    assert (result, winner, hedged) == ("secondary", SECONDARY, True)
+    # 落敗的主要 provider 仍提供「至少等待了門檻時間」的樣本，門檻不會因此下降
+    assert policy.threshold() >= 0.02
+    assert policy.stats()["secondary_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_primary_error_is_preferred_when_both_fail():
+    policy = HedgingPolicy(initial_delay=0.01, min_delay=0.01)
+
+    async def primary():
+        await asyncio.sleep(0.05)
+        raise ValueError("primary")
+
+    async def secondary():
+        raise KeyError("secondary")
+
+    with pytest.raises(ValueError):
+        await policy.run(primary, secondary)
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(fake_llm_config):
+    agent = _hedged_agent(fake_llm_config, primary_ttft_ms=0, min_samples=1)
+    assert await agent.acomplete("prompt") == "from primary"
+    stats = agent.hedging_policy.stats()
+    assert stats["hedged"] == 0
+    assert stats["primary_wins"] == 1
+    assert agent._hedge_route.breaker.stats()["window_calls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_failures_are_not_latency_samples():
+    policy = HedgingPolicy(initial_delay=0.5, min_delay=0.2, min_samples=5)
+    hedges = []
+
+    async def primary():
+        raise ConnectionError("refused")
+
+    async def secondary():
+        hedges.append(True)
+        return "secondary"
+
+    for _ in range(20):
+        with pytest.raises(ConnectionError):
+            await policy.run(primary, secondary)
+    stats = policy.stats()
+    # 快速失敗不計為勝出，也不會把門檻拉到下限
+    assert stats["primary_wins"] == 0
+    assert stats["threshold"] == 0.5
+    assert hedges == []
@@ -0,0 +1,36 @@
+"""ChatMemory 持久化與恢復測試"""
+
+from llm_agent.ratelimit import estimate_tokens
+from llm_agent.state.memory import ChatMemory
+from llm_agent.state.memory_store import SQLiteMemoryStore
+
+
+def test_resume_loads_only_the_tail_of_a_long_log(tmp_path):
+    store = SQLiteMemoryStore(str(tmp_path / "memory.db"))
+    writer = ChatMemory(store=store, session_id="s1")
+    for index in range(2000):
+        writer.add_message("user" if index % 2 == 0 else "assistant", f"message {index} " * 10)
+    store.flush()
+
+    calls = []
+    load_tail = store.load_tail
+
+    def spy(session_id, token_limit=None, max_messages=None):
+        calls.append(token_limit)
+        return load_tail(session_id, token_limit, max_messages)
+
+    store.load_tail = spy
+    reader = ChatMemory(store=store, session_id="s1")
+    loaded = reader.resume()
+
+    limit = reader._memory.token_limit
+    assert calls == [limit]
+    assert 0 < loaded < 2000
+    messages = reader.get_all_messages()
+    assert messages[-1].content == "message 1999 " * 10
+    assert sum(estimate_tokens(message.content) for message in messages) <= limit
+
+    # 更早的訊息按需載入
+    older = reader.load_older(limit=5)
+    assert [m["content"] for m in older][-1] == f"message {2000 - loaded - 1} " * 10
+    store.close()
@@ -0,0 +1,83 @@
+"""Ollama context 重用測試（以記錄請求的替身取代 Ollama client）"""
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from llm_agent.llm_config import OllamaConfig
+from llm_agent.ollama_context import OllamaContextSession
+from llm_agent.state.memory import ChatMemory
+
+
+class _RecordingClient:
+    """記錄 /api/generate 請求，每輪回傳較長的 context"""
+
+    def __init__(self):
+        self.requests = []
+
+    def generate(self, stream=False, **request):
+        self.requests.append(request)
+        turn = len(self.requests)
+        return {
+            "response": f"回答 {turn}",
+            "context": list(range(turn * 10)),
+            "prompt_eval_count": 5,
+            "prompt_eval_duration": 2_000_000,
+            "eval_count": 3,
+        }
+
+
+class _FakeOllama:
+    def __init__(self):
+        self.client = _RecordingClient()
+
+
+def _turn(session, llm, memory, message):
+    memory.add_message("user", message)
+    text, stats = session.generate(llm, memory, message)
+    memory.add_message("assistant", text)
+    return stats
+
+
+def test_follow_up_turns_send_only_the_new_message_with_context():
+    session = OllamaContextSession(OllamaConfig(num_ctx=4096))
+    llm = _FakeOllama()
+    memory = ChatMemory(session_id="s1")
+
+    assert not _turn(session, llm, memory, "你好")["reused"]
+    stats = _turn(session, llm, memory, "再說一次")
+
+    first, second = llm.client.requests
+    assert first["context"] is None and "你好" in first["prompt"]
+    assert second["prompt"] == "再說一次"
+    assert second["context"] == list(range(10))
+    assert second["system"] is None
+    assert stats["reused"] and stats["prompt_eval_ms"] == 2.0
+
+
+def test_context_is_rebuilt_after_the_memory_is_edited():
+    session = OllamaContextSession(OllamaConfig(num_ctx=4096))
+    llm = _FakeOllama()
+    memory = ChatMemory(session_id="s1")
+    _turn(session, llm, memory, "第一輪")
+    _turn(session, llm, memory, "第二輪")
+
+    # 例如記憶壓縮以摘要取代了最舊的訊息
+    summary = ChatMessage(role=MessageRole.SYSTEM, content="摘要")
+    assert memory.replace_prefix(memory.get_all_messages()[:2], summary)
+    stats = _turn(session, llm, memory, "第三輪")
+
+    assert not stats["reused"]
+    assert llm.client.requests[-1]["context"] is None
+    assert session.stats()["rebuilt"] == 2
+    assert session.stats()["reused"] == 1
+
+
+def test_context_is_rebuilt_when_another_provider_answered():
+    session = OllamaContextSession(OllamaConfig(num_ctx=4096))
+    llm = _FakeOllama()
+    memory = ChatMemory(session_id="s1")
+    memory.add_message("user", "第一輪")
+    session.generate(llm, memory, "第一輪")
+    # 備援 provider 的回應與 context 產生的回應不同
+    memory.add_message("assistant", "備援回答")
+
+    assert not _turn(session, llm, memory, "第二輪")["reused"]
@@ -0,0 +1,56 @@
+"""Prompt 前綴快取測試"""
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from llm_agent.prompt_cache import CACHE_CONTROL, PromptLayout, extract_cache_usage
+
+
+def _history(turns):
+    history = []
+    for index in range(turns):
+        history.append(ChatMessage(role=MessageRole.USER, content=f"問題 {index} " * 50))
+        history.append(ChatMessage(role=MessageRole.ASSISTANT, content=f"回答 {index} " * 50))
+    history.append(ChatMessage(role=MessageRole.USER, content="本次問題"))
+    return history
+
+
+def test_stable_prefix_only_grows_between_turns():
+    first = PromptLayout("系統提示詞", _history(1))
+    second = PromptLayout("系統提示詞", _history(2))
+    assert second.stable[: len(first.stable)] == first.stable
+    assert [m.content for m in second.volatile] == ["本次問題"]
+
+
+def test_anthropic_breakpoint_marks_the_end_of_the_stable_prefix():
+    layout = PromptLayout("系統提示詞", _history(2))
+    messages = layout.for_provider("anthropic", min_tokens=100)
+    marked = [i for i, m in enumerate(messages) if m.additional_kwargs.get("cache_control")]
+    assert marked == [layout.prefix_length - 1]
+    assert messages[marked[0]].additional_kwargs["cache_control"] == CACHE_CONTROL
+    # 原始訊息不被修改
+    assert not any("cache_control" in m.additional_kwargs for m in layout.messages)
+
+
+def test_short_prefixes_and_other_providers_are_not_marked():
+    layout = PromptLayout("系統提示詞", _history(2))
+    assert layout.for_provider("anthropic", min_tokens=100_000) is layout.messages
+    assert layout.for_provider("openai", min_tokens=1) is layout.messages
+
+
+def test_extract_cache_usage_for_anthropic_and_openai():
+    anthropic = {
+        "usage": {
+            "input_tokens": 10,
+            "cache_read_input_tokens": 80,
+            "cache_creation_input_tokens": 10,
+        }
+    }
+    assert extract_cache_usage(anthropic) == {
+        "input_tokens": 100,
+        "cached_tokens": 80,
+        "cache_write_tokens": 10,
+        "cached_ratio": 0.8,
+    }
+    openai = {"usage": {"prompt_tokens": 200, "prompt_tokens_details": {"cached_tokens": 50}}}
+    assert extract_cache_usage(openai)["cached_ratio"] == 0.25
+    assert extract_cache_usage({"model": "fake"}) is None
@@ -0,0 +1,17 @@
+"""Provider 註冊表測試"""
+
+import pytest
+
+from llm_agent.fake_llm import FakeLLM
+from llm_agent.llm_config import CustomProviderConfig, FakeConfig, LLMConfig, LLMProvider
+from llm_agent.providers import get_llm, register_provider, unregister_provider
+
+
+def test_unregister_provider_evicts_cached_instances():
+    register_provider("custom_fake", lambda config: FakeLLM(FakeConfig(response="ok")))
+    config = LLMConfig(provider=LLMProvider.CUSTOM, custom=CustomProviderConfig(name="custom_fake"))
+    assert get_llm(config) is get_llm(config)
+
+    assert unregister_provider("custom_fake")
+    with pytest.raises(ValueError):
+        get_llm(config)
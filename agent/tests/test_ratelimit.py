@@ -0,0 +1,60 @@
+"""速率限制測試"""
+
+import pytest
+
+from llm_agent import AgentConfig, BaseAgent, RateLimitExceeded
+from llm_agent.llm_config import RateLimitConfig
+from llm_agent.ratelimit import RateLimiter
+
+
+def test_exhausted_bucket_rejects_until_refunded():
+    limiter = RateLimiter("bucket", tokens_per_minute=100, max_wait=0.0)
+    limiter.acquire_sync(80)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire_sync(80)
+    limiter.refund(80)
+    limiter.acquire_sync(80)
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 2
+    assert stats["rejected"] == 1
+    assert stats["remaining_tokens"] < 80
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_refill_within_max_wait():
+    limiter = RateLimiter("refill", tokens_per_minute=600, max_wait=1.0)
+    await limiter.acquire(600)
+    # 每秒補充 10 個 token，等待約 0.1 秒
+    await limiter.acquire(1)
+    assert limiter.stats()["waited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_provider_budget_sheds_to_fallback(fake_llm_config):
+    limited = RateLimitConfig(requests_per_minute=1, max_wait=0.0)
+    fallback = fake_llm_config("fallback", response="from fallback")
+    primary = fake_llm_config(
+        "limited", response="from primary", rate_limit=limited, fallbacks=[fallback]
+    )
+    agent = BaseAgent(
+        config=AgentConfig(llm=primary, use_agent_mode=False, coalesce_requests=False)
+    )
+    assert await agent.acomplete("first") == "from primary"
+    assert await agent.acomplete("second") == "from fallback"
+
+
+def test_sync_complete_applies_the_user_budget(fake_llm_config):
+    config = AgentConfig(
+        llm=fake_llm_config(),
+        use_agent_mode=False,
+        coalesce_requests=False,
+        user_rate_limit=RateLimitConfig(requests_per_minute=1, max_wait=0.0),
+    )
+    agent = BaseAgent(config=config)
+    agent.complete("prompt", user_id="alice")
+    with pytest.raises(RateLimitExceeded):
+        agent.complete("prompt", user_id="alice")
+    # 其他使用者與未指定使用者的呼叫不受影響
+    agent.complete("prompt", user_id="bob")
+    agent.complete("prompt")
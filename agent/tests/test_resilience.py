@@ -0,0 +1,91 @@
+"""斷路器測試（以本地模擬 provider 注入錯誤）"""
+
+import pytest
+
+from llm_agent import AgentConfig, BaseAgent
+from llm_agent.fake_llm import FakeLLM
+from llm_agent.llm_config import CircuitBreakerConfig
+from llm_agent.resilience import CircuitBreaker, CircuitOpenError, CircuitState
+
+BREAKER = CircuitBreakerConfig(enabled=True, min_calls=2, window_size=4, open_duration=60.0)
+
+
+def _agent(llm_config):
+    config = AgentConfig(llm=llm_config, use_agent_mode=False, coalesce_requests=False)
+    return BaseAgent(config=config)
+
+
+@pytest.fixture
+def provider_calls(monkeypatch):
+    """記錄實際送往模擬 provider 的模型名稱"""
+    calls = []
+    original = FakeLLM._plan
+
+    def counting_plan(self, kind, payload, prompt):
+        calls.append(self._config.model)
+        return original(self, kind, payload, prompt)
+
+    monkeypatch.setattr(FakeLLM, "_plan", counting_plan)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_rejects_without_calling_provider(fake_llm_config, provider_calls):
+    agent = _agent(fake_llm_config("broken", error_rate=1.0, circuit_breaker=BREAKER))
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await agent.acomplete("prompt")
+
+    breaker = agent.providers[0].breaker
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        await agent.acomplete("prompt")
+    assert provider_calls == ["broken", "broken"]
+    assert breaker.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_falls_back_to_next_provider(fake_llm_config, provider_calls):
+    fallback = fake_llm_config("fallback", response="from fallback", circuit_breaker=BREAKER)
+    primary = fake_llm_config(
+        "broken", error_rate=1.0, circuit_breaker=BREAKER, fallbacks=[fallback]
+    )
+    agent = _agent(primary)
+    for _ in range(3):
+        assert await agent.acomplete("prompt") == "from fallback"
+    # 斷路器開啟後不再嘗試主要 provider
+    assert provider_calls.count("broken") == 2
+    assert provider_calls.count("fallback") == 3
+
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("llm_agent.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(name="probe", min_calls=2, open_duration=10.0)
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure(0.1)
+    assert not breaker.allow_request()
+
+    now[0] = 10.0
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    # 半開狀態只放行 half_open_max_calls 個探測請求
+    assert not breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitState.OPEN
+
+    now[0] = 20.0
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = CircuitBreaker(
+        name="slow", min_calls=2, slow_call_threshold=1.0, slow_call_rate_threshold=0.5
+    )
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_success(2.0)
+    assert breaker.state == CircuitState.OPEN
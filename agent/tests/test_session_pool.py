@@ -0,0 +1,87 @@
+"""AgentSessionPool 測試"""
+
+import threading
+
+from llama_index.core.tools import FunctionTool
+
+from llm_agent import AgentConfig, AgentRequest, AgentSessionPool
+from llm_agent.agent import BaseAgent
+
+REACT_ANSWER = "Thought: I can answer without using any more tools.\nAnswer: ok"
+
+
+def _tool(name):
+    def fn(x: int) -> int:
+        return x
+
+    return FunctionTool.from_defaults(fn=fn, name=name, description=f"{name} tool")
+
+
+def test_register_tools_rebuilds_lazily(fake_llm_config, monkeypatch):
+    created = []
+    original = BaseAgent._create_agent
+
+    def counting_create_agent(self):
+        created.append(self.state.session_id)
+        return original(self)
+
+    monkeypatch.setattr(BaseAgent, "_create_agent", counting_create_agent)
+    config = AgentConfig(llm=fake_llm_config(response=REACT_ANSWER), use_agent_mode=True)
+    pool = AgentSessionPool(config=config)
+    for session_id in ("a", "b", "c"):
+        pool.chat(AgentRequest(message="hi", session_id=session_id))
+    assert sorted(created) == ["a", "b", "c"]
+
+    version = pool.tool_registry.version
+    pool.register_tools([_tool(f"tool_{i}") for i in range(5)])
+    pool.register_tool(_tool("extra"))
+    # 註冊本身不重建任何 session 的 ReActAgent，整批只遞增一次版本
+    assert len(created) == 3
+    assert pool.tool_registry.version == version + 2
+    assert len(pool.tool_registry) == 6
+
+    response = pool.chat(AgentRequest(message="hi", session_id="a"))
+    assert response.response == "ok"
+    assert sorted(created) == ["a", "a", "b", "c"]
+
+
+def test_memory_budget_is_a_running_token_total(fake_llm_config):
+    config = AgentConfig(llm=fake_llm_config(response="reply"), use_agent_mode=False)
+    pool = AgentSessionPool(config=config, memory_budget=10_000)
+    pool.chat(AgentRequest(message="hi", session_id="a"))
+    pool.chat(AgentRequest(message="hi", session_id="b"))
+    tokens = {sid: pool.get_state(sid).memory.token_count() for sid in ("a", "b")}
+    assert pool.stats()["memory_tokens"] == sum(tokens.values())
+
+    # 預算以 token 計算：縮小預算後由最久未使用的 session 開始回收
+    pool.memory_budget = tokens["b"]
+    assert pool.evict_idle() == 1
+    assert "a" not in pool and "b" in pool
+    assert pool.stats()["memory_tokens"] == tokens["b"]
+
+    assert pool.remove("b")
+    assert pool.stats()["memory_tokens"] == 0
+
+
+def test_concurrent_checkout_builds_one_session(fake_llm_config, monkeypatch):
+    config = AgentConfig(llm=fake_llm_config(response="reply"), use_agent_mode=False)
+    pool = AgentSessionPool(config=config)
+    original = AgentSessionPool._new_agent
+    building = threading.Barrier(2)
+
+    def slow_new_agent(self, session_id):
+        # 兩個執行緒都在不持有池鎖的情況下建立 Agent
+        building.wait(timeout=5)
+        return original(self, session_id)
+
+    monkeypatch.setattr(AgentSessionPool, "_new_agent", slow_new_agent)
+    agents = []
+    threads = [
+        threading.Thread(target=lambda: agents.append(pool.get_agent("s"))) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(pool) == 1
+    assert agents[0] is agents[1]
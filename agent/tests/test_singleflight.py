@@ -0,0 +1,182 @@
+"""相同請求合併測試"""
+
+import asyncio
+
+import pytest
+
+from llm_agent import AgentConfig, AgentRequest, BaseAgent
+from llm_agent.fake_llm import FakeLLM
+from llm_agent.singleflight import SingleFlight
+from llm_agent.telemetry import CallTelemetry, PrometheusMetricsSink, render_coalescing_metrics
+
+
+@pytest.fixture
+def provider_calls(monkeypatch):
+    """記錄實際送往模擬 provider 的請求數"""
+    calls = []
+    original = FakeLLM._plan
+
+    def counting_plan(self, kind, payload, prompt):
+        calls.append(prompt)
+        return original(self, kind, payload, prompt)
+
+    monkeypatch.setattr(FakeLLM, "_plan", counting_plan)
+    return calls
+
+
+def _agent(fake_llm_config, flight):
+    llm_config = fake_llm_config("coalesced", ttft_ms=50, response="shared")
+    agent = BaseAgent(config=AgentConfig(llm=llm_config, use_agent_mode=False))
+    agent.singleflight = flight
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_completions_share_one_call(fake_llm_config, provider_calls):
+    flight = SingleFlight()
+    agent = _agent(fake_llm_config, flight)
+    results = await asyncio.gather(*(agent.acomplete("same prompt") for _ in range(5)))
+    assert results == ["shared"] * 5
+    assert len(provider_calls) == 1
+    stats = flight.stats()
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 4, 0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_streams_share_one_upstream(fake_llm_config, provider_calls):
+    flight = SingleFlight()
+    agent = _agent(fake_llm_config, flight)
+
+    async def collect():
+        return "".join([chunk async for chunk in agent.astream_complete("same prompt")])
+
+    assert await asyncio.gather(*(collect() for _ in range(3))) == ["shared"] * 3
+    assert len(provider_calls) == 1
+    assert flight.stats()["stream_coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_leader_error_is_shared_and_cancelled_follower_does_not_cancel_leader():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def failing():
+        started.set()
+        await asyncio.sleep(0.02)
+        raise ValueError("upstream")
+
+    leader = asyncio.ensure_future(flight.do("key", failing))
+    await started.wait()
+    follower = asyncio.ensure_future(flight.do("key", failing))
+    cancelled = asyncio.ensure_future(flight.do("key", failing))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    for task in (leader, follower):
+        with pytest.raises(ValueError):
+            await task
+    assert flight.stats()["coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_upstream_call_is_cancelled_when_all_waiters_leave():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    upstream_cancelled = asyncio.Event()
+
+    async def slow():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+        return "late"
+
+    waiters = [asyncio.ensure_future(flight.do("key", slow)) for _ in range(2)]
+    await started.wait()
+    for task in waiters:
+        task.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+
+    await asyncio.wait_for(upstream_cancelled.wait(), 1)
+    assert flight.stats()["in_flight"] == 0
+
+    async def fast():
+        return "fresh"
+
+    # 之後的相同請求重新開始，而不是加入已取消的呼叫
+    assert await flight.do("key", fast) == ("fresh", False)
+
+
+@pytest.mark.asyncio
+async def test_followers_share_the_leaders_metadata_and_usage(fake_llm_config):
+    flight = SingleFlight()
+    # 不同 session 的第一則相同訊息組出相同的 prompt
+    agents = [_agent(fake_llm_config, flight) for _ in range(3)]
+    responses = await asyncio.gather(
+        *(agent.achat(AgentRequest(message="same")) for agent in agents)
+    )
+
+    metas = [response.metadata for response in responses]
+    assert sorted(meta["coalesced"] for meta in metas) == [False, True, True]
+    leader = next(meta for meta in metas if not meta["coalesced"])
+    for meta in metas:
+        assert meta["telemetry"]["provider"] == "fake"
+        assert meta["telemetry"]["model"] == "coalesced"
+        assert meta["tokens_used"] == leader["tokens_used"] > 0
+        assert meta["telemetry"]["token_source"] == "provider"
+    followers = [meta["telemetry"] for meta in metas if meta["coalesced"]]
+    assert all(telemetry["coalesced"] and telemetry["llm_calls"] == 0 for telemetry in followers)
+
+
+@pytest.mark.asyncio
+async def test_stream_followers_adopt_the_leaders_usage():
+    flight = SingleFlight()
+    leader = CallTelemetry("astream_complete", "fake", "model")
+    follower = CallTelemetry("astream_complete", "fake", "model")
+    release = asyncio.Event()
+
+    async def upstream():
+        await release.wait()
+        leader.set_provider("secondary", "backup")
+        leader.record_usage({"usage": {"prompt_tokens": 7, "completion_tokens": 2}})
+        yield "a"
+        yield "b"
+
+    async def collect(meta, telemetry):
+        chunks = flight.stream(
+            "key", upstream, meta=meta, on_shared=lambda shared: telemetry.adopt(shared)
+        )
+        return "".join([chunk async for chunk in chunks])
+
+    tasks = [
+        asyncio.ensure_future(collect(leader, leader)),
+        asyncio.ensure_future(collect(follower, follower)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == ["ab", "ab"]
+
+    result = follower.finish("ab")
+    assert (result["provider"], result["model"]) == ("secondary", "backup")
+    assert (result["prompt_tokens"], result["completion_tokens"]) == (7, 2)
+    assert result["coalesced"] and result["llm_calls"] == 0
+
+
+def test_coalesced_calls_are_exported_without_double_counting_tokens():
+    sink = PrometheusMetricsSink()
+    leader = CallTelemetry("acomplete", "fake", "model")
+    leader.record_usage({"usage": {"prompt_tokens": 10, "completion_tokens": 5}})
+    follower = CallTelemetry("acomplete", "fake", "model")
+    follower.adopt(leader)
+    sink.record(leader.finish("text"))
+    sink.record(follower.finish("text"))
+    rendered = sink.render()
+    labels = '{provider="fake",model="model",operation="acomplete"}'
+    assert f"llm_agent_prompt_tokens_total{labels} 10" in rendered
+    assert "llm_agent_requests_total" in rendered and '"ok"} 2' in rendered
+
+    metrics = render_coalescing_metrics({"leaders": 1, "coalesced": 4})
+    assert 'llm_agent_coalesced_requests_total{kind="call"} 4' in metrics
+    assert "# TYPE llm_agent_coalesce_in_flight gauge" in metrics
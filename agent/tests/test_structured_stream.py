@@ -0,0 +1,78 @@
+"""串流結構化輸出解析測試"""
+
+import pytest
+
+from llm_agent.structured_stream import StructuredStreamParser, aiter_structured, iter_structured
+from llm_agent.utils import extract_code_blocks, parse_json_response
+
+
+def _chunks(text, size=3):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1}', {"a": 1}),
+        ('結果如下：{"a": {"b": [1, 2]}} 完成', {"a": {"b": [1, 2]}}),
+        # 未閉合的 [ 不能吃掉後面的 JSON
+        ('Note [draft: {"a": 1}', {"a": 1}),
+        # 引號內的括號不能開始一段永不結束的掃描
+        ('say "{" then {"a":1}', {"a": 1}),
+        ("[註解] 之後 [1, 2]", [1, 2]),
+        ('[bad} {"k": "v}"}', {"k": "v}"}),
+        ("沒有 JSON", None),
+    ],
+)
+def test_parse_json_response(text, expected):
+    assert parse_json_response(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, language, expected",
+    [
+        ("```python\nprint(1)\n```", None, ["print(1)"]),
+        ("```py\na\n```\n文字\n```js\nb\n```", "js", ["b"]),
+        # 行內的 ``` 不是區塊標記
+        ("a ```x``` b\n```py\ny\n```", None, ["y"]),
+        ("```py\ns = '```'\n```", None, ["s = '```'"]),
+        # 結束標記緊接在程式碼之後時沿用舊版規則
+        ("```py\nprint(1)```", None, ["print(1)"]),
+    ],
+)
+def test_extract_code_blocks(text, language, expected):
+    assert extract_code_blocks(text, language) == expected
+
+
+def test_unclosed_candidate_is_rescanned_on_close():
+    parser = StructuredStreamParser(code_blocks=False)
+    for chunk in _chunks('Note [draft: {"a": 1} and [2]'):
+        parser.feed(chunk)
+    assert parser.items == []
+    produced = parser.close()
+    assert [item.value for item in produced] == [{"a": 1}, [2]]
+    assert produced[0].raw == '{"a": 1}'
+    assert produced[0].start == 13
+
+
+def test_iter_structured_stops_early_and_closes_source():
+    consumed = []
+
+    def source():
+        for chunk in ['{"a": 1}', " 其他", ' {"b": 2}', " 結尾"]:
+            consumed.append(chunk)
+            yield chunk
+
+    items = list(iter_structured(source(), max_items=1))
+    assert [item.value for item in items] == [{"a": 1}]
+    assert consumed == ['{"a": 1}']
+
+
+@pytest.mark.asyncio
+async def test_aiter_structured_rescans_at_end_of_stream():
+    async def source():
+        for chunk in _chunks('say "{" then {"a":1} and\n```py\nx = 1\n```\n'):
+            yield chunk
+
+    items = [item async for item in aiter_structured(source())]
+    assert [(item.kind, item.value) for item in items] == [("code", "x = 1"), ("json", {"a": 1})]
@@ -0,0 +1,65 @@
+"""效能遙測與 Prometheus 指標輸出測試"""
+
+from llm_agent import AgentConfig, AgentRequest, BaseAgent
+from llm_agent.telemetry import CallTelemetry, PrometheusMetricsSink, extract_token_usage
+
+LABELS = 'provider="fake",model="model",operation="chat"'
+
+
+def _result(latency_ms, status="ok", **fields):
+    return {
+        "operation": "chat",
+        "provider": "fake",
+        "model": "model",
+        "status": status,
+        "latency_ms": latency_ms,
+        "prompt_tokens": 10,
+        "completion_tokens": 4,
+        **fields,
+    }
+
+
+def test_histogram_buckets_are_cumulative():
+    sink = PrometheusMetricsSink()
+    sink.record(_result(40.0))
+    sink.record(_result(300.0))
+    sink.record(_result(90_000.0, status="error"))
+    lines = sink.render().splitlines()
+
+    def bucket(le):
+        name = f'llm_agent_request_duration_seconds_bucket{{{LABELS},le="{le}"}}'
+        return next(line.split()[-1] for line in lines if line.startswith(name))
+
+    assert "# TYPE llm_agent_request_duration_seconds histogram" in lines
+    assert bucket("0.05") == "1"
+    assert bucket("0.5") == "2"
+    assert bucket("60") == "2"
+    assert bucket("+Inf") == "3"
+    assert f"llm_agent_request_duration_seconds_count{{{LABELS}}} 3" in lines
+    assert f"llm_agent_prompt_tokens_total{{{LABELS}}} 30" in lines
+    assert f'llm_agent_requests_total{{{LABELS},status="error"}} 1' in lines
+
+
+def test_missing_usage_falls_back_to_estimates():
+    telemetry = CallTelemetry("complete", "fake", "model")
+    telemetry.estimate_prompt(12)
+    assert not telemetry.record_usage({"model": "model"})
+    result = telemetry.finish("some completion text")
+    assert result["token_source"] == "estimate"
+    assert result["prompt_tokens"] == 12
+    assert result["completion_tokens"] > 0
+    assert extract_token_usage({"usage": {"input_tokens": 3, "output_tokens": 2}}) == (3, 2)
+
+
+def test_chat_reports_provider_usage_in_metadata(fake_llm_config):
+    agent = BaseAgent(
+        config=AgentConfig(llm=fake_llm_config(), use_agent_mode=False, coalesce_requests=False)
+    )
+    response = agent.chat(AgentRequest(message="hello"))
+    telemetry = response.metadata["telemetry"]
+    assert telemetry["operation"] == "chat"
+    assert telemetry["status"] == "ok"
+    assert telemetry["token_source"] == "provider"
+    assert response.metadata["tokens_used"] == (
+        telemetry["prompt_tokens"] + telemetry["completion_tokens"]
+    )
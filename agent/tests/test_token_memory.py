@@ -0,0 +1,68 @@
+"""TokenCountedMemory 測試"""
+
+import pytest
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+
+from llm_agent.state.token_memory import TokenCountedMemory, get_token_counter
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _history():
+    messages = []
+    for index in range(20):
+        role = MessageRole.USER if index % 2 == 0 else MessageRole.ASSISTANT
+        messages.append(ChatMessage(role=role, content="word " * (index % 5 + 1)))
+    return messages
+
+
+@pytest.mark.parametrize("token_limit", [3, 10, 25, 1000])
+def test_window_matches_chat_memory_buffer(token_limit):
+    history = _history()
+    memory = TokenCountedMemory.from_defaults(
+        chat_history=history, token_limit=token_limit, tokenizer_fn=word_count
+    )
+    reference = ChatMemoryBuffer.from_defaults(
+        chat_history=history,
+        token_limit=token_limit,
+        tokenizer_fn=lambda text: ["t"] * word_count(text),
+    )
+    assert memory.get() == reference.get()
+    assert memory.token_count == sum(word_count(m.content) for m in history)
+    assert memory.message_count == len(history)
+
+
+def test_set_reuses_token_counts_of_known_messages():
+    calls = []
+
+    def counting(text: str) -> int:
+        calls.append(text)
+        return word_count(text)
+
+    memory = TokenCountedMemory.from_defaults(token_limit=100, tokenizer_fn=counting)
+    history = _history()[:4]
+    for message in history:
+        memory.put(message)
+    calls.clear()
+
+    added = ChatMessage(role=MessageRole.USER, content="new message")
+    memory.set([*history[1:], added])
+    # 只有新訊息需要重新計算
+    assert calls == ["new message"]
+    assert memory.token_count == sum(word_count(m.content) for m in [*history[1:], added])
+
+
+def test_window_never_starts_with_an_assistant_message():
+    memory = TokenCountedMemory.from_defaults(token_limit=2, tokenizer_fn=word_count)
+    memory.put(ChatMessage(role=MessageRole.USER, content="a b c"))
+    memory.put(ChatMessage(role=MessageRole.ASSISTANT, content="d"))
+    memory.put(ChatMessage(role=MessageRole.USER, content="e"))
+    assert [m.content for m in memory.get()] == ["e"]
+
+
+def test_unknown_tokenizer_name_is_rejected():
+    with pytest.raises(ValueError):
+        get_token_counter("bpe")
@@ -0,0 +1,54 @@
+"""工具結果環狀緩衝區測試"""
+
+from llm_agent.state.tool_results import ToolResultStore
+
+
+def _names(records):
+    return [(record.tool_name, record.result) for record in records]
+
+
+def test_global_and_per_tool_limits_evict_the_oldest_results():
+    store = ToolResultStore(max_results=4, max_per_tool=2)
+    for index in range(3):
+        store.append("search", index)
+    store.append("weather", "sunny")
+    store.append("weather", "rain")
+
+    # search 超過單一工具上限，最舊的 0 被淘汰
+    assert _names(store.records()) == [
+        ("search", 1),
+        ("search", 2),
+        ("weather", "sunny"),
+        ("weather", "rain"),
+    ]
+    store.append("clock", "noon")
+    # 超過全域上限時淘汰全域最舊的結果
+    assert _names(store.records("search")) == [("search", 2)]
+    assert len(store) == 4
+    assert store.stats()["calls"] == 6
+
+
+def test_incremental_reads_only_return_newer_results():
+    store = ToolResultStore()
+    first = store.append("search", "a")
+    store.append("weather", "b")
+    store.append("search", "c", cached=True, saved_ms=12.5)
+
+    assert _names(store.since(first.seq)) == [("weather", "b"), ("search", "c")]
+    assert _names(store.since(first.seq, "search")) == [("search", "c")]
+    assert _names(store.records(limit=1)) == [("search", "c")]
+    assert store.since(store.last_seq) == []
+
+    stats = store.stats()
+    assert stats["cache_hits"] == 1
+    assert stats["saved_ms"] == 12.5
+
+
+def test_clear_keeps_sequence_numbers_increasing():
+    store = ToolResultStore()
+    store.append("search", "a")
+    last = store.last_seq
+    store.clear()
+    record = store.append("search", "b")
+    assert record.seq == last + 1
+    assert [item["result"] for item in store] == ["b"]
@@ -0,0 +1,67 @@
+"""BM25 工具檢索測試"""
+
+from llm_agent.tool_retrieval import BM25Index, ToolRetriever, tokenize
+from llm_agent.tools import ToolRegistry
+
+
+def get_weather(location: str) -> str:
+    """查詢指定城市的天氣與氣溫"""
+    return f"{location} 晴天"
+
+
+def convert_currency(amount: float, currency: str) -> str:
+    """將金額換算成指定貨幣的匯率結果"""
+    return f"{amount} {currency}"
+
+
+def searchStockPrice(symbol: str) -> str:
+    """查詢股票代號目前的股價"""
+    return symbol
+
+
+def test_tokenize_splits_identifiers_and_cjk():
+    assert tokenize("searchStockPrice get_weather") == [
+        "search",
+        "stock",
+        "price",
+        "get",
+        "weather",
+    ]
+    assert tokenize("天氣") == ["天", "氣", "天氣"]
+
+
+def test_search_returns_top_k_by_score_and_tracks_removals():
+    index = BM25Index()
+    index.add("weather", "weather forecast temperature rain")
+    index.add("currency", "currency exchange rate")
+    index.add("stock", "stock price quote exchange")
+
+    results = index.search("exchange rate for currency", k=2)
+    assert [doc_id for doc_id, _ in results] == ["currency", "stock"]
+    assert results[0][1] > results[1][1]
+    assert index.search("unrelated words", k=2) == []
+
+    index.remove("currency")
+    assert [doc_id for doc_id, _ in index.search("exchange rate", k=2)] == ["stock"]
+    assert len(index) == 2
+
+
+def test_retriever_selects_relevant_tools_and_reuses_them_for_follow_ups():
+    registry = ToolRegistry(max_workers=1)
+    registry.enable_retrieval()
+    for fn in (get_weather, convert_currency, searchStockPrice):
+        registry.register_function(fn)
+    retriever = ToolRetriever(registry, top_k=1)
+    try:
+        tools = retriever.retrieve("台北明天的天氣如何")
+        assert [tool.metadata.name for tool in tools] == ["get_weather"]
+        stats = retriever.last_stats()
+        assert stats["candidates"] == 3
+        assert stats["tool_tokens"] > 0
+        assert stats["tool_tokens_saved"] > 0
+
+        # 與任何工具都不相關的接續訊息沿用上一次挑選的工具
+        tools = retriever.retrieve("再來一次")
+        assert [tool.metadata.name for tool in tools] == ["get_weather"]
+    finally:
+        registry.shutdown()
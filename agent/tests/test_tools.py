@@ -0,0 +1,85 @@
+"""ToolRegistry 執行層與結果快取測試"""
+
+import pytest
+from llama_index.core.tools import FunctionTool
+
+from llm_agent.tools import ToolCachePolicy, ToolCacheScope, ToolExecutionMode, ToolRegistry
+
+calls = []
+
+
+def lookup(symbol: str) -> dict:
+    """查詢代號（結果為非字串物件）"""
+    calls.append(symbol)
+    return {"symbol": symbol, "price": len(calls)}
+
+
+@pytest.fixture
+def registry():
+    calls.clear()
+    registry = ToolRegistry(max_workers=2)
+    yield registry
+    registry.shutdown()
+
+
+def test_cached_results_keep_their_type_and_original_duration(registry):
+    registry.register_function(lookup, cache=ToolCachePolicy(scope=ToolCacheScope.GLOBAL))
+    first = registry.execute("lookup", {"symbol": "AAA"})
+    second = registry.execute("lookup", {"symbol": "AAA"})
+    assert calls == ["AAA"]
+    assert second.cached and second.result == first.result == {"symbol": "AAA", "price": 1}
+    assert second.saved_ms == first.duration_ms
+    assert registry.cache_stats()["lookup"] == {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 1}
+
+
+def test_cache_evicts_least_recently_used_and_expires(registry, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("llm_agent.tools.time.monotonic", lambda: now[0])
+    policy = ToolCachePolicy(ttl=10.0, max_entries=2, scope=ToolCacheScope.GLOBAL)
+    registry.register_function(lookup, cache=policy)
+    for symbol in ("A", "B", "A", "C"):
+        registry.execute("lookup", {"symbol": symbol})
+    # B 最久未使用而被淘汰，A 仍在快取中
+    assert calls == ["A", "B", "C"]
+    registry.execute("lookup", {"symbol": "B"})
+    assert calls == ["A", "B", "C", "B"]
+
+    now[0] += 11.0
+    registry.execute("lookup", {"symbol": "C"})
+    assert calls[-1] == "C" and len(calls) == 5
+
+
+@pytest.mark.asyncio
+async def test_aexecute_many_runs_in_order_and_reports_errors(registry):
+    registry.register_function(lookup, cache=ToolCachePolicy(scope=ToolCacheScope.GLOBAL))
+    results = await registry.aexecute_many(
+        [("lookup", {"symbol": "X"}), ("missing", {}), ("lookup", {"symbol": "X"})]
+    )
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].success and not results[1].success
+    assert results[2].result["symbol"] == "X"
+
+
+def test_execution_mode_follows_the_original_function(registry):
+    async def fetch(symbol: str) -> str:
+        """非同步查詢"""
+        return symbol
+
+    async def afetch_quote(symbol: str) -> str:
+        return symbol
+
+    def fetch_quote(symbol: str) -> str:
+        """同步查詢（另外提供 async 實作）"""
+        return symbol
+
+    registry.register_function(fetch)
+    registry.register_function(lookup)
+    tool = FunctionTool.from_defaults(fn=fetch_quote, async_fn=afetch_quote)
+    registry.register("fetch_quote", tool)
+
+    modes = {name: options.mode for name, options in registry._options.items()}
+    assert modes == {
+        "fetch": ToolExecutionMode.ASYNC,
+        "lookup": ToolExecutionMode.THREAD,
+        "fetch_quote": ToolExecutionMode.ASYNC,
+    }
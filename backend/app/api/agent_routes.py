@@ -1,9 +1,22 @@
 """Agent interaction API routes."""
+import json
+import time
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from app.schemas import MessageRequest, MessageResponse
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from llm_agent import AgentRequest, AgentSessionPool, RateLimitExceeded
+from app.schemas import (
+    BatchCompleteItem,
+    BatchCompleteRequest,
+    BatchCompleteResponse,
+    CompleteRequest,
+    CompleteResponse,
+    MessageRequest,
+    MessageResponse,
+)
 from app.state.state_accessor import StateAccessor
-from app.dependencies import get_state_accessor
+from app.dependencies import get_agent_pool, get_state_accessor
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
@@ -33,6 +46,117 @@ async def chat_with_agent(
     return MessageResponse(response=response_text, session_id=session_id)
 
 
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_agent_stream(
+    request: MessageRequest,
+    http_request: Request,
+    agent_pool: AgentSessionPool = Depends(get_agent_pool),
+):
+    """Chat with the agent, streaming tokens as server-sent events.
+
+    Emits ``token`` events (``{"delta": ...}``) as the model generates, followed by
+    a single ``done`` event, or an ``error`` event if generation fails. Tokens are
+    pulled from the model only as fast as the client consumes them, and generation
+    stops when the client disconnects.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    agent_request = AgentRequest(
+        message=request.message,
+        session_id=session_id,
+        user_id=request.user_id,
+        context={"user_id": request.user_id} if request.user_id else {},
+        stream=True,
+    )
+
+    async def event_stream():
+        tokens = agent_pool.astream_chat(agent_request)
+        try:
+            async for delta in tokens:
+                if await http_request.is_disconnected():
+                    break
+                yield _format_sse("token", {"delta": delta})
+            else:
+                yield _format_sse("done", {"session_id": session_id})
+        except Exception as e:
+            yield _format_sse("error", {"detail": str(e)})
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/complete", response_model=CompleteResponse)
+async def complete_with_agent(
+    request: CompleteRequest,
+    agent_pool: AgentSessionPool = Depends(get_agent_pool),
+):
+    """Complete a single prompt without conversation history."""
+    session_id = request.session_id or str(uuid.uuid4())
+    try:
+        response_text = await agent_pool.acomplete(request.prompt, user_id=request.user_id)
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return CompleteResponse(response=response_text, session_id=session_id)
+
+
+@router.post("/complete/batch", response_model=BatchCompleteResponse)
+async def batch_complete_with_agent(
+    request: BatchCompleteRequest,
+    agent_pool: AgentSessionPool = Depends(get_agent_pool),
+):
+    """Complete many prompts concurrently with bounded parallelism.
+
+    Returns results in request order. With ``stream=true`` the results are instead
+    streamed as NDJSON lines in completion order (use ``index`` to match prompts).
+    The 200 status is already sent by then, so a failure that aborts the batch
+    (``return_exceptions=false``) is reported as a final ``{"error": ...}`` line.
+    """
+    if request.stream:
+
+        async def result_stream():
+            try:
+                async for result in agent_pool.aiter_batch_complete(
+                    request.prompts,
+                    max_concurrency=request.max_concurrency,
+                    return_exceptions=request.return_exceptions,
+                    user_id=request.user_id,
+                ):
+                    item = BatchCompleteItem(**result.model_dump(exclude={"prompt"}))
+                    yield item.model_dump_json() + "\n"
+            except Exception as e:
+                yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+    start = time.perf_counter()
+    try:
+        results = await agent_pool.abatch_complete(
+            request.prompts,
+            max_concurrency=request.max_concurrency,
+            return_exceptions=request.return_exceptions,
+            user_id=request.user_id,
+        )
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return BatchCompleteResponse(
+        results=[BatchCompleteItem(**r.model_dump(exclude={"prompt"})) for r in results],
+        total_latency_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
 @router.get("/health")
 async def agent_health():
     """Check agent health."""
@@ -1,4 +1,5 @@
 """FastAPI dependencies."""
+from functools import lru_cache
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from app.db.session import get_db
@@ -8,6 +9,7 @@ from app.db.storage.interface import StorageInterface
 from app.state.user_state.manager import UserStateManager
 from app.state.world_state.manager import WorldStateManager
 from app.state.state_accessor import StateAccessor
+from llm_agent import AgentSessionPool
 
 
 def get_storage(db: Session = Depends(get_db)) -> StorageInterface:
@@ -46,3 +48,12 @@ def get_state_accessor(
     """Get State Accessor instance."""
     return StateAccessor(user_state_manager, world_state_manager)
 
+
+@lru_cache(maxsize=1)
+def get_agent_pool() -> AgentSessionPool:
+    """Get the process-wide Agent session pool (configured from environment variables).
+
+    The pool shares one LLM client and tool registry across all sessions and keeps
+    a separate conversation state per session_id.
+    """
+    return AgentSessionPool()
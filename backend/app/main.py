@@ -4,6 +4,9 @@ from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from llm_agent import PrometheusMetricsSink, get_metrics_sink, render_coalescing_metrics
+from llm_agent.singleflight import get_singleflight
 from app.db.base import Base, engine
 from app.api import user_routes, world_routes, agent_routes
 from app.schemas import HealthResponse
@@ -51,6 +54,16 @@ async def health():
     return HealthResponse(status="healthy", version="0.1.0")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for LLM agent calls (latency, TTFT, tokens per provider/model)
+    and request coalescing (single-flight leaders vs. deduplicated calls)."""
+    sink = get_metrics_sink()
+    body = sink.render() if isinstance(sink, PrometheusMetricsSink) else ""
+    body += render_coalescing_metrics(get_singleflight().stats())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("BACKEND_PORT", "8000"))
@@ -1,6 +1,6 @@
 """API layer Pydantic schemas."""
 from pydantic import BaseModel, Field
-from typing import Optional, Any
+from typing import Optional, Any, List
 
 
 class MessageRequest(BaseModel):
@@ -16,6 +16,49 @@ class MessageResponse(BaseModel):
     session_id: str = Field(..., description="Session ID")
 
 
+class CompleteRequest(BaseModel):
+    """Request schema for a single (non-conversational) agent completion."""
+    prompt: str = Field(..., description="Prompt to complete")
+    session_id: Optional[str] = Field(None, description="Session ID echoed back to the caller")
+    user_id: Optional[str] = Field(None, description="User ID")
+
+
+class CompleteResponse(BaseModel):
+    """Response schema for a single agent completion."""
+    response: str = Field(..., description="Completion text")
+    session_id: str = Field(..., description="Session ID")
+
+
+class BatchCompleteRequest(BaseModel):
+    """Request schema for batch agent completion."""
+    prompts: List[str] = Field(
+        ..., min_length=1, max_length=256, description="Prompts to complete (at most 256)"
+    )
+    user_id: Optional[str] = Field(None, description="User ID charged for the whole batch")
+    max_concurrency: int = Field(8, ge=1, le=64, description="Maximum concurrent LLM calls")
+    return_exceptions: bool = Field(
+        True, description="Report failed items in the results instead of failing the whole batch"
+    )
+    stream: bool = Field(
+        False, description="Stream results as NDJSON lines in completion order"
+    )
+
+
+class BatchCompleteItem(BaseModel):
+    """Result of one prompt in a batch completion."""
+    index: int = Field(..., description="Position of the prompt in the request")
+    response: Optional[str] = Field(None, description="Completion text (None on failure)")
+    success: bool = Field(..., description="Whether the completion succeeded")
+    error: Optional[str] = Field(None, description="Error message if the completion failed")
+    latency_ms: float = Field(..., description="LLM call latency in milliseconds")
+
+
+class BatchCompleteResponse(BaseModel):
+    """Response schema for batch agent completion (results in request order)."""
+    results: List[BatchCompleteItem] = Field(..., description="Per-prompt results")
+    total_latency_ms: float = Field(..., description="Wall-clock time for the whole batch")
+
+
 class ErrorResponse(BaseModel):
     """Error response schema."""
     error: str = Field(..., description="Error message")
@@ -10,6 +10,8 @@ import type {
   AgentChatResponse,
   AgentCompleteRequest,
   AgentCompleteResponse,
+  AgentBatchCompleteRequest,
+  AgentBatchCompleteResponse,
 } from './types';
 
 // API 基礎 URL 配置
@@ -114,5 +116,11 @@ export const agentApi = {
     const response = await apiClient.post<AgentCompleteResponse>('/agent/complete', request);
     return response.data;
   },
+
+  // 批次完成多個提示（結果順序與輸入相同）
+  completeBatch: async (request: AgentBatchCompleteRequest): Promise<AgentBatchCompleteResponse> => {
+    const response = await apiClient.post<AgentBatchCompleteResponse>('/agent/complete/batch', request);
+    return response.data;
+  },
 };
 
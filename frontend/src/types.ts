@@ -58,3 +58,23 @@ export interface AgentCompleteResponse {
   session_id: string;
 }
 
+export interface AgentBatchCompleteRequest {
+  prompts: string[];
+  max_concurrency?: number;
+  return_exceptions?: boolean;
+  user_id?: string;
+}
+
+export interface AgentBatchCompleteItem {
+  index: number;
+  response: string | null;
+  success: boolean;
+  error: string | null;
+  latency_ms: number;
+}
+
+export interface AgentBatchCompleteResponse {
+  results: AgentBatchCompleteItem[];
+  total_latency_ms: number;
+}
+